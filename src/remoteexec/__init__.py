@@ -1,3 +1,24 @@
 __version__ = "1.0.0"
 
-from .base import *
+# Public names are imported from their submodule on first access, so that `import remoteexec`
+# (e.g. by `slurmexec-run` inside every job) does not pay for `subprocess` and friends.
+_LAZY_NAMES = {
+    "rsync": "base",
+    "ssh_exec": "base",
+    "ssh_exec_cd_and_python": "base",
+}
+
+__all__ = list(_LAZY_NAMES)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f".{_LAZY_NAMES[name]}", __name__), name)
+    globals()[name] = value  # later accesses skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,125 @@
+"""
+Opt-in result cache for @slurm_job functions (`@slurm_job(cache=True)`).
+
+A run is keyed by a hash of the function source, the source of its module, the resolved
+kwargs and the declared input files. Submitting a run whose key already has a completed
+result returns the cached result instead of calling sbatch. Entries live on the shared
+filesystem and are evicted by age and total size.
+"""
+import os
+import time
+import pickle
+import inspect
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+
+__all__ = ["JobCache", "compute_job_cache_key"]
+
+DEFAULT_CACHE_DIR = "~/.slurmexec/cache"
+
+
+def _fingerprint_path(path: Path) -> list:
+    """Cheap fingerprint (relative path, size, modification time) of a file or every file in a directory."""
+    if not path.exists():
+        raise FileNotFoundError(f"Declared input {path} does not exist")
+    if path.is_file():
+        stat = path.stat()
+        return [(str(path), stat.st_size, stat.st_mtime_ns)]
+    fingerprint = []
+    for file in sorted(path.rglob("*")):
+        if file.is_file():
+            stat = file.stat()
+            fingerprint.append((str(file.relative_to(path)), stat.st_size, stat.st_mtime_ns))
+    return fingerprint
+
+
+def compute_job_cache_key(func: callable, kwargs: dict[str, any], inputs: Optional[list[str]] = None) -> str:
+    """
+    Computes the cache key of calling `func` with `kwargs`.
+
+    Args:
+        func (callable): @slurm_job function.
+        kwargs (dict): Resolved keyword arguments.
+        inputs (list[str], optional): Input files/directories read by the function; their size and modification
+            time are part of the key. May reference kwargs, e.g. "{data_dir}/train.npy".
+
+    Returns:
+        str: Hex digest
+    """
+    func = getattr(func, "__wrapped__", func)
+    h = sha256()
+    h.update(func.__qualname__.encode())
+    h.update(inspect.getsource(func).encode())
+    module_file = inspect.getsourcefile(func)
+    if module_file is not None:
+        h.update(Path(module_file).read_bytes())
+    h.update(pickle.dumps(sorted(kwargs.items()), protocol=4))
+    for input_path in inputs or []:
+        input_path = Path(input_path.format(**kwargs)).expanduser().resolve()
+        h.update(pickle.dumps(_fingerprint_path(input_path), protocol=4))
+    return h.hexdigest()
+
+
+class JobCache:
+    """
+    Directory of pickled job results keyed by `compute_job_cache_key`.
+
+    Args:
+        cache_dir (str, optional): Directory on the shared filesystem. Defaults to ~/.slurmexec/cache.
+        max_bytes (int, optional): Maximum total size; least recently used entries are evicted first. Defaults to 10 GB.
+        max_age (float, optional): Maximum age in seconds since an entry was last used. Defaults to 30 days.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 10 * 1024**3, max_age: float = 30 * 24 * 3600):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pkl"
+
+    def get(self, key: str) -> tuple[bool, any]:
+        """
+        Returns:
+            tuple[bool, any]: (hit, result); result is None on a miss.
+        """
+        entry = self._entry(key)
+        try:
+            with open(entry, "rb") as f:
+                result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return False, None
+        try:
+            os.utime(entry)  # mark as recently used
+        except OSError:
+            pass
+        return True, result
+
+    def put(self, key: str, result: any):
+        """Stores `result` under `key` (atomically) and evicts old entries."""
+        from .slurmexec_runner import write_atomic
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(entry, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    def evict(self):
+        """Deletes entries unused for longer than `max_age`, then the least recently used ones until under `max_bytes`."""
+        now = time.time()
+        entries = []
+        for entry in self.cache_dir.glob("*/*.pkl"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # concurrently evicted
+            if now - stat.st_mtime > self.max_age:
+                entry.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
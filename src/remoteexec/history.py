@@ -0,0 +1,279 @@
+"""
+History of requested vs. used resources of submitted jobs, used to autosize `--mem` and `--time`.
+
+Every submission is recorded in ~/.slurmexec/history.jsonl keyed by "{job name}:{file}:{function}".
+Usage of finished jobs (MaxRSS, Elapsed, TotalCPU) is filled in lazily with one batched `sacct` call.
+Submitting with `--mem auto` and/or `--time auto` sets them from a percentile of past usage plus headroom,
+and `slurmexec-report` shows how much of the requested resources went unused.
+"""
+import os
+import sys
+import json
+import math
+import time
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+__all__ = ["ResourceHistory", "autosize_slurm_args"]
+
+DEFAULT_HISTORY_FILE = "~/.slurmexec/history.jsonl"
+
+# Final job states; anything else is still pending or running
+_FINISHED_STATES = ("COMPLETED", "FAILED", "TIMEOUT", "OUT_OF_MEMORY", "CANCELLED", "NODE_FAIL", "PREEMPTED", "BOOT_FAIL", "DEADLINE")
+
+
+def parse_slurm_duration(value: str) -> Optional[float]:
+    """Parses a Slurm duration ("[D-]HH:MM:SS[.mmm]", "MM:SS[.mmm]" or minutes) into seconds; None if unlimited/unknown."""
+    value = value.strip()
+    if not value or value in ("UNLIMITED", "Partition_Limit", "INVALID"):
+        return None
+    days = 0
+    if "-" in value:
+        d, value = value.split("-", 1)
+        days = int(d)
+    parts = [float(p) for p in value.split(":")]
+    if len(parts) == 1:
+        seconds = parts[0] * 60  # plain number of minutes (e.g. --time=30)
+    elif len(parts) == 2:
+        seconds = parts[0] * 60 + parts[1]
+    else:
+        seconds = parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return days * 86400 + seconds
+
+
+def format_slurm_duration(seconds: float) -> str:
+    seconds = int(math.ceil(seconds))
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{days}-{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def parse_slurm_memory(value: str) -> Optional[float]:
+    """Parses a Slurm memory size (e.g. "4000M", "4G", "1234.5K", "16Gn") into MB; None if empty."""
+    value = value.strip().rstrip("nc")  # old sacct versions append n (per node) / c (per cpu)
+    if not value:
+        return None
+    units = {"K": 1 / 1024, "M": 1, "G": 1024, "T": 1024**2}
+    if value[-1].upper() in units:
+        return float(value[:-1]) * units[value[-1].upper()]
+    return float(value) / 1024**2  # bytes
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class ResourceHistory:
+    """
+    Append-only store of job submissions and their measured resource usage.
+
+    Args:
+        path (str, optional): History file on the shared filesystem. Defaults to ~/.slurmexec/history.jsonl.
+    """
+    def __init__(self, path: str = DEFAULT_HISTORY_FILE):
+        self.path = Path(path).expanduser()
+
+    def _append(self, records: list[dict]):
+        if not records:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        # A single O_APPEND write per batch, so concurrent clients do not interleave lines
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data.encode())
+        finally:
+            os.close(fd)
+
+    def load(self) -> tuple[dict[str, dict], dict[str, list[dict]]]:
+        """
+        Returns:
+            tuple: (submissions by job id, usage records by job id; array tasks have one usage record each)
+        """
+        submissions, usage = {}, {}
+        if not self.path.exists():
+            return submissions, usage
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written line
+                if record["kind"] == "submission":
+                    submissions[record["job_id"]] = record
+                elif record["kind"] == "usage":
+                    usage.setdefault(record["job_id"], []).append(record)
+        return submissions, usage
+
+    def record_submission(self, job_id: str, key: str, slurm_args: dict[str, any], script_file: Optional[str] = None):
+        self._append([{
+            "kind": "submission",
+            "job_id": str(job_id),
+            "key": key,
+            "time": time.time(),
+            "mem": slurm_args.get("--mem"),
+            "time_limit": slurm_args.get("--time", slurm_args.get("-t")),
+            "array": slurm_args.get("--array", slurm_args.get("-a")),
+            "script_file": None if script_file is None else str(script_file),
+        }])
+
+    def update(self):
+        """Fills in the usage of finished jobs that have none yet, querying all of them with a single sacct call."""
+        submissions, usage = self.load()
+        pending = {job_id for job_id in submissions if job_id not in usage}
+        if not pending:
+            return
+        try:
+            output = subprocess.check_output([
+                "sacct", "-n", "-P", "--units=M",
+                "--format=JobID,State,ReqMem,MaxRSS,Elapsed,Timelimit,TotalCPU,AllocCPUS",
+                "-j", ",".join(sorted(pending)),
+            ], stderr=subprocess.DEVNULL, encoding="utf-8")
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Could not query sacct for job usage: {e}")
+            return
+
+        # One line per job (or array task) followed by one line per step; MaxRSS is only reported for steps
+        jobs = {}
+        for line in output.splitlines():
+            fields = line.split("|")
+            if len(fields) != 8:
+                continue
+            job_step_id, state, req_mem, max_rss, elapsed, timelimit, total_cpu, ncpus = fields
+            task_id, _, step = job_step_id.partition(".")
+            if not step:
+                jobs[task_id] = {
+                    "state": state.split(" ", 1)[0],
+                    "req_mem_mb": parse_slurm_memory(req_mem),
+                    "max_rss_mb": parse_slurm_memory(max_rss) or 0.0,
+                    "elapsed_s": parse_slurm_duration(elapsed),
+                    "timelimit_s": parse_slurm_duration(timelimit),
+                    "total_cpu_s": parse_slurm_duration(total_cpu),
+                    "ncpus": int(ncpus or 1),
+                }
+            elif task_id in jobs:
+                step_rss = parse_slurm_memory(max_rss) or 0.0
+                jobs[task_id]["max_rss_mb"] = max(jobs[task_id]["max_rss_mb"], step_rss)
+
+        # Array jobs are recorded once all their tasks finished
+        unfinished = {task_id.split("_", 1)[0] for task_id, job in jobs.items() if job["state"] not in _FINISHED_STATES}
+        records = []
+        for task_id, job in jobs.items():
+            job_id = task_id.split("_", 1)[0]
+            if job_id not in pending or job_id in unfinished:
+                continue
+            records.append({"kind": "usage", "job_id": job_id, "task_id": task_id, "key": submissions[job_id]["key"], **job})
+        self._append(records)
+
+    def usage_by_key(self) -> dict[str, list[dict]]:
+        _, usage = self.load()
+        by_key = {}
+        for records in usage.values():
+            for record in records:
+                by_key.setdefault(record["key"], []).append(record)
+        return by_key
+
+    def suggest(self, key: str, percentile: float = 95, headroom: float = 1.2, min_samples: int = 3) -> dict[str, str]:
+        """
+        Suggests `--mem` and `--time` from the usage of previously completed runs of `key`.
+
+        Args:
+            key (str): Job key (see `get_job_key`).
+            percentile (float, optional): Percentile of past usage to size for. Defaults to 95.
+            headroom (float, optional): Factor applied on top of the percentile. Defaults to 1.2.
+            min_samples (int, optional): Minimum number of completed runs required for a suggestion. Defaults to 3.
+
+        Returns:
+            dict[str, str]: Suggested sbatch arguments; empty if there is not enough history, without "--time" if no
+                elapsed time was recorded.
+        """
+        completed = [r for r in self.usage_by_key().get(key, []) if r["state"] == "COMPLETED"]
+        if len(completed) < min_samples:
+            return {}
+        mem_mb = _percentile([r["max_rss_mb"] for r in completed], percentile) * headroom
+        suggestion = {"--mem": f"{max(1, int(math.ceil(mem_mb)))}M"}
+        elapsed = [r["elapsed_s"] for r in completed if r["elapsed_s"] is not None]
+        if elapsed:  # sacct may not report the elapsed time of every run
+            suggestion["--time"] = format_slurm_duration(max(60, _percentile(elapsed, percentile) * headroom))
+        return suggestion
+
+    def report(self) -> list[dict]:
+        """
+        Summarizes over-allocation per job key.
+
+        Returns:
+            list[dict]: For each key: number of runs and the requested vs. used memory, time and CPU time.
+        """
+        rows = []
+        for key, records in sorted(self.usage_by_key().items()):
+            with_mem = [r for r in records if r["req_mem_mb"]]
+            with_time = [r for r in records if r["timelimit_s"] and r["elapsed_s"] is not None]
+            req_cpu = sum(r["elapsed_s"] * r["ncpus"] for r in records if r["elapsed_s"] is not None)
+            rows.append({
+                "key": key,
+                "runs": len(records),
+                "failed": sum(r["state"] != "COMPLETED" for r in records),
+                "mem_requested_mb": sum(r["req_mem_mb"] for r in with_mem),
+                "mem_used_mb": sum(r["max_rss_mb"] for r in with_mem),
+                "time_requested_s": sum(r["timelimit_s"] for r in with_time),
+                "time_used_s": sum(r["elapsed_s"] for r in with_time),
+                "cpu_allocated_s": req_cpu,
+                "cpu_used_s": sum(r["total_cpu_s"] or 0 for r in records),
+            })
+        return rows
+
+    def print_report(self):
+        _waste = lambda requested, used: f"{100 * (1 - used / requested):5.1f}%" if requested else "    -"
+        rows = self.report()
+        if not rows:
+            print(f"No finished jobs recorded in {self.path}.")
+            return
+        print(f"{'job':<40} {'runs':>5} {'failed':>6} {'mem waste':>10} {'time waste':>11} {'cpu waste':>10}")
+        for row in rows:
+            print(
+                f"{row['key']:<40} {row['runs']:>5} {row['failed']:>6} "
+                f"{_waste(row['mem_requested_mb'], row['mem_used_mb']):>10} "
+                f"{_waste(row['time_requested_s'], row['time_used_s']):>11} "
+                f"{_waste(row['cpu_allocated_s'], row['cpu_used_s']):>10}"
+            )
+
+
+def get_job_key(job_name: str, path: Path, func_name: str) -> str:
+    return f"{job_name}:{Path(path).stem}:{func_name}"
+
+
+def autosize_slurm_args(slurm_args: dict[str, any], key: str, history: Optional[ResourceHistory] = None) -> dict[str, any]:
+    """
+    Replaces `--mem auto` / `--time auto` in `slurm_args` with values suggested from the history of `key`.
+    Arguments without enough history are removed so the cluster defaults apply.
+    """
+    auto_args = [arg for arg in ("--mem", "--time") if str(slurm_args.get(arg)).lower() == "auto"]
+    if not auto_args:
+        return slurm_args
+    history = history or ResourceHistory()
+    history.update()
+    suggestion = history.suggest(key)
+    slurm_args = dict(slurm_args)
+    for arg in auto_args:
+        if arg in suggestion:
+            slurm_args[arg] = suggestion[arg]
+            print(f"Autosized {arg}={suggestion[arg]} from the history of {key}.")
+        else:
+            del slurm_args[arg]
+            print(f"Not enough history of {key} to autosize {arg}; using the cluster default.")
+    return slurm_args
+
+
+def main():
+    history = ResourceHistory(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HISTORY_FILE)
+    history.update()
+    history.print_report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Buffered, optionally compressed job logs (`@slurm_job(log_options={...})`).
+
+Inside the job, stdout/stderr are collected in memory and written to the log in large blocks instead of
+one small write per line. With compression, each block is an independent gzip member, so the file is a
+valid .gz stream that can be followed while it grows; an index file records the offset of each block.
+The log is rotated when it exceeds `max_bytes`, keeping at most `max_files` files, and ends with
+`SLURM_LOG_EOF_MESSAGE`. `slurmexec-log <file>` follows such a log, e.g. from `remoteexec`.
+"""
+import os
+import sys
+import time
+import zlib
+import threading
+from pathlib import Path
+from typing import Optional
+
+__all__ = ["BufferedLogWriter", "follow_log", "read_log"]
+
+
+class BufferedLogWriter:
+    """
+    Text stream writing to `path` in blocks.
+
+    Args:
+        path (str): Log file.
+        block_size (int, optional): Buffered bytes after which a block is written. Defaults to 1 MB.
+        flush_interval (float, optional): Seconds after which a non-empty buffer is written anyway, so the log
+            can be followed live. Defaults to 10.
+        compress (bool, optional): Whether to gzip each block. Defaults to True.
+        max_bytes (int, optional): Size after which the log is rotated to `{path}.1`, `{path}.2`, .... Defaults to None (no rotation).
+        max_files (int, optional): Number of rotated files kept. Defaults to 3.
+    """
+    def __init__(self, path: str, block_size: int = 1 << 20, flush_interval: float = 10, compress: bool = True, max_bytes: Optional[int] = None, max_files: int = 3):
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._uncompressed_offset = 0
+        # Reentrant: the checkpoint signal handler may print while the main thread is inside `write`
+        self._lock = threading.RLock()
+        self._writing = False
+        self._closed = False
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._index = open(self.index_path, "a")
+
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def write(self, data: str) -> int:
+        encoded = data.encode("utf-8", errors="replace")
+        with self._lock:
+            self._buffer.append(encoded)
+            self._buffered += len(encoded)
+            if self._buffered >= self.block_size:
+                self._write_block()
+        return len(data)
+
+    def flush(self):
+        with self._lock:
+            self._write_block()
+
+    def isatty(self):
+        return False
+
+    def close(self, eof_message: Optional[str] = None):
+        """Writes the remaining buffer and, if given, `eof_message` as the last line."""
+        if self._closed:
+            return
+        if eof_message is not None:
+            self.write(eof_message + "\n")
+        with self._lock:
+            self._write_block()
+            self._closed = True
+            self._file.close()
+            self._index.close()
+
+    def _flush_periodically(self):
+        while not self._closed:
+            time.sleep(min(1.0, self.flush_interval))
+            if self._buffered and time.monotonic() - self._last_flush >= self.flush_interval:
+                with self._lock:
+                    if not self._closed:
+                        self._write_block()
+
+    def _write_block(self):
+        if self._writing:
+            return  # re-entered from a signal handler in the middle of a block; the new data stays buffered
+        self._writing = True
+        try:
+            self._write_buffer()
+        finally:
+            self._writing = False
+
+    def _write_buffer(self):
+        self._last_flush = time.monotonic()
+        if not self._buffered or self._closed:
+            return
+        data = b"".join(self._buffer)
+        self._buffer, self._buffered = [], 0
+        block = data
+        if self.compress:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip member
+            block = compressor.compress(data) + compressor.flush()
+
+        if self.max_bytes is not None and self._file.tell() > 0 and self._file.tell() + len(block) > self.max_bytes:
+            self._rotate()
+        # index line: "{uncompressed offset} {offset in file}"; one line per block
+        self._index.write(f"{self._uncompressed_offset} {self._file.tell()}\n")
+        self._file.write(block)
+        self._file.flush()
+        self._index.flush()
+        self._uncompressed_offset += len(data)
+
+    def _rotate(self):
+        self._file.close()
+        self._index.close()
+        for i in range(self.max_files - 1, 0, -1):
+            for path in (self.path, self.index_path):
+                src = path.with_name(f"{path.name}.{i}")
+                if src.exists():
+                    os.replace(src, path.with_name(f"{path.name}.{i + 1}"))
+        for path in (self.path, self.index_path):
+            os.replace(path, path.with_name(f"{path.name}.1"))
+            path.with_name(f"{path.name}.{self.max_files + 1}").unlink(missing_ok=True)
+        self._file = open(self.path, "ab")
+        self._index = open(self.index_path, "a")
+
+
+class _BlockDecoder:
+    """Incrementally decodes a stream of concatenated gzip members (or plain text)."""
+    def __init__(self, compressed: bool):
+        self.compressed = compressed
+        self._decompressor = zlib.decompressobj(31)
+        self._text = b""
+
+    def feed(self, data: bytes) -> list[str]:
+        if not self.compressed:
+            self._text += data
+        while self.compressed and data:
+            self._text += self._decompressor.decompress(data)
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(31)
+            else:
+                data = b""
+        *lines, self._text = self._text.split(b"\n")
+        return [line.decode("utf-8", errors="replace") for line in lines]
+
+
+def _is_compressed(path: Path) -> bool:
+    return path.name.endswith(".gz") or ".gz." in path.name  # rotated logs are named "{log}.gz.{i}"
+
+
+def read_log(path: str, last_blocks: Optional[int] = None) -> list[str]:
+    """
+    Reads the lines of a (possibly compressed) buffered log.
+
+    Args:
+        path (str): Log file.
+        last_blocks (int, optional): Only read the last `last_blocks` blocks, found using the index. Defaults to None (all).
+    """
+    path = Path(path)
+    start = 0
+    index_path = path.with_name(path.name + ".idx")
+    if last_blocks is not None and index_path.exists():
+        offsets = [int(line.split()[1]) for line in index_path.read_text().splitlines() if line.strip()]
+        if len(offsets) > last_blocks:
+            start = offsets[-last_blocks]
+    with open(path, "rb") as f:
+        f.seek(start)
+        decoder = _BlockDecoder(_is_compressed(path))
+        return decoder.feed(f.read())
+
+
+def follow_log(path: str, end_message: Optional[str] = None, poll_interval: float = 1.0):
+    """
+    Yields the lines of a buffered log as they are written, following rotations, until `end_message` is read.
+    Waits for the file to be created.
+    """
+    path = Path(path)
+    while not path.exists():
+        time.sleep(poll_interval)
+    f = open(path, "rb")
+    inode = os.fstat(f.fileno()).st_ino
+    decoder = _BlockDecoder(_is_compressed(path))
+    try:
+        while True:
+            data = f.read()
+            if data:
+                for line in decoder.feed(data):
+                    yield line
+                    if end_message is not None and line.strip() == end_message:
+                        return
+                continue
+            try:
+                rotated = os.stat(path).st_ino != inode
+            except FileNotFoundError:
+                rotated = False
+            if rotated:
+                # The file was rotated and fully read; continue with the new file
+                f.close()
+                f = open(path, "rb")
+                inode = os.fstat(f.fileno()).st_ino
+                decoder = _BlockDecoder(_is_compressed(path))
+            else:
+                time.sleep(poll_interval)
+    finally:
+        f.close()
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: slurmexec-log <log file>")
+        sys.exit(1)
+    from .slurm import SLURM_LOG_EOF_MESSAGE
+    for line in follow_log(sys.argv[1], end_message=SLURM_LOG_EOF_MESSAGE):
+        print(line, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Map a function over many items, sharded across the tasks of a Slurm array job.
+
+    handle = slurm_map(process, files, target_seconds=1800)
+    handle.wait()
+    results = handle.gather()            # in the order of `files`
+    if handle.failed():
+        handle.retry({"--mem": "16G"})   # only the failed (or lost) items are run again
+
+Items are split into contiguous chunks, one per array task, sized so each task runs for about
+`target_seconds`. The time per item comes from `seconds_per_item`, from earlier maps of the same function,
+or from a pilot run of the first few items on the submitting host (whose results are kept). The last
+task gets the ragged tail. Each task saves the per-item results (or errors) of its chunk as it goes, so
+a retry only recomputes items without a successful result. The function is shipped by value
+(see `remoteexec.payload`).
+"""
+import os
+import json
+import math
+import time
+import pickle
+import traceback
+import subprocess
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional, Iterable
+
+__all__ = ["slurm_map", "MapHandle", "MapItemError", "run_map_shard"]
+
+DEFAULT_MAP_DIR = "~/.slurmexec/maps"
+DEFAULT_TIMINGS_FILE = "~/.slurmexec/map_timings.json"
+SAVE_INTERVAL = 60  # seconds between saves of the partial results of a task
+
+
+class MapItemError(Exception):
+    """Placeholder for an item whose call raised; holds the remote traceback."""
+    def __init__(self, index: int, message: str, traceback_str: str = ""):
+        super().__init__(index, message, traceback_str)
+        self.index = index
+        self.message = message
+        self.traceback = traceback_str
+
+    def __str__(self):
+        return f"Item {self.index} failed: {self.message}"
+
+
+def _function_key(func: callable) -> str:
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def _load_timings(path: str = DEFAULT_TIMINGS_FILE) -> dict[str, float]:
+    try:
+        return json.loads(Path(path).expanduser().read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_timing(key: str, seconds_per_item: float, path: str = DEFAULT_TIMINGS_FILE):
+    from .slurmexec_runner import write_atomic
+    timings = _load_timings(path)
+    timings[key] = seconds_per_item
+    path = Path(path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, json.dumps(timings, indent=1).encode())
+
+
+def _write_pickle(path: Path, value: any):
+    from .slurmexec_runner import write_atomic
+    write_atomic(path, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _read_pickle(path: Path) -> any:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def run_map_shard(func: callable, map_dir: str, todo_file: str, chunk_size: int, task_id: Optional[int] = None) -> int:
+    """
+    Runs `func` on the chunk of items of one array task and saves {item index: (ok, value, seconds)}
+    to `{map_dir}/results/{todo}_{task}.pkl`, also periodically while running.
+
+    Returns:
+        int: Number of failed items.
+    """
+    map_dir = Path(map_dir)
+    task_id = int(os.environ["SLURM_ARRAY_TASK_ID"]) if task_id is None else task_id
+    todo = _read_pickle(Path(todo_file))
+    indices = todo[task_id * chunk_size:(task_id + 1) * chunk_size]
+    items = _read_pickle(map_dir / "items.pkl")
+    result_file = map_dir / "results" / f"{Path(todo_file).stem}_{task_id}.pkl"
+    result_file.parent.mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    failed = 0
+    last_save = time.monotonic()
+    for index in indices:
+        start = time.perf_counter()
+        try:
+            results[index] = (True, func(items[index]), time.perf_counter() - start)
+        except Exception as e:
+            failed += 1
+            results[index] = (False, (repr(e), traceback.format_exc()), time.perf_counter() - start)
+            print(f"# Item {index} failed: {e!r}")
+        if time.monotonic() - last_save >= SAVE_INTERVAL:
+            _write_pickle(result_file, results)
+            last_save = time.monotonic()
+    _write_pickle(result_file, results)
+    print(f"# Processed {len(indices)} items ({failed} failed)")
+    return failed
+
+
+def _slurm_available() -> bool:
+    try:
+        subprocess.check_output(["slurmd", "-V"])
+        return True
+    except Exception:
+        return False
+
+
+class MapHandle:
+    """
+    Handle of a `slurm_map`; can be reopened later with `MapHandle(map_dir)`.
+
+    Args:
+        map_dir (str): Directory of the map on the shared filesystem.
+    """
+    def __init__(self, map_dir: str):
+        self.map_dir = Path(map_dir).expanduser()
+        with open(self.map_dir / "map.json") as f:
+            self._meta = json.load(f)
+        self.n_items = self._meta["n_items"]
+
+    @property
+    def job_ids(self) -> list[str]:
+        return list(self._meta["job_ids"])
+
+    def _save_meta(self):
+        from .slurmexec_runner import write_atomic
+        write_atomic(self.map_dir / "map.json", json.dumps(self._meta, indent=1).encode())
+
+    def _results(self) -> dict[int, tuple]:
+        """Results by item index; a successful result wins over failures of earlier attempts."""
+        results = {}
+        for file in sorted((self.map_dir / "results").glob("*.pkl"), key=lambda path: path.stat().st_mtime):
+            try:
+                shard = _read_pickle(file)
+            except (EOFError, pickle.UnpicklingError):
+                continue
+            for index, result in shard.items():
+                if result[0] or index not in results or not results[index][0]:
+                    results[index] = result
+        return results
+
+    def failed(self) -> list[int]:
+        """Indices of items without a successful result (failed, or not run because their task was lost)."""
+        results = self._results()
+        return [index for index in range(self.n_items) if not results.get(index, (False,))[0]]
+
+    def is_finished(self) -> bool:
+        """Whether no task of any submission of this map is queued or running."""
+        job_ids = [job_id for job_id in self._meta["job_ids"] if job_id is not None]
+        if not job_ids:
+            return True
+        output = subprocess.run(["squeue", "-h", "-j", ",".join(job_ids)], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding="utf-8").stdout
+        return not output.strip()
+
+    def wait(self, poll_interval: float = 30, timeout: Optional[float] = None):
+        """Waits until all tasks left the queue."""
+        start = time.monotonic()
+        while not self.is_finished():
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise TimeoutError(f"Map {self.map_dir.name} did not finish within {timeout}s")
+            time.sleep(poll_interval)
+
+    def status(self) -> dict[str, int]:
+        """Number of items "done", "failed" and "missing" (no result yet)."""
+        results = self._results()
+        done = sum(1 for result in results.values() if result[0])
+        return {"done": done, "failed": len(results) - done, "missing": self.n_items - len(results)}
+
+    def gather(self, strict: bool = True) -> list[any]:
+        """
+        Returns the results in item order and records the measured time per item for sizing later maps.
+
+        Args:
+            strict (bool, optional): Whether to raise if any item has no successful result; otherwise
+                such items are `MapItemError` instances (None if never run). Defaults to True.
+        """
+        results = self._results()
+        seconds = [result[2] for result in results.values() if result[0]]
+        if seconds:
+            _save_timing(self._meta["function_key"], sum(seconds) / len(seconds))
+        failed = [index for index in range(self.n_items) if not results.get(index, (False,))[0]]
+        if strict and failed:
+            shown = ", ".join(map(str, failed[:20])) + (", ..." if len(failed) > 20 else "")
+            raise RuntimeError(f"{len(failed)} of {self.n_items} items have no result (indices {shown}); use retry() or gather(strict=False)")
+        gathered = []
+        for index in range(self.n_items):
+            ok, value, _ = results.get(index, (False, None, 0))
+            gathered.append(value if ok else (MapItemError(index, *value) if value is not None else None))
+        return gathered
+
+    def retry(self, slurm_args: Optional[dict[str, any]] = None) -> Optional[str]:
+        """
+        Submits the items without a successful result again, sharded as before.
+
+        Args:
+            slurm_args (dict, optional): Overrides of the Slurm arguments, e.g. more memory.
+
+        Returns:
+            str: Job id, or None if nothing had to be retried.
+        """
+        failed = self.failed()
+        if not failed:
+            print("All items have results; nothing to retry")
+            return None
+        print(f"Retrying {len(failed)} of {self.n_items} items")
+        from .payload import loads_call
+        func, _, _ = loads_call((self.map_dir / "func.payload").read_bytes())
+        job_args = dict(self._meta["slurm_args"]) | (slurm_args or {})
+        return self._submit(func, failed, self._meta["chunk_size"], job_args)
+
+    def _submit(self, func: callable, indices: list[int], chunk_size: int, slurm_args: dict[str, any]) -> Optional[str]:
+        data = pickle.dumps(indices, protocol=pickle.HIGHEST_PROTOCOL)
+        todo_file = self.map_dir / f"todo_{sha256(data).hexdigest()[:12]}_{len(self._meta['job_ids'])}.pkl"
+        _write_pickle(todo_file, indices)
+        n_tasks = math.ceil(len(indices) / chunk_size)
+
+        if not _slurm_available():
+            print(f"*** Slurm not available; running {n_tasks} map tasks locally")
+            from .slurm import local_slurm_debug
+            with local_slurm_debug():
+                for task_id in range(n_tasks):
+                    run_map_shard(func, str(self.map_dir), str(todo_file), chunk_size, task_id)
+            self._meta["job_ids"].append(None)
+            self._save_meta()
+            return None
+
+        from .slurm import SlurmJobMeta
+        from .payload import slurm_call
+        job_args = dict(slurm_args)
+        max_concurrent = job_args.pop("max_concurrent", None)
+        job_args["--array"] = f"0-{n_tasks - 1}" + (f"%{max_concurrent}" if max_concurrent else "")
+        job_meta = SlurmJobMeta(job_name=self._meta["job_name"], pre_run_commands=self._meta["pre_run_commands"])
+        job = slurm_call(run_map_shard, func, str(self.map_dir), str(todo_file), chunk_size, slurm_args=job_args, job_meta=job_meta)
+        self._meta["job_ids"].append(job.job_id)
+        self._save_meta()
+        print(f"Map {self.map_dir.name}: {len(indices)} items in {n_tasks} tasks of up to {chunk_size} items (job {job.job_id})")
+        return job.job_id
+
+
+def _choose_chunk_size(n_items: int, seconds_per_item: float, target_seconds: float, max_tasks: int) -> int:
+    chunk_size = max(1, int(target_seconds // max(seconds_per_item, 1e-9)))
+    return max(chunk_size, math.ceil(n_items / max_tasks))
+
+
+def slurm_map(
+    func: callable,
+    items: Iterable,
+    target_seconds: float = 1800,
+    seconds_per_item: Optional[float] = None,
+    pilot: int = 3,
+    max_tasks: int = 1000,
+    slurm_args: Optional[dict[str, any]] = None,
+    map_dir: str = DEFAULT_MAP_DIR,
+) -> MapHandle:
+    """
+    Calls `func(item)` for every item of `items`, sharded across the tasks of an array job.
+
+    Mapping the same function over the same items again reopens the existing map and submits only the items
+    without a successful result.
+
+    Args:
+        func (callable): Function of one item; a @slurm_job function's Slurm arguments are used.
+        items (Iterable): Picklable items.
+        target_seconds (float, optional): Targeted runtime of each array task. Defaults to 1800.
+        seconds_per_item (float, optional): Time per item. Defaults to the time measured by earlier maps of `func`,
+            else to the time of a pilot run.
+        pilot (int, optional): Number of items run on this host to measure the time per item when no timing is
+            known; their results are kept. Defaults to 3.
+        max_tasks (int, optional): Maximum number of array tasks; chunks grow beyond `target_seconds` if needed. Defaults to 1000.
+        slurm_args (dict, optional): Slurm arguments, e.g. {"--time": "1:00:00"}; "max_concurrent" limits the number
+            of simultaneously running tasks (`--array=...%N`).
+        map_dir (str, optional): Parent directory of the map's files on the shared filesystem. Defaults to ~/.slurmexec/maps.
+
+    Returns:
+        MapHandle: Handle to wait for, gather and retry the map.
+    """
+    meta = getattr(func, "_slurm_job_meta", None)
+    if hasattr(func, "_is_slurm_job"):
+        func = func.__wrapped__
+    items = list(items)
+    job_args = dict(meta.slurm_args) if meta is not None else {}
+    job_args.update(slurm_args or {})
+
+    from .payload import dumps_call
+    func_data = dumps_call(func)  # validates that the function can be shipped before anything is written
+    items_data = pickle.dumps(items, protocol=pickle.HIGHEST_PROTOCOL)
+    map_id = f"{func.__name__}_{sha256(func_data + items_data).hexdigest()[:16]}"
+    directory = Path(map_dir).expanduser() / map_id
+    (directory / "results").mkdir(parents=True, exist_ok=True)
+
+    if (directory / "map.json").exists():
+        # Same function and items: reopen the map, keeping its submissions, and run only the items without a result
+        handle = MapHandle(directory)
+        if not handle.is_finished():
+            print(f"Map {map_id} is already running (jobs {', '.join(map(str, handle.job_ids))})")
+            return handle
+        todo = handle.failed()
+        print(f"Reopened map {map_id}: {len(items) - len(todo)} of {len(items)} items have results")
+        if todo:
+            handle._submit(func, todo, handle._meta["chunk_size"], job_args)
+        return handle
+
+    from .slurmexec_runner import write_atomic
+    write_atomic(directory / "items.pkl", items_data)
+    write_atomic(directory / "func.payload", func_data)
+
+    function_key = _function_key(func)
+    todo = list(range(len(items)))
+    if seconds_per_item is None:
+        seconds_per_item = _load_timings().get(function_key)
+        if seconds_per_item is not None:
+            print(f"Using the measured time of {seconds_per_item:.3g}s per item of earlier maps")
+    if seconds_per_item is None and todo:
+        n_pilot = min(pilot, len(todo)) or 1
+        print(f"Pilot run of {n_pilot} items to measure the time per item")
+        from .slurm import local_slurm_debug
+        results = {}
+        with local_slurm_debug():
+            for index in todo[:n_pilot]:
+                start = time.perf_counter()
+                try:
+                    results[index] = (True, func(items[index]), time.perf_counter() - start)
+                except Exception as e:
+                    results[index] = (False, (repr(e), traceback.format_exc()), time.perf_counter() - start)
+        _write_pickle(directory / "results" / "pilot.pkl", results)
+        seconds_per_item = sum(result[2] for result in results.values()) / len(results)
+        todo = [index for index in todo if not results.get(index, (False,))[0]]
+        print(f"Measured {seconds_per_item:.3g}s per item")
+
+    chunk_size = _choose_chunk_size(len(todo), seconds_per_item, target_seconds, max_tasks)
+    write_atomic(directory / "map.json", json.dumps({
+        "n_items": len(items),
+        "function_key": function_key,
+        "job_name": f"map-{meta.job_name if meta is not None else func.__name__}",
+        "pre_run_commands": list(meta.pre_run_commands) if meta is not None else [],
+        "chunk_size": chunk_size,
+        "seconds_per_item": seconds_per_item,
+        "slurm_args": job_args,
+        "job_ids": [],
+    }, indent=1).encode())
+
+    handle = MapHandle(directory)
+    if todo:
+        handle._submit(func, todo, chunk_size, job_args)
+    return handle
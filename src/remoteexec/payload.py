@@ -0,0 +1,264 @@
+"""
+Ship a function by value, instead of syncing the project tree, and run it remotely or in a Slurm job.
+
+`dumps_call(func, *args, **kwargs)` serializes the function, together with its closures and the module-level
+helpers and globals it references, plus its arguments into one compressed payload. Functions from installed
+packages (and remoteexec itself) are referenced by name; functions from `__main__` and from local, not
+installed modules are shipped by value. The payload is only valid for the same Python minor version.
+
+    result = remote_call("myserver", analyze, "run1", threshold=0.5)  # over ssh; stdout/stderr are streamed
+    job = slurm_call(analyze, "run1", slurm_args={"--time": "1:00:00"})  # inside a Slurm job
+    result = job.result()
+"""
+import io
+import sys
+import zlib
+import types
+import pickle
+import marshal
+import builtins
+import importlib
+import sysconfig
+import subprocess
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+
+__all__ = ["dumps_call", "loads_call", "run_payload", "remote_call", "slurm_call", "PayloadJob"]
+
+_RESULT_MARKER = b"#REMOTEEXEC_PAYLOAD_RESULT:"
+_INSTALLED_PATHS = tuple({sysconfig.get_paths()[name] for name in ("stdlib", "platstdlib", "purelib", "platlib")})
+
+
+def _is_installed_module(module_name: str) -> bool:
+    if module_name.split(".", 1)[0] == "remoteexec":
+        return True
+    module = sys.modules.get(module_name)
+    if module is None or module_name == "__main__":
+        return False
+    module_file = getattr(module, "__file__", None)
+    return module_file is None or module_file.startswith(_INSTALLED_PATHS)  # built-in or installed
+
+
+def _global_names(code: types.CodeType) -> set[str]:
+    """Names a code object (including nested functions and comprehensions) may look up in its globals."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def _make_function(code: bytes, name: str, qualname: str, module: str, n_cells: int):
+    func_globals = {"__builtins__": builtins, "__name__": module}
+    closure = tuple(types.CellType() for _ in range(n_cells)) or None
+    func = types.FunctionType(marshal.loads(code), func_globals, name, None, closure)
+    func.__qualname__ = qualname
+    func.__module__ = module
+    return func
+
+
+def _set_function_state(func, state):
+    func_globals, defaults, kwdefaults, cell_contents, func_dict = state
+    func.__globals__.update(func_globals)
+    func.__defaults__ = defaults
+    func.__kwdefaults__ = kwdefaults
+    for cell, value in zip(func.__closure__ or (), cell_contents):
+        if value is not _EMPTY_CELL:
+            cell.cell_contents = value
+    func.__dict__.update(func_dict)
+    return func
+
+
+class _EmptyCell:
+    def __reduce__(self):
+        return "_EMPTY_CELL"
+
+_EMPTY_CELL = _EmptyCell()
+
+
+class _PayloadPickler(pickle.Pickler):
+    """Pickler that stores local functions by value and modules by name."""
+    def reducer_override(self, obj):
+        if isinstance(obj, types.ModuleType):
+            return importlib.import_module, (obj.__name__,)
+        if isinstance(obj, types.FunctionType) and self._by_value(obj):
+            return self._reduce_function(obj)
+        return NotImplemented
+
+    @staticmethod
+    def _by_value(func: types.FunctionType) -> bool:
+        if "<locals>" in func.__qualname__ or func.__name__ == "<lambda>":
+            return True  # cannot be imported by name
+        return not _is_installed_module(func.__module__)
+
+    @staticmethod
+    def _reduce_function(func: types.FunctionType):
+        code = func.__code__
+        func_globals = {
+            name: func.__globals__[name]
+            for name in _global_names(code)
+            if name in func.__globals__
+        }
+        cell_contents = []
+        for cell in func.__closure__ or ():
+            try:
+                cell_contents.append(cell.cell_contents)
+            except ValueError:
+                cell_contents.append(_EMPTY_CELL)
+        state = (func_globals, func.__defaults__, func.__kwdefaults__, tuple(cell_contents), dict(func.__dict__))
+        args = (marshal.dumps(code), func.__name__, func.__qualname__, func.__module__, len(cell_contents))
+        # The state is set after the function is memoized, so (mutually) recursive functions work
+        return _make_function, args, state, None, None, _set_function_state
+
+
+def dumps_call(func: callable, *args, **kwargs) -> bytes:
+    """
+    Serializes a call of `func` with `args` and `kwargs` into a compressed payload.
+    For a @slurm_job function the undecorated function is shipped.
+    """
+    if hasattr(func, "_is_slurm_job"):
+        func = func.__wrapped__
+    # The Python version precedes the pickle: marshalled code can only be loaded by the same version
+    buffer = io.BytesIO(_python_version().encode() + b"\n")
+    buffer.seek(0, io.SEEK_END)
+    _PayloadPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump({
+        "func": func,
+        "args": args,
+        "kwargs": kwargs,
+    })
+    return zlib.compress(buffer.getvalue())
+
+
+def _python_version() -> str:
+    return f"{sys.version_info.major}.{sys.version_info.minor}"
+
+
+def loads_call(payload: bytes) -> tuple[callable, tuple, dict]:
+    """
+    Deserializes a payload created by `dumps_call` into (func, args, kwargs).
+
+    Raises:
+        RuntimeError: If the payload was created with another Python minor version
+    """
+    version, _, data = zlib.decompress(payload).partition(b"\n")
+    version = version.decode("ascii", errors="replace")
+    if version != _python_version():
+        raise RuntimeError(f"Payload was created with Python {version}, cannot run it with Python {_python_version()}")
+    call = pickle.loads(data)
+    return call["func"], call["args"], call["kwargs"]
+
+
+def run_payload(payload: bytes) -> any:
+    """Runs the call serialized in `payload` and returns its result."""
+    func, args, kwargs = loads_call(payload)
+    return func(*args, **kwargs)
+
+
+def remote_call(remote: str, func: callable, *args, python: str = "python", **kwargs) -> any:
+    """
+    Runs `func(*args, **kwargs)` on `remote` via ssh and returns its result. Only the payload is transferred;
+    remoteexec must be installed for `python` on the remote. Output of the function is streamed to stderr.
+    Exceptions raised by the function are re-raised locally.
+    """
+    process = subprocess.run(
+        ["ssh", remote, f"{python} -m remoteexec.payload"],
+        input=dumps_call(func, *args, **kwargs),
+        stdout=subprocess.PIPE,
+    )
+    marker = process.stdout.rfind(_RESULT_MARKER)
+    if marker == -1:
+        raise RuntimeError(f"Remote call of {func.__name__} on {remote} failed (return code {process.returncode})")
+    ok, value = pickle.loads(zlib.decompress(process.stdout[marker + len(_RESULT_MARKER):]))
+    if not ok:
+        raise value
+    return value
+
+
+class PayloadJob:
+    """Handle to a function call submitted with `slurm_call`."""
+    def __init__(self, job_id: str, log_file: str, result_file: Path):
+        self.job_id = job_id
+        self.log_file = log_file
+        self.result_file = result_file
+
+    def is_finished(self) -> bool:
+        output = subprocess.run(["squeue", "-h", "-j", self.job_id], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding="utf-8").stdout
+        return self.result_file.exists() or not output.strip()
+
+    def result(self, timeout: Optional[float] = None, poll_interval: float = 10) -> any:
+        """Waits for the job to finish and returns the function's return value."""
+        import time
+        start = time.monotonic()
+        while not self.is_finished():
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise TimeoutError(f"Job {self.job_id} did not finish within {timeout}s")
+            time.sleep(poll_interval)
+        if not self.result_file.exists():
+            raise RuntimeError(f"Job {self.job_id} finished without a result; see its log {self.log_file}")
+        with open(self.result_file, "rb") as f:
+            return pickle.load(f)
+
+
+def slurm_call(func: callable, *args, slurm_args: Optional[dict[str, any]] = None, job_meta=None, **kwargs) -> PayloadJob:
+    """
+    Submits `func(*args, **kwargs)` as a Slurm job without any source files: the payload is written to
+    ~/.slurmexec/payloads on the shared filesystem and run by `slurmexec-run`. For a @slurm_job function,
+    its Slurm arguments and pre-run commands are used, unless `job_meta` (a `SlurmJobMeta`) is given.
+
+    Returns:
+        PayloadJob: Handle to wait for the result.
+    """
+    from .slurm import SlurmJobMeta, run_sbatch
+    from .slurmexec_runner import write_atomic
+    from .slurmexec_client import create_slurm_args, create_slurm_script, write_invocation_record, write_script_file
+
+    meta = job_meta or getattr(func, "_slurm_job_meta", None) or SlurmJobMeta(job_name=func.__name__)
+    payload = dumps_call(func, *args, **kwargs)
+    payload_dir = Path.home() / ".slurmexec" / "payloads"
+    payload_dir.mkdir(parents=True, exist_ok=True)
+    payload_file = payload_dir / f"{sha256(payload).hexdigest()[:16]}.payload"
+    if not payload_file.exists():
+        write_atomic(payload_file, payload)
+
+    output_dir = Path.home() / "slurm_logs"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    job_args = create_slurm_args(meta)
+    job_args.update(slurm_args or {})
+    invocation_file = write_invocation_record(payload_dir, Path(f"{func.__name__}.payload"), func.__name__, {}, payload=str(payload_file), result_dir=str(output_dir))
+    script = create_slurm_script(meta, job_args, output_dir / "%j.out", invocation_file=invocation_file)
+    script_file = write_script_file(payload_dir, func.__name__, script)
+
+    output = run_sbatch(script_file)
+    if not output.startswith("Submitted batch job"):
+        raise RuntimeError(f"Failed to submit {func.__name__}: {output}")
+    job_id = output.rsplit(" ", maxsplit=1)[-1]
+    print(f"{output} ({func.__name__} shipped as {len(payload)} byte payload)")
+    return PayloadJob(job_id, str(output_dir / f"{job_id}.out"), output_dir / f"{job_id}.rank0.result.pkl")
+
+
+def main():
+    # Entry point of `remote_call`: read a payload on stdin, write the pickled result after a marker on stdout
+    payload = sys.stdin.buffer.read()
+    stdout = sys.stdout
+    sys.stdout = sys.stderr  # keep the function's output out of the result stream
+    try:
+        result = (True, run_payload(payload))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        result = (False, e)
+    finally:
+        sys.stdout = stdout
+    try:
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        data = pickle.dumps((False, RuntimeError(f"Result could not be pickled: {e!r}")))
+    stdout.flush()
+    stdout.buffer.write(_RESULT_MARKER + zlib.compress(data))
+    stdout.buffer.flush()
+    sys.exit(0 if result[0] else 1)
+
+
+if __name__ == "__main__":
+    main()
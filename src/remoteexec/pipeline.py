@@ -0,0 +1,223 @@
+"""
+Pipelines of @slurm_job functions connected by job dependencies.
+
+All stages are submitted at once; Slurm holds each one until its dependencies finish
+(`--dependency=afterok:<id>`), so no queue time is spent waiting between stages:
+
+    pipeline = SlurmPipeline()
+    pre = pipeline.add(preprocess, {"dataset": "a"})
+    fit = pipeline.add(train, {"epochs": 10}, after=[pre])
+    pipeline.add(evaluate, after=[fit], dependency="afterany")
+    handle = pipeline.submit()    # or pipeline.run_local(max_workers=4)
+    print(handle.status())
+"""
+import subprocess
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+__all__ = ["SlurmPipeline", "PipelineNode", "PipelineHandle", "LocalPipelineHandle"]
+
+DEPENDENCY_TYPES = ("afterok", "afterany", "afternotok", "aftercorr")
+
+
+class PipelineNode:
+    """A single @slurm_job call in a pipeline."""
+    def __init__(self, name: str, func: callable, kwargs: dict[str, any], after: list["PipelineNode"], dependency: str, slurm_args: dict[str, any]):
+        self.name = name
+        self.func = func
+        self.kwargs = kwargs
+        self.after = after
+        self.dependency = dependency
+        self.slurm_args = slurm_args
+
+    def __repr__(self):
+        return f"PipelineNode({self.name!r}, after={[node.name for node in self.after]}, dependency={self.dependency!r})"
+
+
+class SlurmPipeline:
+    """Directed acyclic graph of @slurm_job functions."""
+    def __init__(self):
+        self.nodes: dict[str, PipelineNode] = {}
+
+    def add(
+        self,
+        func: callable,
+        kwargs: Optional[dict[str, any]] = None,
+        after: Optional[list[PipelineNode]] = None,
+        dependency: str = "afterok",
+        name: Optional[str] = None,
+        slurm_args: Optional[dict[str, any]] = None,
+    ) -> PipelineNode:
+        """
+        Adds a stage to the pipeline.
+
+        Args:
+            func (callable): Function decorated with @slurm_job.
+            kwargs (dict, optional): Keyword arguments of the function. Defaults to the function defaults.
+            after (list[PipelineNode], optional): Stages that must finish before this one starts.
+            dependency (str, optional): Slurm dependency type on the stages in `after`: "afterok" (default), "afterany",
+                "afternotok" or "aftercorr" (array task i waits for task i of each dependency).
+            name (str, optional): Unique stage name. Defaults to the function name.
+            slurm_args (dict, optional): Additional sbatch arguments for this stage.
+
+        Returns:
+            PipelineNode: The added stage, to be used in `after` of later stages.
+        """
+        if not hasattr(func, "_slurm_job_meta"):
+            raise ValueError(f"Function {func.__name__} must be decorated with @slurm_job")
+        if dependency not in DEPENDENCY_TYPES:
+            raise ValueError(f"dependency must be one of {DEPENDENCY_TYPES}, got '{dependency}'")
+        after = list(after or [])
+        for parent in after:
+            if self.nodes.get(parent.name) is not parent:
+                raise ValueError(f"Dependency {parent.name} is not a stage of this pipeline")
+
+        if name is None:
+            name = func.__name__
+            i = 1
+            while name in self.nodes:
+                i += 1
+                name = f"{func.__name__}_{i}"
+        elif name in self.nodes:
+            raise ValueError(f"A stage named '{name}' already exists")
+
+        node = PipelineNode(name, func, dict(kwargs or {}), after, dependency, dict(slurm_args or {}))
+        # Stages can only depend on previously added stages, so insertion order is a topological order
+        self.nodes[name] = node
+        return node
+
+    def submit(self) -> "PipelineHandle":
+        """
+        Submits every stage via sbatch at once, chaining them with `--dependency`.
+        If a submission fails, the stages submitted so far are cancelled.
+        """
+        from .slurmexec_client import submit_slurm_job
+
+        job_ids: dict[str, Optional[str]] = {}  # None for stages with a cached result
+        for node in self.nodes.values():
+            extra_slurm_args = dict(node.slurm_args)
+            parent_ids = [job_ids[parent.name] for parent in node.after if job_ids[parent.name] is not None]
+            if parent_ids:
+                extra_slurm_args["--dependency"] = node.dependency + "".join(f":{job_id}" for job_id in parent_ids)
+
+            out_data = submit_slurm_job(node.func, node.kwargs, extra_slurm_args=extra_slurm_args)
+            if not out_data["success"]:
+                submitted = [job_id for job_id in job_ids.values() if job_id is not None]
+                if submitted:
+                    subprocess.run(["scancel", *submitted])
+                raise RuntimeError(f"Failed to submit pipeline stage '{node.name}': {out_data['message']}")
+            job_ids[node.name] = out_data.get("job_id")
+
+        return PipelineHandle(self, job_ids)
+
+    def run_local(self, max_workers: Optional[int] = None) -> "LocalPipelineHandle":
+        """
+        Executes the pipeline locally (in Slurm debug mode, restored afterwards), running independent stages in parallel threads.
+        Dependency types are honored as on Slurm: stages whose dependencies can no longer be satisfied are cancelled.
+        Blocks until all stages finished.
+        """
+        from .slurm import local_slurm_debug
+
+        handle = LocalPipelineHandle(self)
+        remaining = list(self.nodes.values())
+        running = {}
+
+        with local_slurm_debug(), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while remaining or running:
+                for node in list(remaining):
+                    parent_states = [handle.states[parent.name] for parent in node.after]
+                    if any(state in ("PENDING", "RUNNING") for state in parent_states):
+                        continue
+                    remaining.remove(node)
+                    if _is_dependency_satisfied(node.dependency, parent_states):
+                        handle.states[node.name] = "RUNNING"
+                        running[executor.submit(node.func, **node.kwargs)] = node
+                    else:
+                        handle.states[node.name] = "CANCELLED"
+
+                if not running:
+                    continue
+                done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    try:
+                        handle.results[node.name] = future.result()
+                        handle.states[node.name] = "COMPLETED"
+                    except Exception as e:
+                        print(f"Pipeline stage '{node.name}' failed: {e!r}")
+                        handle.errors[node.name] = e
+                        handle.states[node.name] = "FAILED"
+
+        return handle
+
+
+def _is_dependency_satisfied(dependency: str, parent_states: list[str]) -> bool:
+    if dependency == "afterany":
+        return True
+    if dependency == "afternotok":
+        return all(state != "COMPLETED" for state in parent_states)
+    return all(state == "COMPLETED" for state in parent_states)  # afterok, aftercorr
+
+
+_FAILED_STATES = ("FAILED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL", "BOOT_FAIL", "DEADLINE")
+_ACTIVE_STATES = ("PENDING", "RUNNING", "REQUEUED", "RESIZING", "SUSPENDED", "CONFIGURING", "COMPLETING")
+
+
+def _aggregate_states(states: list[str]) -> str:
+    """State of a stage from the states of its array tasks: FAILED if any task failed, else RUNNING while any is active."""
+    if len(set(states)) == 1:
+        return states[0]
+    if any(state in _FAILED_STATES for state in states):
+        return "FAILED"
+    if any(state in _ACTIVE_STATES for state in states):
+        return "RUNNING"
+    return next(state for state in states if state != "COMPLETED")  # e.g. some tasks CANCELLED
+
+
+class PipelineHandle:
+    """Handle to a pipeline submitted to Slurm."""
+    def __init__(self, pipeline: SlurmPipeline, job_ids: dict[str, str]):
+        self.pipeline = pipeline
+        self.job_ids = job_ids
+
+    def status(self) -> dict[str, str]:
+        """
+        Queries the state of every stage with a single sacct call.
+
+        Returns:
+            dict[str, str]: Slurm job state (e.g. "PENDING", "RUNNING", "COMPLETED") of each stage. For array
+                stages, "FAILED" if any task failed, else "RUNNING" while tasks are pending or running.
+        """
+        submitted = [job_id for job_id in self.job_ids.values() if job_id is not None]
+        states = {None: "COMPLETED"}  # cached stages
+        if not submitted:
+            return {name: "COMPLETED" for name in self.job_ids}
+        output = subprocess.check_output(
+            ["sacct", "-n", "-P", "-X", "--format=JobID,State", "-j", ",".join(submitted)],
+            encoding="utf-8",
+        )
+        task_states = {}
+        for line in output.splitlines():
+            if "|" not in line:
+                continue
+            job_id, state = line.split("|", 1)
+            # Array tasks ("123_4", "123_[5-9]") are rows of their parent job id
+            task_states.setdefault(job_id.split("_", 1)[0], []).append(state.split(" ", 1)[0])  # e.g. "CANCELLED by 123"
+        states.update({job_id: _aggregate_states(job_states) for job_id, job_states in task_states.items()})
+        return {name: states.get(job_id, "UNKNOWN") for name, job_id in self.job_ids.items()}
+
+    def cancel(self):
+        """Cancels all stages of the pipeline."""
+        subprocess.run(["scancel", *[job_id for job_id in self.job_ids.values() if job_id is not None]])
+
+
+class LocalPipelineHandle:
+    """Result of a pipeline executed with `SlurmPipeline.run_local`."""
+    def __init__(self, pipeline: SlurmPipeline):
+        self.pipeline = pipeline
+        self.states = {name: "PENDING" for name in pipeline.nodes}
+        self.results: dict[str, any] = {}
+        self.errors: dict[str, Exception] = {}
+
+    def status(self) -> dict[str, str]:
+        return dict(self.states)
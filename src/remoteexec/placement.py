@@ -0,0 +1,203 @@
+"""
+Queue-aware choice of the partition and cluster a job is submitted to.
+
+Given candidate targets ("partition", or "remote:partition" for a cluster reached via ssh), the queue
+state of every host is fetched with one batched `sinfo`/`squeue` call (a single ssh call for remotes)
+and cached for a short time. The start time of the requested resources is estimated per target from
+the idle CPUs, the CPUs requested by pending jobs and the time left of running jobs, and the target
+with the earliest estimate is chosen. Each decision is printed and appended to ~/.slurmexec/placement.jsonl.
+
+    target = select_target(["gpu", "cpu", "clusterb:gpu"], cpus=8)
+    # or: remoteexec --remote clustera,clusterb --partitions gpu,cpu slurmexec job.py ...
+"""
+import json
+import time
+import subprocess
+from pathlib import Path
+from typing import Optional, NamedTuple
+
+from .history import parse_slurm_duration
+
+__all__ = ["Target", "parse_target", "query_queue_state", "estimate_start_time", "select_target"]
+
+DEFAULT_CACHE_FILE = "~/.slurmexec/queue_cache.json"
+DEFAULT_LOG_FILE = "~/.slurmexec/placement.jsonl"
+_SEPARATOR = "#SLURMEXEC-SQUEUE"
+
+
+class Target(NamedTuple):
+    remote: Optional[str]  # None: the local cluster
+    partition: Optional[str]  # None: the default partition
+
+    def __str__(self):
+        name = self.partition or "(default partition)"
+        return name if self.remote is None else f"{self.remote}:{name}"
+
+
+def parse_target(target: str | Target) -> Target:
+    """Parses "partition", "remote:partition" or "remote:" (default partition of `remote`)."""
+    if isinstance(target, Target):
+        return target
+    if ":" in target:
+        remote, partition = target.split(":", 1)
+        return Target(remote or None, partition or None)
+    return Target(None, target or None)
+
+
+def _queue_command(partitions: list[str]) -> str:
+    partition_filter = f" -p {','.join(partitions)}" if partitions else ""
+    # sinfo: partition|availability|CPUs allocated/idle/other/total; squeue: partition|state|CPUs|time left
+    return (
+        f"sinfo -h{partition_filter} -o '%P|%a|%C'; echo '{_SEPARATOR}'; "
+        f"squeue -h{partition_filter} -t PD,R -o '%P|%T|%C|%L'"
+    )
+
+
+def _parse_queue_state(output: str) -> dict[str, dict]:
+    sinfo_output, _, squeue_output = output.partition(_SEPARATOR)
+    state = {}
+    for line in sinfo_output.splitlines():
+        fields = line.strip().split("|")
+        if len(fields) != 3:
+            continue
+        partition, availability, cpus = fields
+        is_default = partition.endswith("*")  # the default partition is marked with *
+        partition = partition.rstrip("*")
+        allocated, idle, other, total = (int(n) for n in cpus.split("/"))
+        entry = state.setdefault(partition, {"default": is_default, "up": False, "idle_cpus": 0, "total_cpus": 0, "pending_cpus": 0, "running": []})
+        entry["up"] |= availability == "up"
+        entry["idle_cpus"] += idle
+        entry["total_cpus"] += total
+    for line in squeue_output.splitlines():
+        fields = line.strip().split("|")
+        if len(fields) != 4:
+            continue
+        partition, job_state, cpus, time_left = fields
+        entry = state.get(partition.split(",", 1)[0])
+        if entry is None:
+            continue
+        if job_state == "PENDING":
+            entry["pending_cpus"] += int(cpus)
+        else:
+            entry["running"].append((parse_slurm_duration(time_left), int(cpus)))
+    return state
+
+
+def query_queue_state(remote: Optional[str], partitions: list[str], ttl: float = 60, cache_file: str = DEFAULT_CACHE_FILE) -> dict[str, dict]:
+    """
+    Queue state of `partitions` (all if empty) on `remote` (None: local), from one sinfo/squeue call
+    or the cache if younger than `ttl` seconds.
+
+    Returns:
+        dict[str, dict]: By partition: "default", "up", "idle_cpus", "total_cpus", "pending_cpus" and "running"
+            (list of (seconds left or None if unlimited, CPUs) of running jobs).
+    """
+    key = f"{remote or ''}:{','.join(sorted(partitions))}"
+    cache_file = Path(cache_file).expanduser()
+    try:
+        cache = json.loads(cache_file.read_text())
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry["time"] < ttl:
+        return _parse_queue_state(entry["output"])
+
+    command = _queue_command(partitions)
+    full_command = ["sh", "-c", command] if remote is None else ["ssh", remote, command]
+    process = subprocess.run(full_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding="utf-8")
+    if process.returncode != 0 and not process.stdout.strip():
+        raise RuntimeError(f"Could not query the queue of {remote or 'the local cluster'} (return code {process.returncode})")
+
+    from .slurmexec_runner import write_atomic
+    cache[key] = {"time": time.time(), "output": process.stdout}
+    cache = {k: v for k, v in cache.items() if time.time() - v["time"] < max(ttl, 3600)}  # drop old entries
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(cache_file, json.dumps(cache).encode())
+    return _parse_queue_state(process.stdout)
+
+
+def estimate_start_time(partition_state: Optional[dict], cpus: int = 1) -> float:
+    """
+    Estimated seconds until `cpus` CPUs are free in a partition, assuming pending jobs start first and
+    running jobs end at their time limit; inf if the partition is down, unknown or too small.
+    """
+    if partition_state is None or not partition_state["up"] or partition_state["total_cpus"] < cpus:
+        return float("inf")
+    free = partition_state["idle_cpus"] - partition_state["pending_cpus"]
+    if free >= cpus:
+        return 0.0
+    for time_left, job_cpus in sorted(partition_state["running"], key=lambda job: float("inf") if job[0] is None else job[0]):
+        free += job_cpus
+        if free >= cpus:
+            return float("inf") if time_left is None else time_left
+    return float("inf")
+
+
+def select_target(
+    candidates: list[str | Target],
+    cpus: int = 1,
+    ttl: float = 60,
+    cache_file: str = DEFAULT_CACHE_FILE,
+    log_file: Optional[str] = DEFAULT_LOG_FILE,
+) -> Target:
+    """
+    Chooses the candidate with the earliest estimated start of a job requesting `cpus` CPUs.
+
+    Args:
+        candidates (list): Targets, e.g. ["gpu", "cpu", "clusterb:gpu"]; earlier candidates win ties.
+        cpus (int, optional): CPUs requested by the job. Defaults to 1.
+        ttl (float, optional): Seconds for which queue states are cached. Defaults to 60.
+        cache_file (str, optional): Cache of queue states. Defaults to ~/.slurmexec/queue_cache.json.
+        log_file (str, optional): JSONL file the decision is appended to; None to only print it.
+
+    Raises:
+        ValueError: If no candidates are given
+
+    Returns:
+        Target: Chosen target
+    """
+    targets = [parse_target(candidate) for candidate in candidates]
+    if not targets:
+        raise ValueError("At least one candidate target is required")
+
+    partitions_by_remote = {}
+    for target in targets:
+        partitions = partitions_by_remote.setdefault(target.remote, set())
+        if target.partition is None:
+            partitions.add(None)  # the default partition is only known when querying all partitions
+        else:
+            partitions.add(target.partition)
+
+    states = {}
+    for remote, partitions in partitions_by_remote.items():
+        try:
+            states[remote] = query_queue_state(remote, [] if None in partitions else sorted(partitions), ttl=ttl, cache_file=cache_file)
+        except (RuntimeError, OSError) as e:
+            print(f"Skipping {remote or 'the local cluster'}: {e}")
+            states[remote] = {}
+
+    estimates = []
+    for target in targets:
+        state = states[target.remote]
+        if target.partition is None:
+            partition_state = next((s for s in state.values() if s["default"]), None)
+        else:
+            partition_state = state.get(target.partition)
+        estimates.append(estimate_start_time(partition_state, cpus))
+
+    best = min(range(len(targets)), key=lambda i: estimates[i])
+    _format = lambda seconds: "never" if seconds == float("inf") else f"{seconds:.0f}s"
+    print(f"Estimated start of a {cpus} CPU job: " + ", ".join(f"{target} {_format(estimate)}" for target, estimate in zip(targets, estimates)))
+    print(f"Submitting to {targets[best]}")
+
+    if log_file is not None:
+        log_file = Path(log_file).expanduser()
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_file, "a") as f:
+            f.write(json.dumps({
+                "time": time.time(),
+                "cpus": cpus,
+                "estimates": {str(target): None if estimate == float("inf") else estimate for target, estimate in zip(targets, estimates)},
+                "chosen": str(targets[best]),
+            }) + "\n")
+    return targets[best]
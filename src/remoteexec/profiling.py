@@ -0,0 +1,229 @@
+"""
+Profiling of @slurm_job functions without code changes (`@slurm_job(profile=...)` or `slurmexec job.py --profile ...`).
+
+The job runner wraps the function call in one of three profilers and saves the artifact next to the
+`%j.out` log, named after the job (and rank) like the log:
+
+    cprofile     `{job}.prof`          deterministic profile, readable with `pstats`
+    sampling     `{job}.folded`        stack samples of the main thread in collapsed (flame graph) format
+    tracemalloc  `{job}.tracemalloc`   snapshot of the memory allocated when the function returned
+
+`slurmexec-profile <job id> [--remote host]` fetches the profiles of a job (all tasks of an array) and
+prints an aggregated summary.
+"""
+import re
+import sys
+import threading
+from pathlib import Path
+from functools import wraps
+from collections import Counter
+from typing import Optional
+
+__all__ = ["PROFILE_MODES", "get_profile_file", "profiled_call", "SamplingProfiler", "fetch_profiles", "aggregate_profiles", "print_profile_summary"]
+
+PROFILE_MODES = {
+    "cprofile": ".prof",
+    "sampling": ".folded",
+    "tracemalloc": ".tracemalloc",
+}
+
+
+def get_profile_file(profile_dir: str, job_tag: str, mode: str) -> Path:
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}; choose one of {', '.join(PROFILE_MODES)}")
+    return Path(profile_dir).expanduser() / f"{job_tag}{PROFILE_MODES[mode]}"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of a thread from a background thread.
+
+    Args:
+        interval (float, optional): Seconds between samples. Defaults to 0.01.
+        thread_id (int, optional): Thread to sample. Defaults to the thread creating the profiler.
+    """
+    def __init__(self, interval: float = 0.01, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, path: Path):
+        from .slurmexec_runner import write_atomic
+        lines = [f"{stack} {count}\n" for stack, count in self.samples.most_common()]
+        write_atomic(path, "".join(lines).encode())
+
+
+def profiled_call(func: callable, mode: str, profile_file: Path) -> callable:
+    """Wraps `func` so each call runs under the profiler `mode`; the profile is saved to `profile_file`, also if it raises."""
+    profile_file = Path(profile_file)
+    get_profile_file(profile_file.parent, "", mode)  # validates the mode
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile_file.parent.mkdir(parents=True, exist_ok=True)
+        if mode == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                profiler.dump_stats(profile_file)
+        elif mode == "sampling":
+            profiler = SamplingProfiler()
+            profiler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.stop()
+                profiler.dump(profile_file)
+        else:
+            import tracemalloc
+            tracemalloc.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                snapshot = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ])
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"# tracemalloc: peak traced memory {peak / 1024**2:.1f} MiB")
+                snapshot.dump(str(profile_file))
+    return wrapper
+
+
+def fetch_profiles(job_id: str, remote: Optional[str] = None, profile_dir: str = "~/slurm_logs", local_dir: str = "~/slurm_logs") -> list[Path]:
+    """
+    Returns the profile files of `job_id` (including every array task and rank), first copying them from
+    `remote` if given.
+    """
+    local_dir = Path(local_dir).expanduser()
+    if remote is not None:
+        from .base import rsync
+        local_dir.mkdir(parents=True, exist_ok=True)
+        filters = [
+            f"--include={pattern}"
+            for extension in PROFILE_MODES.values()
+            for pattern in (f"{job_id}{extension}", f"{job_id}.rank*{extension}", f"{job_id}_*{extension}")
+        ]
+        rsync(f"{remote}:{profile_dir.rstrip('/')}/", f"{local_dir}/", args=filters + ["--exclude=*"], title=f"Fetching profiles of job {job_id} from {remote}")
+
+    files = [
+        path
+        for pattern in (f"{job_id}.*", f"{job_id}_*")
+        for path in local_dir.glob(pattern)
+        if path.suffix in PROFILE_MODES.values()
+    ]
+    return sorted(files, key=lambda path: [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", path.name)])
+
+
+def _profile_mode(files: list[Path]) -> str:
+    modes = {mode for file in files for mode, extension in PROFILE_MODES.items() if Path(file).suffix == extension}
+    if len(modes) != 1:
+        raise ValueError(f"Expected profiles of a single mode, got {', '.join(sorted(modes)) or 'none'}")
+    return modes.pop()
+
+
+def aggregate_profiles(files: list[Path]) -> tuple[str, any]:
+    """
+    Merges the profiles of several tasks.
+
+    Returns:
+        tuple[str, any]: Mode and aggregate: a `pstats.Stats` (cprofile), a Counter of collapsed stacks
+            (sampling) or a list of (location, size in bytes, allocation count) sorted by size (tracemalloc).
+    """
+    mode = _profile_mode(files)
+    if mode == "cprofile":
+        import pstats
+        return mode, pstats.Stats(*map(str, files))
+    if mode == "sampling":
+        samples = Counter()
+        for file in files:
+            for line in Path(file).read_text().splitlines():
+                stack, _, count = line.rpartition(" ")
+                samples[stack] += int(count)
+        return mode, samples
+
+    import tracemalloc
+    allocations = {}
+    for file in files:
+        for stat in tracemalloc.Snapshot.load(str(file)).statistics("lineno"):
+            frame = stat.traceback[0]
+            size, count = allocations.get((frame.filename, frame.lineno), (0, 0))
+            allocations[frame.filename, frame.lineno] = (size + stat.size, count + stat.count)
+    return mode, sorted(((f"{filename}:{lineno}", size, count) for (filename, lineno), (size, count) in allocations.items()), key=lambda x: -x[1])
+
+
+def print_profile_summary(files: list[Path], top: int = 20, output: Optional[str] = None):
+    """Prints the aggregated profile of `files`; with `output`, also saves the merged .prof/.folded file."""
+    mode, aggregate = aggregate_profiles(files)
+    print(f"*** {mode} profile aggregated over {len(files)} files")
+    if mode == "cprofile":
+        aggregate.sort_stats("cumulative").print_stats(top)
+        if output is not None:
+            aggregate.dump_stats(output)
+    elif mode == "sampling":
+        total = sum(aggregate.values())
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in aggregate.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        print(f"{total} samples")
+        print(f"{'own %':>7} {'total %':>7}  function")
+        for frame, count in own.most_common(top):
+            print(f"{100 * count / total:7.1f} {100 * inclusive[frame] / total:7.1f}  {frame}")
+        if output is not None:
+            Path(output).write_text("".join(f"{stack} {count}\n" for stack, count in aggregate.most_common()))
+    else:
+        print(f"{'size':>12} {'count':>9}  location")
+        for location, size, count in aggregate[:top]:
+            print(f"{size:12d} {count:9d}  {location}")
+    if output is not None and mode != "tracemalloc":
+        print(f"Merged profile saved to {output}")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(prog="slurmexec-profile", description="Fetch and aggregate the profiles of a slurmexec job.")
+    parser.add_argument("job_id", type=str, help="Job id (array parent job id for array jobs)")
+    parser.add_argument("--remote", type=str, default=None, help="Host to fetch the profiles from. Defaults to local files.")
+    parser.add_argument("--top", type=int, default=20, help="Number of entries shown (Default: 20)")
+    parser.add_argument("--output", type=str, default=None, help="File to save the merged profile to")
+    args = parser.parse_args()
+
+    files = fetch_profiles(args.job_id, remote=args.remote)
+    if not files:
+        print(f"No profiles found for job {args.job_id}")
+        sys.exit(1)
+    print_profile_summary(files, top=args.top, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
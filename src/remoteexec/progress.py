@@ -0,0 +1,285 @@
+"""
+Progress and heartbeat channel from running jobs to the client.
+
+Inside a job, `report_progress(step, total, **metrics)` updates a small JSON status record of the task,
+`{job}[.rank{r}].status` in ~/slurm_logs/status, replaced atomically and at most once per second. For
+`@slurm_job(progress=<heartbeat in seconds>)`, the job runner creates the record when the task starts,
+rewrites its heartbeat periodically, so a hung task (stale heartbeat) can be told apart from a quiet one,
+and marks it "done" or "failed" when the function returns. Each record also holds the number of tasks of
+the job, so the client knows how many tasks have not started yet.
+
+On the client, `read_job_status` reads the records of all tasks of a job in one batched read (a single
+ssh call for remote jobs) and `print_job_progress` shows progress bars and flags stale heartbeats:
+
+    slurmexec-progress 1234 --remote cluster --watch 10
+"""
+import os
+import re
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+from functools import wraps
+from typing import Optional
+
+__all__ = ["report_progress", "progress_call", "read_job_status", "print_job_progress", "watch_job_progress"]
+
+DEFAULT_STATUS_DIR = "~/slurm_logs/status"
+MIN_WRITE_INTERVAL = 1.0  # seconds between writes of report_progress
+
+_status = None
+_status_file = None
+_last_write = 0.0
+_lock = threading.RLock()  # reentrant: checkpoint callbacks run in a signal handler on the main thread
+
+
+def _write_status():
+    global _last_write
+    from .slurmexec_runner import write_atomic
+    _last_write = time.monotonic()
+    _status["heartbeat"] = time.time()
+    try:
+        write_atomic(_status_file, json.dumps(_status).encode())
+    except OSError as e:
+        print(f"# Failed to write progress to {_status_file}: {e}")
+
+
+def _init_status(status_file: Path, task: str):
+    global _status, _status_file
+    _status_file = Path(status_file)
+    _status_file.parent.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    tasks = int(os.environ.get("SLURM_ARRAY_TASK_COUNT", 1)) * int(os.environ.get("SLURM_NTASKS", 1))
+    _status = {
+        "task": task, "tasks": tasks, "state": "running", "step": None, "total": None, "metrics": {},
+        "updated": now, "heartbeat": now, "host": os.uname().nodename,
+    }
+
+
+def report_progress(step: int | float, total: Optional[int | float] = None, **metrics):
+    """
+    Reports the progress of the current task, e.g. `report_progress(epoch, n_epochs, loss=loss)`.
+    Cheap enough to call every iteration: the status record is written at most once per second
+    (and always when `step` reaches `total`). Outside a Slurm job, this does nothing.
+
+    Args:
+        step (int | float): Current step.
+        total (int | float, optional): Total number of steps.
+        **metrics: JSON-serializable values shown next to the progress bar.
+    """
+    with _lock:
+        if _status is None:
+            from .slurm import is_this_a_slurm_job
+            if not is_this_a_slurm_job():
+                return
+            # No record set up by the job runner (slurm_exec, or no @slurm_job(progress=...)); use the default location
+            from .slurmexec_runner import get_job_tag
+            rank = os.environ.get("SLURM_PROCID", "0")
+            task = get_job_tag() if int(os.environ.get("SLURM_NTASKS", 1)) == 1 else f"{get_job_tag()}.rank{rank}"
+            _init_status(Path(DEFAULT_STATUS_DIR).expanduser() / f"{task}.status", task)
+        _status.update(step=step, total=total, updated=time.time())
+        _status["metrics"].update(metrics)
+        if time.monotonic() - _last_write >= MIN_WRITE_INTERVAL or (total is not None and step >= total):
+            _write_status()
+
+
+def _heartbeat(stop: threading.Event, interval: float):
+    while not stop.wait(interval):
+        with _lock:
+            _write_status()
+
+
+def progress_call(func: callable, status_file: Path, task: str, heartbeat: float = 30) -> callable:
+    """
+    Wraps `func` so its task has a status record at `status_file` with a heartbeat every `heartbeat`
+    seconds, marked "done" or "failed" when `func` returns or raises, or "requeued" when the job
+    checkpointed and requeued itself (it resumes, so it has not finished).
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            _init_status(status_file, task)
+            _write_status()
+        stop = threading.Event()
+        thread = threading.Thread(target=_heartbeat, args=(stop, heartbeat), daemon=True)
+        thread.start()
+        state = "failed"
+        try:
+            result = func(*args, **kwargs)
+            state = "done"
+            return result
+        except BaseException as e:
+            from .slurm import CheckpointRequeue
+            if isinstance(e, CheckpointRequeue):
+                state = "requeued"
+            raise
+        finally:
+            stop.set()
+            thread.join()
+            with _lock:
+                _status["state"] = state
+                _write_status()
+    return wrapper
+
+
+def _job_status_patterns(job_id: str) -> tuple[str, ...]:
+    # The job itself, its ranks and the tasks (and their ranks) of an array job
+    return f"{job_id}.status", f"{job_id}.rank*.status", f"{job_id}_*.status"
+
+
+def read_job_status(job_id: str, remote: Optional[str] = None, status_dir: str = DEFAULT_STATUS_DIR) -> tuple[float, dict[str, dict]]:
+    """
+    Reads the status records of every task of `job_id` in one batch.
+
+    Returns:
+        tuple[float, dict[str, dict]]: Current time on the host with the records (to judge heartbeats
+            without clock skew) and the records by task.
+    """
+    if remote is None:
+        directory = Path(status_dir).expanduser()
+        now = time.time()
+        lines = []
+        for pattern in _job_status_patterns(job_id):
+            for path in directory.glob(pattern):
+                try:
+                    lines.append(path.read_text())
+                except OSError:
+                    continue
+    else:
+        import subprocess
+        # One ssh call: the remote time, then each record as "{file}:{record}"
+        names = " -o ".join(f"-name '{pattern}'" for pattern in _job_status_patterns(job_id))
+        command = f"date +%s; cd {status_dir} 2>/dev/null && find . -maxdepth 1 \\( {names} \\) -exec grep -H '' {{}} +"
+        output = subprocess.run(["ssh", remote, command], stdout=subprocess.PIPE, encoding="utf-8").stdout.splitlines()
+        if not output:
+            raise RuntimeError(f"Could not read the status of job {job_id} on {remote}")
+        now = float(output[0])
+        lines = [line.split(":", 1)[1] for line in output[1:] if ":" in line]
+
+    statuses = {}
+    for line in lines:
+        try:
+            status = json.loads(line)
+        except ValueError:
+            continue  # concurrently written by an older writer without atomic replace
+        statuses[status["task"]] = status
+    return now, dict(sorted(statuses.items(), key=lambda item: [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", item[0])]))
+
+
+def _progress_bar(fraction: Optional[float], width: int) -> str:
+    if fraction is None:
+        return "[" + "?" * width + "]"
+    filled = int(round(min(max(fraction, 0), 1) * width))
+    return "[" + "#" * filled + "-" * (width - filled) + "]"
+
+
+def _fraction(status: dict) -> Optional[float]:
+    if status["state"] == "done":
+        return 1.0
+    if status["step"] is None or not status["total"]:
+        return None
+    return status["step"] / status["total"]
+
+
+def get_expected_tasks(statuses: dict[str, dict]) -> int:
+    """Number of tasks of the job, as recorded by its tasks (at least the number of records)."""
+    return max([len(statuses)] + [status.get("tasks", 1) for status in statuses.values()])
+
+
+def print_job_progress(now: float, statuses: dict[str, dict], expected_tasks: Optional[int] = None, stale_after: float = 120, max_rows: int = 40, width: int = 30) -> bool:
+    """
+    Prints a summary line and a progress bar per task; with more than `max_rows` tasks, stale and
+    failed tasks are shown first. Tasks without a status record count as pending.
+
+    Args:
+        expected_tasks (int, optional): Number of tasks of the job. Defaults to the number recorded by the tasks.
+
+    Returns:
+        bool: Whether every expected task finished (is "done" or "failed"); requeued tasks have not.
+    """
+    def is_stale(status):
+        return status["state"] == "running" and now - status["heartbeat"] > stale_after
+
+    counts = {"running": 0, "requeued": 0, "done": 0, "failed": 0}
+    for status in statuses.values():
+        counts[status["state"]] = counts.get(status["state"], 0) + 1
+    if expected_tasks is None:
+        expected_tasks = get_expected_tasks(statuses)
+    pending = max(expected_tasks - len(statuses), 0)
+    stale = [task for task, status in statuses.items() if is_stale(status)]
+    fractions = [f for f in map(_fraction, statuses.values()) if f is not None]
+    overall = sum(fractions) / (len(fractions) + pending) if fractions else None
+    print(
+        f"{len(statuses) + pending} tasks: {counts['done']} done, {counts['failed']} failed, {counts['running']} running"
+        f" ({len(stale)} stale), {counts['requeued']} requeued, {pending} pending  {_progress_bar(overall, width)}" + (f" {100 * overall:.1f}%" if overall is not None else "")
+    )
+
+    rows = list(statuses.items())
+    if len(rows) > max_rows:
+        rows.sort(key=lambda item: (not is_stale(item[1]), item[1]["state"] != "failed"))
+        rows = rows[:max_rows]
+    for task, status in rows:
+        fraction = _fraction(status)
+        if status["state"] != "running":
+            flag = status["state"].upper() if status["state"] == "failed" else status["state"]
+        elif is_stale(status):
+            flag = f"STALE (no heartbeat for {now - status['heartbeat']:.0f}s)"
+        else:
+            flag = f"updated {max(0, now - status['updated']):.0f}s ago"
+        step = "" if status["step"] is None else f"{status['step']}/{status['total']}" if status["total"] is not None else str(status["step"])
+        metrics = " ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in status["metrics"].items())
+        percent = f"{100 * fraction:5.1f}%" if fraction is not None else "     "
+        print(f"{task:<20} {_progress_bar(fraction, width)} {percent} {step:>12}  {metrics}  ({flag})")
+    if len(statuses) > len(rows):
+        print(f"... {len(statuses) - len(rows)} more tasks")
+    return counts["done"] + counts["failed"] == len(statuses) > 0 and pending == 0
+
+
+def watch_job_progress(
+    job_id: str,
+    remote: Optional[str] = None,
+    interval: float = 10,
+    expected_tasks: Optional[int] = None,
+    stale_after: float = 120,
+    status_dir: str = DEFAULT_STATUS_DIR,
+):
+    """
+    Prints the progress of `job_id` every `interval` seconds until all tasks of the job finished (or Ctrl+C).
+    Tasks that have not started yet are waited for; see `print_job_progress` for `expected_tasks`.
+    """
+    while True:
+        now, statuses = read_job_status(job_id, remote=remote, status_dir=status_dir)
+        print(f"\n*** Progress of job {job_id} at {time.strftime('%H:%M:%S')}")
+        if not statuses:
+            print("No task reported progress yet")
+        elif print_job_progress(now, statuses, expected_tasks=expected_tasks, stale_after=stale_after):
+            return
+        time.sleep(interval)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(prog="slurmexec-progress", description="Show the progress of the tasks of a slurmexec job.")
+    parser.add_argument("job_id", type=str, help="Job id (array parent job id for array jobs)")
+    parser.add_argument("--remote", type=str, default=None, help="Host running the job. Defaults to local status files.")
+    parser.add_argument("--watch", type=float, default=None, help="Refresh every WATCH seconds until all tasks finished")
+    parser.add_argument("--stale_after", type=float, default=120, help="Seconds without heartbeat after which a task is flagged (Default: 120)")
+    parser.add_argument("--tasks", type=int, default=None, help="Number of tasks of the job (Default: as recorded by the tasks)")
+    args = parser.parse_args()
+
+    if args.watch is not None:
+        try:
+            watch_job_progress(args.job_id, remote=args.remote, interval=args.watch, expected_tasks=args.tasks, stale_after=args.stale_after)
+        except KeyboardInterrupt:
+            pass
+        return
+    now, statuses = read_job_status(args.job_id, remote=args.remote)
+    if not statuses:
+        print(f"No progress reported for job {args.job_id}")
+        sys.exit(1)
+    print_job_progress(now, statuses, expected_tasks=args.tasks, stale_after=args.stale_after)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,8 @@ from .base import rsync, ssh_exec, ssh_exec_cd_and_python, _popen
 def main():
     default_dst = "~/_remoteexec_srcs/"
     parser = argparse.ArgumentParser(description="Execute file remotely.")
-    parser.add_argument("--remote", type=str, required=True, help="SSH of the remote server")
+    parser.add_argument("--remote", type=str, required=True, help="SSH of the remote server; for slurmexec, a comma-separated list of candidate servers")
+    parser.add_argument("--partitions", type=str, default=None, help="For slurmexec, comma-separated candidate partitions; the server and partition with the earliest estimated start are chosen")
     parser.add_argument("--parent", type=str, default=None, help="Parent directory to copy to remote. Defaults to cwd")
     # parser.add_argument("--dirname_prefix", type=str, default="remoteexec_", help="Remote directory name prefix.")
     parser.add_argument("--dst", type=str, default=default_dst, help=f"Destination directory on remote server. Defaults to {default_dst}")
@@ -25,6 +26,18 @@ def main():
         sys.exit(1)
     args.parent = Path(args.parent).resolve() if args.parent else Path.cwd()
 
+    remotes = args.remote.split(",")
+    if len(remotes) > 1 or args.partitions is not None:
+        if executable_args[0] != "slurmexec":
+            print("Candidate servers and partitions are only supported for slurmexec jobs.")
+            sys.exit(1)
+        from .placement import select_target
+        partitions = args.partitions.split(",") if args.partitions else [""]
+        target = select_target([f"{remote}:{partition}" for remote in remotes for partition in partitions], cpus=_requested_cpus(executable_args, args.parent))
+        args.remote = target.remote
+        if target.partition is not None:
+            executable_args.append(f"--partition={target.partition}")
+
     if not args.parent.exists():
         print(f"Parent directory {args.parent} does not exist.")
         sys.exit(1)
@@ -57,6 +70,44 @@ def main():
         sys.exit(return_code)
 
 
+_CPU_ARGS = ("--ntasks", "-n", "--cpus-per-task", "-c")
+
+
+def _requested_cpus(executable_args: list[str], parent: Path) -> int:
+    """
+    CPUs requested by a slurmexec job (--ntasks times --cpus-per-task): the @slurm_job arguments of the target
+    function in `parent`, overridden by the sbatch arguments among `executable_args`.
+    """
+    slurm_args = _decorator_slurm_args(parent, executable_args[1]) if len(executable_args) > 1 else {}
+    for i, arg in enumerate(executable_args):
+        key, _, value = arg.partition("=")
+        if not value and i + 1 < len(executable_args):
+            value = executable_args[i + 1]
+        if key in _CPU_ARGS:
+            slurm_args[key] = value
+    values = {}
+    for key, value in slurm_args.items():
+        if key in _CPU_ARGS and str(value).isdigit():
+            values[key.lstrip("-")[0]] = int(value)
+    return values.get("n", 1) * values.get("c", 1)
+
+
+def _decorator_slurm_args(parent: Path, target: str) -> dict[str, any]:
+    """sbatch arguments of the @slurm_job decorator of `target` ("file.py[:function]"); {} if it cannot be read without importing."""
+    from .slurm import parse_slurm_jobs_without_importing
+    filename, _, func_name = target.partition(":")
+    try:
+        slurm_jobs = parse_slurm_jobs_without_importing(parent / filename)
+    except (OSError, SyntaxError, ValueError):
+        return {}
+    if not func_name and len(slurm_jobs) == 1:
+        func_name = next(iter(slurm_jobs))
+    job_kwargs = dict(slurm_jobs.get(func_name, {}))
+    slurm_args = {str(key).replace("_", "-"): value for key, value in job_kwargs.pop("slurm_args", {}).items()}
+    slurm_args.update({f"--{key.replace('_', '-')}": value for key, value in job_kwargs.items()})
+    return slurm_args
+
+
 def handle_slurmexec_logs(args, output_lines: list[str]):
     job_details = output_lines[-1]  # see (*), last line in main_remote
     del output_lines
@@ -71,8 +122,21 @@ def handle_slurmexec_logs(args, output_lines: list[str]):
         print("Job failed:", job_details)
         return
     
+    if job_details.get("cached"):
+        return
+
     if job_details["is_array_task"]:
-        # print("Job is an array task, no viewing option available.")
+        # Too many logs to follow; show the progress reported by the tasks instead
+        if not job_details.get("progress"):
+            print(f"Array job {job_details['job_id']} submitted; use @slurm_job(progress=...) to watch the progress of its tasks.")
+            return
+        from .progress import watch_job_progress
+        print()
+        print(f"Showing the progress of the array tasks of job {job_details['job_id']}. Press Ctrl+C to exit; the job keeps running.")
+        try:
+            watch_job_progress(job_details["job_id"], remote=args.remote)
+        except KeyboardInterrupt:
+            print(f"\nExiting progress viewer. Job {job_details['job_id']} is possibly still running in background.")
         return
     
     log_file = job_details["log_file"]
@@ -84,9 +148,14 @@ def handle_slurmexec_logs(args, output_lines: list[str]):
     wait_seconds = 3
     try:
         from .slurm import SLURM_LOG_EOF_MESSAGE
+        if job_details.get("log_format") == "buffered":
+            # Buffered (possibly compressed) log written by remoteexec.joblog; slurmexec-log is on the PATH of a login shell
+            follow_command = ["bash", "-l", "-c", "\"" + " ".join(map(_quote_cmdline_str, ["slurmexec-log", log_file])) + "\""]
+        else:
+            follow_command = f"tail --retry -f {log_file}"
         ssh_exec(
             remote=args.remote,
-            command=f"tail --retry -f {log_file}",
+            command=follow_command,
             title=None,
             ignore_line = lambda line: line.startswith("tail: warning: "),
             end_check = lambda line: line.strip() == SLURM_LOG_EOF_MESSAGE
@@ -0,0 +1,183 @@
+"""
+Resubmit only the failed tasks of a previous submission.
+
+`retry_slurm_job(job_id)` looks up the submission in the resource history (see `remoteexec.history`), queries
+the state of every array task with one `sacct` call and resubmits the original script (and therefore the same
+function and arguments) with an `--array` spec covering just the failed, timed-out or out-of-memory tasks
+(keeping the original `%N` limit of simultaneously running tasks), optionally with more memory or time:
+
+    slurmexec-retry 1234 --mem_factor 2
+"""
+import sys
+import math
+import subprocess
+from typing import Optional
+
+from .history import ResourceHistory, parse_slurm_memory, parse_slurm_duration, format_slurm_duration
+
+__all__ = ["RETRY_STATES", "get_slurm_task_states", "compact_array_spec", "get_array_throttle", "retry_slurm_job"]
+
+# Final states of tasks that are worth running again
+RETRY_STATES = ("FAILED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL", "BOOT_FAIL", "PREEMPTED", "DEADLINE")
+
+
+def get_slurm_task_states(job_id: str) -> dict[Optional[int], str]:
+    """
+    States of the tasks of `job_id` from a single sacct call.
+
+    Returns:
+        dict[Optional[int], str]: State by array task index; the key is None for a non-array job.
+            Pending tasks not yet expanded by Slurm are omitted.
+    """
+    output = subprocess.check_output(
+        ["sacct", "-n", "-P", "-X", "--format=JobID,State", "-j", str(job_id)],
+        stderr=subprocess.DEVNULL, encoding="utf-8",
+    )
+    states = {}
+    for line in output.splitlines():
+        fields = line.split("|")
+        if len(fields) != 2:
+            continue
+        task_id, state = fields
+        state = state.split(" ", 1)[0]  # e.g. "CANCELLED by 1000"
+        _, _, index = task_id.partition("_")
+        if not index:
+            states[None] = state
+        elif index.isdigit():
+            states[int(index)] = state
+    return states
+
+
+def compact_array_spec(indices: list[int], max_concurrent: Optional[int] = None) -> str:
+    """
+    Compact `--array` spec of `indices`, e.g. [1, 2, 3, 7, 9, 10] -> "1-3,7,9-10", with
+    `max_concurrent` as the limit of simultaneously running tasks, e.g. "1-3,7,9-10%2".
+    """
+    parts = []
+    indices = sorted(set(indices))
+    start = prev = None
+    for index in indices + [None]:
+        if prev is not None and index == prev + 1:
+            prev = index
+            continue
+        if start is not None:
+            parts.append(str(start) if start == prev else f"{start}-{prev}")
+        start = prev = index
+    return ",".join(parts) + (f"%{max_concurrent}" if max_concurrent else "")
+
+
+def get_array_throttle(array_spec: Optional[str]) -> Optional[int]:
+    """Limit of simultaneously running tasks of an `--array` spec, e.g. "0-99%10" -> 10."""
+    _, percent, limit = str(array_spec or "").rpartition("%")
+    return int(limit) if percent and limit.isdigit() else None
+
+
+def _scale_memory(mem: Optional[str], factor: float) -> Optional[str]:
+    mem_mb = parse_slurm_memory(str(mem)) if mem else None
+    if not mem_mb:
+        print(f"The original submission has no --mem; cannot scale it by {factor}")
+        return None
+    return f"{int(math.ceil(mem_mb * factor))}M"
+
+
+def _scale_time(time_limit: Optional[str], factor: float) -> Optional[str]:
+    seconds = parse_slurm_duration(str(time_limit)) if time_limit else None
+    if not seconds:
+        print(f"The original submission has no --time; cannot scale it by {factor}")
+        return None
+    return format_slurm_duration(seconds * factor)
+
+
+def retry_slurm_job(
+    job_id: str,
+    mem: Optional[str] = None,
+    time: Optional[str] = None,
+    mem_factor: Optional[float] = None,
+    time_factor: Optional[float] = None,
+    include_cancelled: bool = False,
+    history: Optional[ResourceHistory] = None,
+) -> dict:
+    """
+    Resubmits the failed tasks of `job_id` with its original script.
+
+    Args:
+        job_id (str): Job id of the previous submission (array parent job id for array jobs).
+        mem (str, optional): New `--mem` of the retried tasks.
+        time (str, optional): New `--time` of the retried tasks.
+        mem_factor (float, optional): Factor applied to the original `--mem` (if `mem` is not given).
+        time_factor (float, optional): Factor applied to the original `--time` (if `time` is not given).
+        include_cancelled (bool, optional): Whether cancelled tasks are retried as well. Defaults to False.
+        history (ResourceHistory, optional): History with the submission. Defaults to ~/.slurmexec/history.jsonl.
+
+    Raises:
+        ValueError: If the submission or its script is unknown
+
+    Returns:
+        dict: "success", "message", "retried" (task indices, None for a non-array job) and, if submitted, "job_id".
+    """
+    history = history or ResourceHistory()
+    submissions, _ = history.load()
+    submission = submissions.get(str(job_id))
+    if submission is None or not submission.get("script_file"):
+        raise ValueError(f"Job {job_id} was not submitted by slurmexec (or before scripts were recorded); cannot retry it")
+
+    retry_states = RETRY_STATES + (("CANCELLED",) if include_cancelled else ())
+    states = get_slurm_task_states(job_id)
+    failed = sorted(index for index, state in states.items() if index is not None and state in retry_states)
+    is_array = submission.get("array") is not None or any(index is not None for index in states)
+    if is_array and not failed or not is_array and states.get(None) not in retry_states:
+        message = f"No failed tasks of job {job_id} to retry"
+        print(message)
+        return {"success": True, "message": message, "retried": []}
+
+    args = []
+    array_spec = compact_array_spec(failed, get_array_throttle(submission.get("array"))) if is_array else None
+    if is_array:
+        args.append(f"--array={array_spec}")
+    if mem is None and mem_factor is not None:
+        mem = _scale_memory(submission.get("mem"), mem_factor)
+    if time is None and time_factor is not None:
+        time = _scale_time(submission.get("time_limit"), time_factor)
+    if mem is not None:
+        args.append(f"--mem={mem}")
+    if time is not None:
+        args.append(f"--time={time}")
+
+    from .slurm import run_sbatch
+    print(f"Retrying {f'{len(failed)} of {len(states)} tasks' if is_array else 'job'} of job {job_id}: sbatch {' '.join(args)} {submission['script_file']}")
+    output = run_sbatch(submission["script_file"], args=args)
+    out_data = {"success": output.startswith("Submitted batch job"), "message": output, "retried": failed if is_array else None}
+    if out_data["success"]:
+        new_job_id = output.rsplit(" ", maxsplit=1)[-1]
+        out_data["job_id"] = new_job_id
+        slurm_args = {
+            "--mem": mem or submission.get("mem"),
+            "--time": time or submission.get("time_limit"),
+            "--array": array_spec,
+        }
+        history.record_submission(new_job_id, submission["key"], slurm_args, submission["script_file"])
+    print(output)
+    return out_data
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(prog="slurmexec-retry", description="Resubmit the failed tasks of a slurmexec job.")
+    parser.add_argument("job_id", type=str, help="Job id (array parent job id for array jobs)")
+    parser.add_argument("--mem", type=str, default=None, help="New --mem of the retried tasks")
+    parser.add_argument("--time", type=str, default=None, help="New --time of the retried tasks")
+    parser.add_argument("--mem_factor", type=float, default=None, help="Multiply the original --mem by this factor")
+    parser.add_argument("--time_factor", type=float, default=None, help="Multiply the original --time by this factor")
+    parser.add_argument("--include_cancelled", action="store_true", help="Also retry cancelled tasks")
+    args = parser.parse_args()
+
+    try:
+        out_data = retry_slurm_job(args.job_id, args.mem, args.time, args.mem_factor, args.time_factor, args.include_cancelled)
+    except (ValueError, subprocess.CalledProcessError, OSError) as e:
+        print(e)
+        sys.exit(1)
+    sys.exit(0 if out_data["success"] else 1)
+
+
+if __name__ == "__main__":
+    main()
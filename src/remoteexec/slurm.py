@@ -1,21 +1,42 @@
 import os
 import sys
-import subprocess
 from pathlib import Path
 from functools import wraps
-import inspect
-import argparse
-from shlex import quote as _quote_cmdline_str
+from contextlib import contextmanager
 from typing import Optional, List, Dict, NamedTuple
 from types import SimpleNamespace
 
-from .utils import load_func_argparser
+# Only the standard modules needed by the in-job helpers (get_slurm_id(), is_this_a_slurm_job(), ...) are
+# imported at module load; submission code imports subprocess, argparse, inspect etc. where it is used.
 
-__all__ = ["get_slurm_id", "is_this_a_slurm_job", "is_slurm_array_job", "get_slurm_array_job", "slurm_job", "slurm_exec", "set_slurm_debug"]
+__all__ = [
+    "get_slurm_id", "is_this_a_slurm_job", "is_slurm_array_job", "get_slurm_array_job",
+    "get_slurm_rank", "get_slurm_local_rank", "get_slurm_world_size", "get_slurm_rendezvous", "gather_slurm_results",
+    "on_slurm_checkpoint", "is_slurm_job_resuming", "get_slurm_checkpoint_path", "save_slurm_checkpoint", "load_slurm_checkpoint",
+    "report_progress", "slurm_job", "slurm_exec", "set_slurm_debug"
+]
+
+
+def __getattr__(name: str):
+    # report_progress lives in .progress, which is only imported once the function is used
+    if name == "report_progress":
+        from .progress import report_progress
+        globals()["report_progress"] = report_progress
+        return report_progress
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 SLURM_LOG_EOF_MESSAGE = "# END OF SLURM JOB"
 
+# Exit code of a job step that checkpointed and requeued itself
+SLURM_REQUEUE_EXIT_CODE = 75
+
+
+class CheckpointRequeue(SystemExit):
+    """Raised in the job function after a checkpoint signal was handled and the job requeued."""
+
+
 _IS_SLURM_DEBUG = False
+_CHECKPOINT_CALLBACKS = []
 
 def set_slurm_debug(debug: bool = True, silent: bool = False):
     """Sets slurm debug mode, allowing slurm jobs to be executed locally for debugging.
@@ -35,6 +56,16 @@ def set_slurm_debug(debug: bool = True, silent: bool = False):
         print("=======================================================")
         print()
 
+@contextmanager
+def local_slurm_debug():
+    """Lets @slurm_job functions run in this process; restores the previous debug mode afterwards."""
+    was_debug = _IS_SLURM_DEBUG
+    set_slurm_debug(True, silent=True)
+    try:
+        yield
+    finally:
+        set_slurm_debug(was_debug, silent=True)
+
 def get_slurm_id():
     global _IS_SLURM_DEBUG
     if _IS_SLURM_DEBUG:
@@ -56,6 +87,194 @@ def get_slurm_array_job():
     return int(os.environ.get("SLURM_ARRAY_JOB_ID", -1)), int(os.environ.get("SLURM_ARRAY_TASK_ID", -1))
 
 
+def get_slurm_rank():
+    """Global rank of this task within the job step (0 if not launched by srun)."""
+    return int(os.environ.get("SLURM_PROCID", 0))
+
+
+def get_slurm_local_rank():
+    """Rank of this task on its node (0 if not launched by srun)."""
+    return int(os.environ.get("SLURM_LOCALID", 0))
+
+
+def get_slurm_world_size():
+    """Number of tasks in the job step (1 if not launched by srun)."""
+    return int(os.environ.get("SLURM_NTASKS", 1))
+
+
+def _first_slurm_host(nodelist: str) -> str:
+    """Returns the first hostname of a compressed Slurm nodelist, e.g. "node[03-05,8],gpu1" -> "node03"."""
+    first = ""
+    depth = 0
+    for c in nodelist:
+        if c == "," and depth == 0:
+            break
+        depth += (c == "[") - (c == "]")
+        first += c
+    if "[" not in first:
+        return first
+    prefix, ranges = first.split("[", 1)
+    return prefix + ranges.rstrip("]").split(",")[0].split("-")[0]
+
+
+def get_slurm_rendezvous():
+    """
+    Address used by all ranks of a multi-task job to rendezvous.
+
+    Uses MASTER_ADDR/MASTER_PORT if set; otherwise the first node of the job with a port derived from the job id,
+    so that every rank computes the same address without communicating.
+
+    Returns:
+        tuple[str, int]: (address, port)
+    """
+    addr = os.environ.get("MASTER_ADDR")
+    if addr is None:
+        nodelist = os.environ.get("SLURM_STEP_NODELIST") or os.environ.get("SLURM_JOB_NODELIST")
+        addr = _first_slurm_host(nodelist) if nodelist else "127.0.0.1"
+    port = os.environ.get("MASTER_PORT")
+    if port is None:
+        job_id = os.environ.get("SLURM_JOB_ID", "0")
+        port = 10000 + (int(job_id) % 20000 if job_id.isdigit() else 0)
+    return addr, int(port)
+
+
+def on_slurm_checkpoint(callback: callable):
+    """
+    Registers a callback called when the job receives its early-warning signal before hitting its time limit
+    or being preempted (see `slurm_job(checkpoint_signal=...)`). Afterwards the job is requeued.
+    Can be used as a decorator.
+
+    Example:
+        @on_slurm_checkpoint
+        def checkpoint():
+            save_slurm_checkpoint({"step": step, "params": params})
+    """
+    _CHECKPOINT_CALLBACKS.append(callback)
+    return callback
+
+
+def run_slurm_checkpoint_callbacks():
+    """Calls all callbacks registered with `on_slurm_checkpoint`."""
+    for callback in list(_CHECKPOINT_CALLBACKS):
+        callback()
+
+
+def is_slurm_job_resuming():
+    """Whether this job was requeued and a checkpoint from a previous run exists."""
+    return int(os.environ.get("SLURM_RESTART_COUNT", 0)) > 0 and get_slurm_checkpoint_path().exists()
+
+
+def get_slurm_checkpoint_path():
+    """
+    Path of this job's latest checkpoint. It is stable across requeues of the job.
+    The parent directory is created; the file itself may not exist yet.
+    """
+    from .slurmexec_runner import get_job_tag
+    checkpoint_dir = Path(os.environ.get("SLURMEXEC_CHECKPOINT_DIR", "~/slurm_logs/checkpoints")).expanduser()
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    return checkpoint_dir / f"{get_job_tag()}.ckpt"
+
+
+def save_slurm_checkpoint(state: any):
+    """Pickles `state` to `get_slurm_checkpoint_path()`, atomically replacing the previous checkpoint."""
+    import pickle
+    from .slurmexec_runner import write_atomic
+    write_atomic(get_slurm_checkpoint_path(), pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_slurm_checkpoint(default: any = None):
+    """Loads the state saved by `save_slurm_checkpoint`, or returns `default` if there is none."""
+    import pickle
+    path = get_slurm_checkpoint_path()
+    if not path.exists():
+        return default
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def gather_slurm_results(job_id: str, result_dir: str = "~/slurm_logs"):
+    """
+    Loads the return values saved by each rank of a job run through `slurmexec` (multi-task jobs, or
+    `@slurm_job(save_result=True)`). Ranks whose return value was None or could not be pickled are missing.
+
+    Args:
+        job_id (str): Job id (or "{array job id}_{task id}" for array tasks).
+        result_dir (str, optional): Directory the results were written to. Defaults to ~/slurm_logs.
+
+    Returns:
+        list: Return value of each rank, ordered by rank.
+    """
+    import pickle
+    result_dir = Path(result_dir).expanduser()
+    files = {
+        int(f.name[len(f"{job_id}.rank"):-len(".result.pkl")]): f
+        for f in result_dir.glob(f"{job_id}.rank*.result.pkl")
+    }
+    results = []
+    for rank in sorted(files.keys()):
+        with open(files[rank], "rb") as f:
+            results.append(pickle.load(f))
+    return results
+
+
+# sbatch errors caused by an overloaded or restarting slurmctld; retrying shortly after usually succeeds
+TRANSIENT_SBATCH_ERRORS = (
+    "Socket timed out",
+    "Resource temporarily unavailable",
+    "Unable to contact slurm controller",
+    "Zero Bytes were transmitted or received",
+    "Connection refused",
+    "slurm_persist_conn_open",
+)
+# sbatch errors caused by the per-user limit of queued jobs; retrying succeeds once earlier jobs finished
+SUBMIT_LIMIT_SBATCH_ERRORS = (
+    "MaxSubmitJob",
+    "AssocMaxSubmitJobLimit",
+    "QOSMaxSubmitJobPerUserLimit",
+    "Job violates accounting/QOS policy",
+)
+
+
+def is_transient_sbatch_error(output: str) -> bool:
+    return any(error in output for error in TRANSIENT_SBATCH_ERRORS)
+
+
+def is_submit_limit_sbatch_error(output: str) -> bool:
+    return any(error in output for error in SUBMIT_LIMIT_SBATCH_ERRORS)
+
+
+def run_sbatch(script_file: Path, args: Optional[list[str]] = None, max_retries: int = 4, backoff: float = 2.0) -> str:
+    """
+    Submits `script_file` via sbatch, retrying transient controller errors with exponential backoff.
+
+    Args:
+        script_file (Path): Batch script.
+        args (list[str], optional): Additional sbatch arguments (override the #SBATCH lines of the script).
+        max_retries (int, optional): Maximum number of retries of transient errors. Defaults to 4.
+        backoff (float, optional): Base of the exponential backoff in seconds. Defaults to 2.
+
+    Returns:
+        str: sbatch output, e.g. "Submitted batch job 123" or the error message.
+    """
+    import time
+    import random
+    import subprocess
+    for attempt in range(max_retries + 1):
+        try:
+            output = subprocess.check_output(["sbatch", *(args or []), str(script_file)], stderr=subprocess.STDOUT)
+            output = output.decode().strip() # parse binary; strip newlines
+        except subprocess.CalledProcessError as e:
+            output = e.output.decode("utf-8").strip()
+        except Exception as e:
+            raise RuntimeError(f"An unexpected error occurred: {e}")
+
+        if output.startswith("Submitted batch job") or not is_transient_sbatch_error(output) or attempt == max_retries:
+            return output
+        delay = backoff ** (attempt + 1) * random.uniform(0.5, 1.5)  # jitter spreads out retries of concurrent clients
+        print(f"Transient sbatch error ({output.splitlines()[-1] if output else 'no output'}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
 def parse_slurm_jobs_without_importing(path: Path) -> dict[str, dict[str, any]]:
     """
     Parse a Python file for slurm_job decorators.
@@ -93,12 +312,12 @@ class SlurmExecutableBuilder:
 
         if script_dir is None:
             self._dir = Path.home() / "slurm"
-        if not isinstance(script_dir, Path):
+        elif not isinstance(script_dir, Path):
             self._dir = Path(script_dir).expanduser()
         else:
             self._dir = script_dir
         
-        self.script_file = self._dir / job_name / f"_temp_job.slurm"
+        self.script_file = None  # named by the hash of the script when submitted
         
         self._args = {
             "--job-name": job_name,
@@ -158,20 +377,18 @@ class SlurmExecutableBuilder:
 # End of script
 """
         
-        # Write script to file
+        # Write script to a file named by its content, so that concurrent submissions cannot overwrite
+        # each other's script before sbatch read it
+        from hashlib import sha256
+        from .slurmexec_runner import write_atomic
+        script_data = script.encode()
+        self.script_file = self._dir / self.job_name / f"job_{sha256(script_data).hexdigest()[:16]}.slurm"
         self.script_file.parent.mkdir(parents=True, exist_ok=True)
-        self.script_file.write_text(script)
-        # with open(self.script_file, "w+") as file: # w+ creates if not exists, otherwise truncates
-        #     file.write(script)
+        if not self.script_file.exists():
+            write_atomic(self.script_file, script_data)
         
         # Execute file
-        try:
-            output = subprocess.check_output(["sbatch", str(self.script_file)], stderr=subprocess.STDOUT)
-            output = output.decode().strip() # parse binary; strip newlines
-        except subprocess.CalledProcessError as e:
-            output = e.output.decode("utf-8")
-        except Exception as e:
-            raise RuntimeError(f"An unexpected error occurred: {e}")
+        output = run_sbatch(self.script_file)
 
         def bprint(*args, **kwargs):
             if box_print:
@@ -226,17 +443,72 @@ class SlurmJobMeta(NamedTuple):
     job_name: Optional[str] = None
     slurm_args: dict[str, any] = {}
     pre_run_commands: list[str] = []
+    cache: bool = False
+    inputs: list[str] = []
+    checkpoint_signal: Optional[int] = None
+    requeue: bool = True
+    outputs: list[str] = []
+    stage: bool = False
+    log_options: Optional[dict[str, any]] = None
+    profile: Optional[str] = None
+    telemetry: Optional[float] = None
+    save_result: bool = False
+    progress: Optional[float] = None
 
 def slurm_job(
     job_name: Optional[str] = None,
     conda_env: Optional[str] = None,
     slurm_args: dict[str, any] = {},
     pre_run_commands: list[str] = [],
+    cache: bool = False,
+    inputs: list[str] = [],
+    checkpoint_signal: Optional[int] = None,
+    requeue: bool = True,
+    outputs: list[str] = [],
+    stage: bool = False,
+    log_options: Optional[dict[str, any]] = None,
+    profile: Optional[str] = None,
+    telemetry: Optional[float] = None,
+    save_result: bool = False,
+    progress: Optional[float] = None,
     **other_slurm_args
 ):
     """
     Function decorator to be applied to a function representing a Slurm job.
+
+    Args:
+        job_name (str, optional): Slurm job name. Defaults to the function name.
+        conda_env (str, optional): Conda environment activated before running the job.
+        slurm_args (dict, optional): Slurm batch arguments, e.g. {"--time": "1:00:00"}.
+        pre_run_commands (list, optional): Commands to run before the function.
+        cache (bool, optional): Whether to reuse the result of a previous run with the same function source,
+            arguments and inputs instead of submitting the job again (see `remoteexec.cache`). Defaults to False.
+        inputs (list, optional): Input files/directories read by the function, part of the cache key.
+            May reference function arguments, e.g. "{data_dir}/train.npy".
+        outputs (list, optional): Output files/directories written by the function. May reference function arguments.
+        stage (bool, optional): Whether to copy `inputs` to node-local scratch before the function runs and `outputs`
+            back after it returns (see `remoteexec.staging`). Defaults to False.
+        log_options (dict, optional): Write the job output to a buffered, optionally compressed log instead of line by line,
+            e.g. {"compress": True, "block_size": 1 << 20, "max_bytes": 1 << 30}; see `remoteexec.joblog.BufferedLogWriter`.
+            Defaults to None (unbuffered `%j.out` log).
+        checkpoint_signal (int, optional): Seconds before the time limit at which the job receives an early-warning
+            signal (`--signal=B:USR1@N`, also sent on preemption). Callbacks registered with `on_slurm_checkpoint`
+            are then called. Defaults to None (no signal).
+        requeue (bool, optional): Whether to requeue the job after the checkpoint callbacks ran. On restart,
+            `is_slurm_job_resuming()` is True and `load_slurm_checkpoint()` returns the latest checkpoint. Defaults to True.
+        profile (str, optional): Profiler wrapped around the function inside the job: "cprofile", "sampling" or "tracemalloc";
+            the profile is saved next to the log (see `remoteexec.profiling`). Defaults to None (no profiling).
+        telemetry (float, optional): Interval in seconds at which CPU utilization, RSS, I/O bytes and thread count of the
+            job are sampled to a time series next to the log (see `remoteexec.telemetry`). Defaults to None (no sampling).
+        save_result (bool, optional): Whether a single-task or array job pickles its return value to ~/slurm_logs for
+            `gather_slurm_results`. Multi-task jobs always do. Defaults to False.
+        progress (float, optional): Keep a status record per task for `slurmexec-progress`, updated by `report_progress`
+            and with a heartbeat every `progress` seconds (True: 30 seconds); see `remoteexec.progress`.
+            Defaults to None (no status record).
+        **other_slurm_args: Passed to sbatch as `--{key}={value}`.
     """
+    slurm_args = dict(slurm_args)  # copy since defaults are shared between decorators
+    pre_run_commands = list(pre_run_commands)
     for k, v in other_slurm_args.items():
         slurm_args[f"--{k}"] = v
     if conda_env is not None:
@@ -253,22 +525,38 @@ def slurm_job(
         meta = SlurmJobMeta(
             job_name = (job_name or func.__name__),
             slurm_args = slurm_args,
-            pre_run_commands = pre_run_commands
+            pre_run_commands = pre_run_commands,
+            cache = cache,
+            inputs = list(inputs),
+            checkpoint_signal = checkpoint_signal,
+            requeue = requeue,
+            outputs = list(outputs),
+            stage = stage,
+            log_options = log_options,
+            profile = profile,
+            telemetry = telemetry,
+            save_result = save_result,
+            progress = progress,
         )
         # print("Got unknown meta kwargs:", meta_kwargs)
         wrapper._slurm_job_meta = meta
         return wrapper
+    if callable(job_name):
+        # Used as a bare decorator (`@slurm_job` without parentheses)
+        func, job_name = job_name, None
+        return decorator(func)
     return decorator
 
 
 def slurm_exec(
     func: callable,
-    argparser: Optional[argparse.ArgumentParser] = None,
+    argparser: Optional["argparse.ArgumentParser"] = None,
     script_dir: str = "~/slurm",
     job_name: Optional[str] = None,
     slurm_args: Optional[Dict[str, any]] = None,
     pre_run_commands: Optional[List[str]] = None,
     srun: bool = False,
+    args_by_reference: bool = False,
     **kwargs
 ):
     """Runs a slurm job. Used in the main method of a .py file.
@@ -282,12 +570,17 @@ def slurm_exec(
         slurm_args (dict, optional): Slurm batch arguments. Defaults to {}.
         pre_run_commands (list, optional): List of commands to run before the main command (e.g., activate environment). None by default.
         srun (bool, optional): Whether to use srun to execute the python command (i.e., `srun python myfile.py --args`). Defaults to True.
+        args_by_reference (bool, optional): Whether to write the parsed arguments to a content-addressed file in
+            `script_dir` and only pass its path to the job (`python myfile.py --slurmexec_args <file>`), instead of
+            quoting every argument into the script. Defaults to False.
 
     Raises:
         ValueError: If func is not an @slurm_job
     """
     if not hasattr(func, "_is_slurm_job"):
         raise ValueError(f"Function {func.__name__} must be decorated with @slurm_job")
+    import argparse
+    from .utils import load_func_argparser
     
     if slurm_args is None:
         slurm_args = {}
@@ -312,6 +605,16 @@ def slurm_exec(
     else:
         parser = load_func_argparser(func)
 
+    if "--slurmexec_args" in sys.argv and is_this_a_slurm_job():
+        # Arguments were passed by reference (args_by_reference=True)
+        from .slurmexec_runner import load_args_file
+        args_file = sys.argv[sys.argv.index("--slurmexec_args") + 1]
+        if given_argparser:
+            func(argparse.Namespace(**load_args_file(args_file)))
+        else:
+            func(**load_args_file(args_file, func))
+        return None
+
     parser.add_argument("--job_name", type=str, default=job_name, help=f"Name of the slurm job. (Default: \"{job_name}\")")
     exec_args, unk_args = parser.parse_known_args()
     job_name = exec_args.job_name
@@ -352,6 +655,8 @@ def slurm_exec(
             slurm_args = slurm_args | slurm_unk_args
 
         # Load job name: "{filename}-{func_name}"
+        import inspect
+        from shlex import quote as _quote_cmdline_str
         func_file = Path(inspect.getfile(func.__wrapped__))  # the file of the function (wrapped used because otherwise it would return the decorator file)
         full_job_name = f"{func.__name__}() in {func_file}"
         
@@ -396,12 +701,17 @@ def slurm_exec(
         
         python_file = str(func_file)
         exec_args_slurm = []
+        if args_by_reference:
+            from .slurmexec_runner import write_args_file
+            args_dir = Path(script_dir).expanduser()
+            args_dir.mkdir(parents=True, exist_ok=True)
+            exec_args_slurm = ["--slurmexec_args", _quote_cmdline_str(str(write_args_file(args_dir, exec_args_dict)))]
         # for argname, value in exec_args_dict.items():
         #     if isinstance(value, str):
         #         value = _quote_cmdline_str(value)
         #     exec_args_slurm.append(f"--{argname}={value}")
         # Now we are using the executed args:
-        for arg in sys.argv[1:]:  # everything after the script name
+        for arg in [] if args_by_reference else sys.argv[1:]:  # everything after the script name
             if arg not in unk_args:  # ignore unk_args, which are assumed to be slurm arguments
                 exec_args_slurm.append(_quote_cmdline_str(arg))
         
@@ -2,44 +2,26 @@ from pathlib import Path
 import sys
 from typing import Optional
 import subprocess
+import inspect
 from shlex import quote as _quote_cmdline_str
-from contextlib import contextmanager
-from types import ModuleType
-from importlib.util import spec_from_file_location, module_from_spec
+from hashlib import sha256
 
-from .slurm import is_this_a_slurm_job, set_slurm_debug, SlurmJobMeta, SLURM_LOG_EOF_MESSAGE
+from .slurm import is_this_a_slurm_job, set_slurm_debug, run_sbatch, SlurmJobMeta, SLURM_LOG_EOF_MESSAGE, SLURM_REQUEUE_EXIT_CODE
+from .slurmexec_runner import load_module_from_file, dump_invocation_record, write_args_file, write_atomic
+from .history import ResourceHistory, autosize_slurm_args, get_job_key
+from .profiling import PROFILE_MODES, get_profile_file, profiled_call
 from .utils import load_func_argparser
 
 
-@contextmanager
-def add_to_sys_path(target_path: Path):
-    path_str = str(target_path.resolve())    
-    if path_str in sys.path:
-        # Path is already in sys.path, so we can just yield
-        yield
-    else:
-        # Path is not in sys.path, so we need to add it and then remove it after yielding
-        sys.path.insert(0, path_str)
-        try:
-            yield
-        finally:
-            sys.path.remove(path_str)
-
-def load_module_from_file(path: Path) -> ModuleType:
-    with add_to_sys_path(path.parent):
-        spec = spec_from_file_location(name=path.stem, location=str(path))
-        if spec is None or spec.loader is None:
-            raise ImportError(f"Could not create module spec from {path}")
-        module = module_from_spec(spec)
-        sys.modules[spec.name] = module  # Register module before executing it
-        spec.loader.exec_module(module)
-        
-    return module
-
-def create_slurm_args(meta: SlurmJobMeta, unknown_args: Optional[list[str]] = None):
+def create_slurm_args(meta: SlurmJobMeta, unknown_args: Optional[list[str]] = None, verbose: bool = True):
     slurm_args = {
         "--job-name": meta.job_name
     }
+    if meta.checkpoint_signal is not None:
+        slurm_args["--signal"] = f"B:USR1@{meta.checkpoint_signal}"  # B: signals the batch shell, which forwards it
+        slurm_args["--open-mode"] = "append"  # keep the log of previous runs when requeued
+        if meta.requeue:
+            slurm_args["--requeue"] = True
     slurm_args.update(meta.slurm_args)
     if unknown_args:
         i = 0
@@ -55,7 +37,8 @@ def create_slurm_args(meta: SlurmJobMeta, unknown_args: Optional[list[str]] = No
                     sys.exit(1)
                 slurm_args[arg] = unknown_args[i+1]
                 i += 2
-        print(f"Passing `{' '.join(unknown_args)}` as arguments to SBATCH.")
+        if verbose:
+            print(f"Passing `{' '.join(unknown_args)}` as arguments to SBATCH.")
     return slurm_args
 
 def create_slurm_script(
@@ -63,7 +46,8 @@ def create_slurm_script(
     slurm_args: dict[str, str],
     output_file: str,
     unknown_args: Optional[list[str]] = None,
-    srun: bool = False
+    srun: bool = False,
+    invocation_file: Optional[Path] = None
 ):    
     # Set output file name as "{job id}_{array task id}"
     # %A is the slurm array parent job id
@@ -73,23 +57,43 @@ def create_slurm_script(
     slurm_args["--output"] = slurm_args["--error"] = str(output_file)
 
     script_args_str = "\n".join([
-        f"#SBATCH {arg}={value}" if arg.startswith("--")
+        f"#SBATCH {arg}" if value is True  # flag without value, e.g. --requeue
+        else f"#SBATCH {arg}={value}" if arg.startswith("--")
         else f"#SBATCH {arg} {value}"
         for arg, value in slurm_args.items()
     ])
 
-    exec_args_slurm = []
-    # for argname, value in exec_args_dict.items():
-    #     if isinstance(value, str):
-    #         value = _quote_cmdline_str(value)
-    #     exec_args_slurm.append(f"--{argname}={value}")
-    # Now we are using the executed args:
-    for arg in sys.argv[1:]:  # everything after the script name
-        if arg not in unknown_args:  # ignore unk_args, which are assumed to be slurm arguments
-            exec_args_slurm.append(_quote_cmdline_str(arg))
-
-    exec_command = f"{'srun ' if srun else ''}slurmexec {' '.join(exec_args_slurm)}"
+    if invocation_file is not None:
+        # Fast path: the function and its typed arguments were resolved at submission time
+        exec_command = f"{'srun ' if srun else ''}slurmexec-run {_quote_cmdline_str(str(invocation_file))}"
+    else:
+        exec_args_slurm = []
+        # Now we are using the executed args:
+        for arg in sys.argv[1:]:  # everything after the script name
+            if unknown_args is None or arg not in unknown_args:  # ignore unk_args, which are assumed to be slurm arguments
+                exec_args_slurm.append(_quote_cmdline_str(arg))
+
+        exec_command = f"{'srun ' if srun else ''}slurmexec {' '.join(exec_args_slurm)}"
     pre_run_commands_str = "\n".join(meta.pre_run_commands)
+
+    if meta.checkpoint_signal is not None:
+        # Run in the background so the batch shell can forward the checkpoint signal (a foreground
+        # command would delay the trap until it exits); a requeued run must not write the EOF message
+        exec_block = f"""{exec_command} &
+SLURMEXEC_PID=$!
+trap 'kill -USR1 $SLURMEXEC_PID' USR1
+wait $SLURMEXEC_PID
+EXIT_CODE=$?
+while kill -0 $SLURMEXEC_PID 2>/dev/null; do
+    wait $SLURMEXEC_PID
+    EXIT_CODE=$?
+done
+if [ $EXIT_CODE -eq {SLURM_REQUEUE_EXIT_CODE} ]; then
+    echo "# Job checkpointed and requeued"
+    exit 0
+fi"""
+    else:
+        exec_block = exec_command
     
 
     script = f"""#!/bin/bash -l
@@ -114,7 +118,7 @@ echo
 echo "# > {exec_command}"
 echo
 
-{exec_command}
+{exec_block}
 
 echo
 echo "{SLURM_LOG_EOF_MESSAGE}"
@@ -123,6 +127,242 @@ echo "{SLURM_LOG_EOF_MESSAGE}"
 """
     return script
 
+def get_slurm_ntasks(slurm_args: dict[str, any]) -> int:
+    """Number of tasks requested by `slurm_args` (`--ntasks`/`-n`), defaulting to 1."""
+    return int(slurm_args.get("--ntasks", slurm_args.get("-n", 1)))
+
+def get_first_array_index(slurm_args: dict[str, any]) -> int:
+    """First task index of the `--array`/`-a` spec in `slurm_args`, e.g. "3-9:2%4" -> 3."""
+    import re
+    match = re.match(r"\d+", str(slurm_args.get("--array", slurm_args.get("-a", "0"))))
+    return int(match.group()) if match else 0
+
+def submit_slurm_job(
+    func: callable,
+    kwargs: dict[str, any],
+    unknown_args: Optional[list[str]] = None,
+    extra_slurm_args: Optional[dict[str, any]] = None,
+    profile: Optional[str] = None,
+    sbatch_retries: int = 4,
+):
+    """
+    Creates a .slurm script running the @slurm_job `func` with `kwargs` and submits it via sbatch, retrying
+    transient controller errors up to `sbatch_retries` times (see `run_sbatch`).
+
+    Jobs requesting more than one task (`ntasks`) are launched with srun, one process per rank; each rank
+    writes its own log and return value to ~/slurm_logs (see `gather_slurm_results`). Other jobs only save
+    their return value with `@slurm_job(save_result=True)`.
+    For `@slurm_job(cache=True)`, a previously completed result with the same cache key is returned
+    instead of submitting (see `remoteexec.cache`).
+    With `profile` (or `@slurm_job(profile=...)`), the function runs under that profiler and the profile is
+    saved next to the log (see `remoteexec.profiling`). With `@slurm_job(progress=...)`, each task keeps a
+    status record for `slurmexec-progress` (see `remoteexec.progress`).
+
+    Returns:
+        dict: Submission details ("success", "message", "script_file", "is_array_task" and, if submitted, "job_id", "log_file" and "progress").
+            If the result was cached, nothing is submitted: "job_id" is None and "result", "cached" and "cache_key" are set.
+    """
+    path = Path(inspect.getfile(func.__wrapped__)).resolve()
+    func_name = func.__name__
+    meta = func._slurm_job_meta
+    profile = profile or meta.profile
+    slurm_args = create_slurm_args(meta, unknown_args)
+    if extra_slurm_args:
+        slurm_args.update(extra_slurm_args)
+    job_key = get_job_key(slurm_args["--job-name"], path, func_name)
+    slurm_args = autosize_slurm_args(slurm_args, job_key)  # `--mem auto` / `--time auto`
+    is_array_task = "--array" in slurm_args or "-a" in slurm_args
+    is_multi_task = get_slurm_ntasks(slurm_args) > 1
+
+    cache_options = None
+    if meta.cache:
+        if is_array_task or is_multi_task:
+            print("Result caching is not supported for array and multi-task jobs; submitting without cache.")
+        else:
+            from .cache import JobCache, compute_job_cache_key
+            cache = JobCache()
+            cache_key = compute_job_cache_key(func, kwargs, meta.inputs)
+            hit, result = cache.get(cache_key)
+            if hit:
+                print(f"Found cached result of {func_name} (key {cache_key[:16]}); not submitting.")
+                print(f"Cached result: {result!r}")
+                return {
+                    "success": True,
+                    "message": "Cached result",
+                    "is_array_task": False,
+                    "job_id": None,
+                    "result": result,
+                    "cached": True,
+                    "cache_key": cache_key,
+                }
+            cache_options = {"key": cache_key, "cache_dir": str(cache.cache_dir), "max_bytes": cache.max_bytes, "max_age": cache.max_age}
+
+    output_dir = Path.home() / "slurm_logs"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / ("%A_%a.out" if is_array_task else "%j.out")
+    script_dir = Path.cwd() / ".slurmexec"
+    script_dir.mkdir(exist_ok=True)
+    invocation_file = write_invocation_record(
+        script_dir, path, func_name, kwargs,
+        log_dir=str(output_dir) if is_multi_task else None,
+        result_dir=str(output_dir) if is_multi_task or meta.save_result else None,
+        cache=cache_options,
+        staging=None if not meta.stage else {
+            "inputs": [str(Path(p.format(**kwargs)).expanduser().resolve()) for p in meta.inputs],
+            "outputs": [str(Path(p.format(**kwargs)).expanduser().resolve()) for p in meta.outputs],
+        },
+        log=None if meta.log_options is None else {"log_dir": str(output_dir), **meta.log_options},
+        checkpoint=None if meta.checkpoint_signal is None else {
+            "checkpoint_dir": str(output_dir / "checkpoints"),
+            "requeue": meta.requeue,
+        },
+        profile=None if profile is None else {"mode": profile, "profile_dir": str(output_dir)},
+        telemetry=None if meta.telemetry is None else {"interval": meta.telemetry, "telemetry_dir": str(output_dir)},
+        status=get_status_options(output_dir, meta.progress),
+    )
+    script = create_slurm_script(meta, slurm_args, output_file, unknown_args, srun=is_multi_task, invocation_file=invocation_file)
+    script_file = write_script_file(script_dir, f"{path.stem}__{func_name}", script)
+
+    # Run sbatch script
+    output = run_sbatch(script_file, max_retries=sbatch_retries)
+    
+    out_data = {
+        "success": True,
+        "message": output,
+        "script_file": str(script_file),
+        "is_array_task": is_array_task,
+    }
+    
+    if output.startswith("Submitted batch job"):
+        job_id = output.rsplit(" ", maxsplit=1)[-1] # last item
+        log_file = slurm_args["--output"].replace("%x", slurm_args["--job-name"]).replace("%A", job_id).replace("%j", job_id)
+
+        if meta.log_options is not None:
+            # Follow the first array task and rank 0 of multi-task jobs
+            from .slurmexec_runner import get_buffered_log_file
+            job_tag = f"{job_id}_{get_first_array_index(slurm_args)}" if is_array_task else job_id
+            log_file = str(get_buffered_log_file(output_dir, job_tag, meta.log_options.get("compress", True), rank=0 if is_multi_task else None))
+            out_data["log_format"] = "buffered"
+
+        out_data["job_id"] = job_id
+        out_data["log_file"] = log_file
+        out_data["progress"] = bool(meta.progress)
+        try:
+            ResourceHistory().record_submission(job_id, job_key, slurm_args, script_file)
+        except OSError as e:
+            print(f"Could not record job in resource history: {e}")
+        print(output)
+        print(f"Script file: {script_file}")
+        print(f"Log file: {log_file}")
+        if is_multi_task:
+            print(f"Rank log files: {output_dir / f'{job_id}.rank*'}{'.log*' if meta.log_options is not None else '.out'}")
+        if profile is not None:
+            print(f"Profiles: {output_dir / f'{job_id}*'}{PROFILE_MODES[profile]} (summarize with `slurmexec-profile {job_id}`)")
+        if meta.telemetry is not None:
+            print(f"Telemetry: summarize with `slurmexec-telemetry {job_id}`")
+        if meta.progress:
+            print(f"Progress: `slurmexec-progress {job_id}`")
+    else:
+        out_data["success"] = False
+        print("Failed to submit batch job:", output)
+        print(f"Script file: {script_file}")
+    
+    return out_data
+
+def run_local_tasks(
+    path: Path,
+    func_name: str,
+    kwargs: dict[str, any],
+    ntasks: int,
+    profile: Optional[str] = None,
+    log_options: Optional[dict[str, any]] = None,
+    progress: Optional[float] = None,
+) -> list[int]:
+    """
+    Runs `ntasks` local processes standing in for `srun`, each with the Slurm rank environment set.
+    With `log_options` (see `@slurm_job(log_options=...)`), each rank writes a buffered log instead of a `.out` file;
+    with `progress` (see `@slurm_job(progress=...)`), each rank keeps a status record.
+
+    Returns:
+        list[int]: Return code of each rank.
+    """
+    import os
+    import socket
+    import time
+
+    job_id = f"local{int(time.time())}_{os.getpid()}"
+    output_dir = Path.home() / "slurm_logs"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    script_dir = Path.cwd() / ".slurmexec"
+    script_dir.mkdir(exist_ok=True)
+    invocation_file = write_invocation_record(
+        script_dir, path, func_name, kwargs,
+        log_dir=str(output_dir),
+        result_dir=str(output_dir),
+        profile=None if profile is None else {"mode": profile, "profile_dir": str(output_dir)},
+        status=get_status_options(output_dir, progress),
+        log=None if log_options is None else {"log_dir": str(output_dir), **log_options},
+    )
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    print(f"*** Running {ntasks} local tasks as job {job_id} (logs: {output_dir / f'{job_id}.rank*'}{'.log*' if log_options is not None else '.out'})")
+    processes = []
+    for rank in range(ntasks):
+        env = os.environ | {
+            "SLURMEXEC_LOCAL_JOB_ID": job_id,
+            "SLURM_PROCID": str(rank),
+            "SLURM_LOCALID": str(rank),
+            "SLURM_NTASKS": str(ntasks),
+            "SLURM_NNODES": "1",
+            "MASTER_ADDR": "127.0.0.1",
+            "MASTER_PORT": str(port),
+        }
+        processes.append(subprocess.Popen([sys.executable, "-m", "remoteexec.slurmexec_runner", str(invocation_file)], env=env))
+    return_codes = [process.wait() for process in processes]
+
+    from .slurm import gather_slurm_results
+    for rank, result in enumerate(gather_slurm_results(job_id, output_dir)):
+        print(f"*** Rank {rank} returned: {result}")
+    return return_codes
+
+def get_status_options(output_dir: Path, progress: Optional[float]) -> Optional[dict[str, any]]:
+    """Status record options of the invocation record for `@slurm_job(progress=...)`, or None without progress."""
+    if not progress:
+        return None
+    return {"status_dir": str(output_dir / "status"), "heartbeat": 30 if progress is True else progress}
+
+def write_invocation_record(record_dir: Path, path: Path, func_name: str, kwargs: dict[str, any], **options) -> Path:
+    """
+    Writes the invocation record read by `slurmexec-run` inside the job.
+    The file name is the hash of its content, so identical submissions share a record
+    and a later submission can never change the arguments of a queued job.
+    Non-empty kwargs are passed by reference through an args file (see `write_args_file`).
+    """
+    data = dump_invocation_record({
+        "path": str(path),
+        "func_name": func_name,
+        **({"args_file": str(write_args_file(record_dir, kwargs))} if kwargs else {"kwargs": {}}),
+        **options,
+    })
+    record_file = record_dir / f"{path.stem}__{func_name}__{sha256(data).hexdigest()[:16]}.pkl"
+    if not record_file.exists():
+        write_atomic(record_file, data)
+    return record_file.resolve()
+
+def write_script_file(script_dir: Path, prefix: str, script: str) -> Path:
+    """
+    Writes a .slurm script named by the hash of its content, so concurrent submissions never
+    overwrite a script before sbatch read it; identical scripts share a file.
+    """
+    data = script.encode()
+    script_file = script_dir / f"{prefix}__{sha256(data).hexdigest()[:16]}.slurm"
+    if not script_file.exists():
+        write_atomic(script_file, data)
+    return script_file
+
 def main():
     if len(sys.argv) == 1:
         print(f"Usage: slurmexec <filename.py[:function_name]> [args...]")
@@ -172,6 +412,17 @@ def main():
     func = slurm_job_fns[func_name]
     meta = func._slurm_job_meta
 
+    # `--profile {cprofile,sampling,tracemalloc}` is handled by slurmexec unless the function has a `profile` argument
+    profile = meta.profile
+    argv = sys.argv[2:]
+    if "--profile" in argv and "profile" not in inspect.signature(func).parameters:
+        i = argv.index("--profile")
+        if i + 1 >= len(argv) or argv[i + 1] not in PROFILE_MODES:
+            print(f"--profile must be one of {', '.join(PROFILE_MODES)}")
+            sys.exit(1)
+        profile = argv[i + 1]
+        del argv[i:i + 2]
+
     parser = load_func_argparser(func)
     # Create a more helpful usage string
     usage = parser.format_usage()  # "usage: slurmexec [...]"
@@ -183,7 +434,7 @@ def main():
     # parser.usage = f"slurmexec {sys.argv[1]} [args...]"
     # parser.add_argument("--job_name", type=str, default=meta.name, help=f"Name of the slurm job (Defaults to function name, \"{meta.name}\")")
     # parser.add_argument("--local", action="store_true", help="Whether to run the job locally instead of on slurm.")
-    exec_args, unknown_args = parser.parse_known_args(sys.argv[2:])  # ignore filename
+    exec_args, unknown_args = parser.parse_known_args(argv)  # ignore filename
     # job_name = exec_args.job_name
     # delattr(exec_args, "job_name")
     exec_args_dict = vars(exec_args)
@@ -212,56 +463,26 @@ def main():
         if unknown_args:
             print(f"*** Ignoring Slurm command line args: {unknown_args}")
         print()
+
+        ntasks = get_slurm_ntasks(create_slurm_args(meta, unknown_args, verbose=False))
+        if ntasks > 1:
+            return_codes = run_local_tasks(path, func_name, exec_args_dict, ntasks, profile=profile, log_options=meta.log_options, progress=meta.progress)
+            sys.exit(max(return_codes))
         
         # Refresh the module because is_this_a_slurm_job() will now return True
         set_slurm_debug(True, silent=True)
         module = load_module_from_file(path)
         func = getattr(module, func_name)
+        if profile is not None:
+            import time
+            profile_file = get_profile_file(Path.home() / "slurm_logs", f"local{int(time.time())}", profile)
+            print(f"*** Profiling with {profile}; saving to {profile_file}")
+            func = profiled_call(func, profile, profile_file)
         func(**exec_args_dict)
         sys.exit(0)
 
     # Slurm exists, create a .slurm script and execute via sbash
-    slurm_args = create_slurm_args(meta, unknown_args)
-    is_array_task = "--array" in slurm_args or "-a" in slurm_args
-    output_dir = Path.home() / "slurm_logs"
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_file = output_dir / ("%A_%a.out" if is_array_task else "%j.out")
-    script = create_slurm_script(meta, slurm_args, output_file, unknown_args)
-    script_dir = Path.cwd() / ".slurmexec"
-    script_dir.mkdir(exist_ok=True)
-    script_file = script_dir / f"{path.stem}__{func.__name__}.slurm"
-    script_file.write_text(script)
-
-    # Run sbatch script
-    try:
-        output = subprocess.check_output(["sbatch", str(script_file)], stderr=subprocess.STDOUT)
-        output = output.decode().strip() # parse binary; strip newlines
-    except subprocess.CalledProcessError as e:
-        output = e.output.decode("utf-8")
-    except Exception as e:
-        raise RuntimeError(f"An unexpected error occurred: {e}")
-    # print(f"[DEBUG] Slurm output: {output}")
-    
-    out_data = {
-        "success": True,
-        "message": output,
-        "script_file": str(script_file),
-        "is_array_task": is_array_task,
-    }
-    
-    if output.startswith("Submitted batch job"):
-        job_id = output.rsplit(" ", maxsplit=1)[-1] # last item
-        log_file = slurm_args["--output"].replace("%x", slurm_args["--job-name"]).replace("%A", job_id).replace("%j", job_id)
-
-        out_data["job_id"] = job_id
-        out_data["log_file"] = log_file
-        print(output)
-        print(f"Script file: {script_file}")
-        print(f"Log file: {log_file}")
-    else:
-        print("Failed to submit batch job:", output)
-        print(f"Script file: {script_file}")
-    
+    out_data = submit_slurm_job(func, exec_args_dict, unknown_args, profile=profile)
     print(out_data)
     
 
@@ -0,0 +1,350 @@
+"""
+In-job entry point for jobs submitted by slurmexec.
+
+At submission time, `slurmexec` resolves the @slurm_job function and parses its
+arguments once, then writes an invocation record (module path, function name and
+typed kwargs). Inside the allocation, `slurmexec-run <record>` loads that record and
+calls the function directly, skipping function discovery, argparser construction
+and environment checks.
+"""
+import os
+import sys
+import pickle
+from pathlib import Path
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Optional
+from importlib.util import spec_from_file_location, module_from_spec
+
+
+@contextmanager
+def add_to_sys_path(target_path: Path):
+    path_str = str(target_path.resolve())
+    if path_str in sys.path:
+        # Path is already in sys.path, so we can just yield
+        yield
+    else:
+        # Path is not in sys.path, so we need to add it and then remove it after yielding
+        sys.path.insert(0, path_str)
+        try:
+            yield
+        finally:
+            sys.path.remove(path_str)
+
+def load_module_from_file(path: Path) -> ModuleType:
+    with add_to_sys_path(path.parent):
+        spec = spec_from_file_location(name=path.stem, location=str(path))
+        if spec is None or spec.loader is None:
+            raise ImportError(f"Could not create module spec from {path}")
+        module = module_from_spec(spec)
+        sys.modules[spec.name] = module  # Register module before executing it
+        spec.loader.exec_module(module)
+
+    return module
+
+
+def dump_invocation_record(record: dict) -> bytes:
+    """Serializes an invocation record (see `load_invocation_record`)."""
+    return pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_invocation_record(path: Path) -> dict:
+    """
+    Loads an invocation record written at submission time.
+
+    Returns:
+        dict: Record with keys "path" (python file), "func_name" and either "kwargs" (already typed)
+            or "args_file" (see `write_args_file`).
+    """
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def write_args_file(args_dir: Path, kwargs: dict[str, any]) -> Path:
+    """
+    Writes job kwargs to a binary file named by the hash of its content, so the job only receives
+    its path and tasks submitted with the same arguments share one file.
+    """
+    from hashlib import sha256
+    data = pickle.dumps(kwargs, protocol=pickle.HIGHEST_PROTOCOL)
+    args_file = Path(args_dir) / f"args__{sha256(data).hexdigest()[:16]}.pkl"
+    if not args_file.exists():
+        write_atomic(args_file, data)
+    return args_file.resolve()
+
+def load_args_file(path: Path, func: Optional[callable] = None) -> dict[str, any]:
+    """
+    Loads kwargs written by `write_args_file`. If `func` is given, string values are converted
+    to the parameter types as `load_func_argparser(func)` would.
+    """
+    with open(path, "rb") as f:
+        kwargs = pickle.load(f)
+    if func is not None:
+        from .utils import convert_func_kwargs
+        kwargs = convert_func_kwargs(func, kwargs)
+    return kwargs
+
+def get_job_tag() -> str:
+    """Identifier of the running job used in file names: "{job id}" or "{array job id}_{array task id}"."""
+    local_job_id = os.environ.get("SLURMEXEC_LOCAL_JOB_ID")
+    if local_job_id is not None:
+        return local_job_id
+    if "SLURM_ARRAY_JOB_ID" in os.environ:
+        return f"{os.environ['SLURM_ARRAY_JOB_ID']}_{os.environ['SLURM_ARRAY_TASK_ID']}"
+    return os.environ.get("SLURM_JOB_ID", "unknown")
+
+def write_atomic(path: Path, data: bytes):
+    """
+    Writes `data` to `path` such that readers never observe a partially written file.
+    Safe for concurrent writers from many processes and threads; the last rename wins.
+    """
+    import threading
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class _Tee:
+    """Writes to a file and, optionally, to another stream (e.g. the job's main log)."""
+    def __init__(self, file, stream=None):
+        self.file = file
+        self.stream = stream
+
+    def write(self, data):
+        self.file.write(data)
+        if self.stream is not None:
+            self.stream.write(data)
+        return len(data)
+
+    def flush(self):
+        self.file.flush()
+        if self.stream is not None:
+            self.stream.flush()
+
+    def isatty(self):
+        return False
+
+@contextmanager
+def rank_log(log_dir: Path, job_tag: str, rank: int):
+    """Redirects stdout/stderr to a per-rank log file; rank 0 is also kept in the main job log."""
+    log_file = Path(log_dir) / f"{job_tag}.rank{rank}.out"
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    stdout, stderr = sys.stdout, sys.stderr
+    with open(log_file, "w", buffering=1) as f:
+        sys.stdout = _Tee(f, stdout if rank == 0 else None)
+        sys.stderr = _Tee(f, stderr if rank == 0 else None)
+        try:
+            yield log_file
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+
+def install_checkpoint_handler(checkpoint_dir: str, requeue: bool):
+    """
+    On SIGUSR1 (sent by Slurm ahead of the time limit or on preemption), runs the callbacks registered with
+    `on_slurm_checkpoint`, requeues the job (from rank 0) and exits with `SLURM_REQUEUE_EXIT_CODE`.
+
+    The callbacks run in the signal handler, i.e. on the main thread between two statements of the job function,
+    so the function's state is not modified while they save it (blocking calls such as `time.sleep` are
+    interrupted). Afterwards `CheckpointRequeue` is raised in the function, so the job exits through its normal
+    path and logs, telemetry and status records are flushed. Output of the callbacks goes to the job's log; the
+    buffered log's lock is reentrant for this.
+    """
+    import signal
+    from .slurm import CheckpointRequeue, SLURM_REQUEUE_EXIT_CODE
+
+    os.environ["SLURMEXEC_CHECKPOINT_DIR"] = checkpoint_dir
+    handled = False
+
+    def handler(signum, frame):
+        nonlocal handled
+        if handled:
+            return  # e.g. the signal was sent to both the batch shell and the job step
+        handled = True
+        _handle_checkpoint_signal(requeue)
+        if requeue:
+            raise CheckpointRequeue(SLURM_REQUEUE_EXIT_CODE)
+
+    signal.signal(signal.SIGUSR1, handler)
+
+
+def _handle_checkpoint_signal(requeue: bool):
+    import subprocess
+    from .slurm import run_slurm_checkpoint_callbacks
+    print("# Received checkpoint signal (SIGUSR1); saving checkpoint", flush=True)
+    run_slurm_checkpoint_callbacks()
+    if requeue and int(os.environ.get("SLURM_PROCID", 0)) == 0 and "SLURMEXEC_LOCAL_JOB_ID" not in os.environ:
+        job_id = get_job_tag() if "SLURM_ARRAY_JOB_ID" in os.environ else os.environ["SLURM_JOB_ID"]
+        print(f"# Requeueing job {job_id}", flush=True)
+        subprocess.run(["scontrol", "requeue", job_id])
+
+
+def get_buffered_log_file(log_dir: Path, job_tag: str, compress: bool = True, rank: Optional[int] = None) -> Path:
+    """Buffered log of a task: "{job_tag}.log.gz", or "{job_tag}.rank{rank}.log.gz" for a rank of a multi-task job."""
+    task_tag = job_tag if rank is None else f"{job_tag}.rank{rank}"
+    return Path(log_dir) / f"{task_tag}.log{'.gz' if compress else ''}"
+
+@contextmanager
+def buffered_log(log_dir: Path, job_tag: str, rank: Optional[int] = None, **options):
+    """Redirects stdout/stderr to a `BufferedLogWriter`, which is closed with the EOF message unless the job is requeued."""
+    import traceback
+    from .joblog import BufferedLogWriter
+    from .slurm import CheckpointRequeue, SLURM_LOG_EOF_MESSAGE
+
+    writer = BufferedLogWriter(get_buffered_log_file(log_dir, job_tag, options.get("compress", True), rank), **options)
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = writer
+    eof_message = SLURM_LOG_EOF_MESSAGE
+    try:
+        yield writer
+    except CheckpointRequeue:
+        eof_message = None  # the requeued run continues the log
+        raise
+    except BaseException:
+        traceback.print_exc()
+        raise
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        writer.close(eof_message=eof_message)
+
+def save_result(result_dir: Path, job_tag: str, rank: int, result: any) -> Optional[Path]:
+    """
+    Pickles the return value of a rank to `{result_dir}/{job_tag}.rank{rank}.result.pkl` (see `gather_slurm_results`).
+
+    Returns:
+        Path: Result file, or None if the return value could not be pickled (the job still succeeds).
+    """
+    result_file = Path(result_dir) / f"{job_tag}.rank{rank}.result.pkl"
+    try:
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:  # pickle raises PicklingError, TypeError or AttributeError depending on the object
+        print(f"# Return value of rank {rank} ({type(result).__name__}) cannot be pickled and is not saved: {e}")
+        return None
+    try:
+        write_atomic(result_file, data)
+    except OSError as e:
+        print(f"# Failed to save return value of rank {rank} to {result_file}: {e}")
+        return None
+    return result_file
+
+
+def _replace_staged_path(value, staged: dict[str, str]):
+    """Returns the staged path if `value` is a path (str or Path) that was staged, else `value`."""
+    if not isinstance(value, (str, Path)):
+        return value
+    staged_path = staged.get(str(Path(value).expanduser().resolve()))
+    if staged_path is None:
+        return value
+    return Path(staged_path) if isinstance(value, Path) else staged_path
+
+
+def run_invocation(record: dict):
+    """
+    Imports the function referenced by `record` and calls it with the recorded kwargs.
+
+    Optional record keys:
+        "log_dir": directory for per-rank logs, used when the job step has more than one task.
+        "result_dir": directory to which the (picklable, non-None) return value of each rank is saved.
+        "cache": `JobCache` options and "key" under which the return value is cached.
+        "checkpoint": {"checkpoint_dir", "requeue"} to handle the early-warning signal (see `install_checkpoint_handler`).
+        "staging": {"inputs", "outputs"} absolute paths to stage through node-local scratch (see `remoteexec.staging`);
+            outputs are only staged by rank 0.
+        "log": {"log_dir", **BufferedLogWriter options} to write output to a buffered log (see `remoteexec.joblog`).
+        "payload": file with a function call shipped by value (see `remoteexec.payload`), used instead of
+            "path"/"func_name"/"kwargs". Its return value is saved even if None.
+        "profile": {"mode", "profile_dir"} to run the function under a profiler (see `remoteexec.profiling`).
+        "telemetry": {"interval", "telemetry_dir"} to sample resource usage while the function runs (see `remoteexec.telemetry`).
+        "status": {"status_dir", "heartbeat"} for the task's progress and heartbeat record (see `remoteexec.progress`).
+    """
+    if "SLURMEXEC_LOCAL_JOB_ID" in os.environ:
+        # Launched locally by slurmexec standing in for srun
+        from .slurm import set_slurm_debug
+        set_slurm_debug(True, silent=True)
+
+    rank = int(os.environ.get("SLURM_PROCID", 0))
+    world_size = int(os.environ.get("SLURM_NTASKS", 1))
+    job_tag = get_job_tag()
+
+    args = ()
+    if record.get("payload") is not None:
+        from .payload import loads_call
+        func, args, kwargs = loads_call(Path(record["payload"]).read_bytes())
+    else:
+        module = load_module_from_file(Path(record["path"]))
+        func = getattr(module, record["func_name"])
+        # The kwargs were typed by the argparser at submission; they are not converted again in the job
+        kwargs = load_args_file(record["args_file"]) if "args_file" in record else record["kwargs"]
+
+    if record.get("checkpoint") is not None:
+        install_checkpoint_handler(**record["checkpoint"])
+
+    task_tag = job_tag if world_size == 1 else f"{job_tag}.rank{rank}"
+    if record.get("profile") is not None:
+        from .profiling import get_profile_file, profiled_call
+        mode = record["profile"]["mode"]
+        func = profiled_call(func, mode, get_profile_file(record["profile"]["profile_dir"], task_tag, mode))
+
+    if record.get("telemetry") is not None:
+        from .telemetry import telemetry_call
+        telemetry_file = Path(record["telemetry"]["telemetry_dir"]) / f"{task_tag}.telemetry"
+        func = telemetry_call(func, telemetry_file, record["telemetry"]["interval"])
+
+    if record.get("status") is not None:
+        from .progress import progress_call
+        status_file = Path(record["status"]["status_dir"]) / f"{task_tag}.status"
+        func = progress_call(func, status_file, task_tag, record["status"]["heartbeat"])
+
+    staging = record.get("staging")
+    if staging is not None:
+        from .staging import stage_inputs, prepare_outputs
+        staged = stage_inputs(staging["inputs"])
+        # Only rank 0 commits outputs, so only rank 0 redirects them; other ranks write to the declared paths
+        staged_outputs = prepare_outputs(staging["outputs"], f"{job_tag}.rank{rank}") if rank == 0 else {}
+        staged.update(staged_outputs)
+        kwargs = {
+            name: _replace_staged_path(value, staged)
+            for name, value in kwargs.items()
+        }
+
+    if record.get("log") is not None:
+        log_options = dict(record["log"])
+        log_dir = log_options.pop("log_dir")
+        with buffered_log(log_dir, job_tag, rank if world_size > 1 else None, **log_options):
+            result = func(*args, **kwargs)
+    elif world_size > 1 and record.get("log_dir") is not None:
+        with rank_log(record["log_dir"], job_tag, rank):
+            result = func(*args, **kwargs)
+    else:
+        result = func(*args, **kwargs)
+
+    if staging is not None and staged_outputs:
+        from .staging import commit_outputs
+        commit_outputs(staged_outputs)
+
+    if (result is not None or record.get("payload") is not None) and record.get("result_dir") is not None:
+        save_result(record["result_dir"], job_tag, rank, result)
+
+    if record.get("cache") is not None:
+        from .cache import JobCache
+        cache_options = dict(record["cache"])
+        cache_key = cache_options.pop("key")
+        try:
+            JobCache(**cache_options).put(cache_key, result)
+        except Exception as e:
+            print(f"# Failed to cache return value: {e}")
+    return result
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: slurmexec-run <invocation_record>")
+        sys.exit(1)
+
+    record = load_invocation_record(Path(sys.argv[1]))
+    run_invocation(record)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
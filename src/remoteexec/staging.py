@@ -0,0 +1,130 @@
+"""
+Node-local scratch staging of job inputs and outputs (`@slurm_job(inputs=[...], outputs=[...], stage=True)`).
+
+Before the function runs, declared inputs are copied in parallel from the shared filesystem to node-local
+scratch ($SLURMEXEC_SCRATCH, $TMPDIR or /tmp). Inputs already staged by an earlier task on the same node
+are reused. Declared outputs are redirected to scratch and copied back atomically after the function returns;
+in multi-task jobs only rank 0 does so, the other ranks write to the declared paths directly.
+Function arguments equal to a declared path are replaced by the staged path; `get_staged_path` maps any
+other declared path.
+"""
+import os
+import shutil
+import fcntl
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ["get_staged_path", "get_scratch_dir"]
+
+_STAGED_PATHS: dict[str, str] = {}
+
+
+def get_scratch_dir() -> Path:
+    """Node-local scratch directory used for staging."""
+    base = os.environ.get("SLURMEXEC_SCRATCH") or os.environ.get("TMPDIR") or "/tmp"
+    return Path(base) / f"slurmexec_stage_{os.getuid()}"
+
+
+def get_staged_path(path: str) -> str:
+    """Returns the node-local path of a declared input/output `path`, or `path` itself if it was not staged."""
+    return _STAGED_PATHS.get(str(Path(path).expanduser().resolve()), str(path))
+
+
+def _files(path: Path) -> list[Path]:
+    return [path] if path.is_file() else sorted(f for f in path.rglob("*") if f.is_file())
+
+
+def _is_staged(src: Path, dst: Path) -> bool:
+    try:
+        src_stat, dst_stat = src.stat(), dst.stat()
+    except FileNotFoundError:
+        return False
+    return src_stat.st_size == dst_stat.st_size and int(src_stat.st_mtime) == int(dst_stat.st_mtime)
+
+
+def _stage_file(src: Path, dst: Path, lock_dir: Path) -> bool:
+    """Copies `src` to `dst` unless already staged; a lock makes concurrent tasks on the node copy it only once."""
+    if _is_staged(src, dst):
+        return False
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_dir / f"{sha256(str(dst).encode()).hexdigest()[:16]}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _is_staged(src, dst):
+            return False  # staged by another task while we waited
+        tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+        shutil.copy2(src, tmp)  # copy2 keeps the mtime used by _is_staged
+        os.replace(tmp, dst)
+    return True
+
+
+def stage_inputs(inputs: list[str], scratch_dir: Optional[Path] = None, max_workers: int = 8) -> dict[str, str]:
+    """
+    Copies `inputs` (files or directories) to node-local scratch in parallel.
+
+    Returns:
+        dict[str, str]: Staged path of each input.
+    """
+    scratch_dir = Path(scratch_dir or get_scratch_dir()) / "inputs"
+    staged, copies = {}, []
+    for src in inputs:
+        src = Path(src)
+        # Keyed by the full source path, so equally named inputs do not collide and tasks share copies
+        dst = scratch_dir / sha256(str(src).encode()).hexdigest()[:16] / src.name
+        staged[str(src)] = str(dst)
+        if src.is_file():
+            copies.append((src, dst))
+        else:
+            copies.extend((f, dst / f.relative_to(src)) for f in _files(src))
+
+    lock_dir = scratch_dir / ".locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        n_copied = sum(executor.map(lambda c: _stage_file(*c, lock_dir), copies))
+    print(f"# Staged {len(inputs)} inputs to {scratch_dir} ({n_copied} of {len(copies)} files copied, the others were already staged on this node)", flush=True)
+    _STAGED_PATHS.update(staged)
+    return staged
+
+
+def prepare_outputs(outputs: list[str], job_tag: str, scratch_dir: Optional[Path] = None) -> dict[str, str]:
+    """
+    Reserves a node-local location for each output of this task.
+
+    Returns:
+        dict[str, str]: Staged path of each output.
+    """
+    scratch_dir = Path(scratch_dir or get_scratch_dir()) / "outputs" / job_tag
+    staged = {}
+    for dst in outputs:
+        path = scratch_dir / sha256(dst.encode()).hexdigest()[:16] / Path(dst).name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staged[dst] = str(path)
+    _STAGED_PATHS.update(staged)
+    return staged
+
+
+def commit_outputs(staged_outputs: dict[str, str]):
+    """Copies staged outputs back to their declared location; each output appears there atomically."""
+    for dst, src in staged_outputs.items():
+        src, dst = Path(src), Path(dst)
+        if not src.exists():
+            print(f"# Declared output {dst} was not written")
+            continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+        if src.is_dir():
+            shutil.copytree(src, tmp)
+            if dst.exists():
+                old = dst.with_name(f".{dst.name}.{os.getpid()}.old")
+                os.replace(dst, old)
+                os.replace(tmp, dst)
+                shutil.rmtree(old)
+            else:
+                os.replace(tmp, dst)
+            shutil.rmtree(src)
+        else:
+            shutil.copy2(src, tmp)
+            os.replace(tmp, dst)
+            src.unlink()
+        print(f"# Copied output {dst} back from scratch", flush=True)
@@ -0,0 +1,153 @@
+"""
+Throttled submission of many @slurm_job calls.
+
+`SubmissionQueue` keeps the number of queued (pending or running) jobs of the user under a cap, feeding
+more submissions in as earlier jobs finish, and retries sbatch failures caused by the per-user submit
+limit or an overloaded controller with exponential backoff. A large campaign can be launched in one go:
+
+    queue = SubmissionQueue(max_in_flight=2000)
+    for params in sweep:
+        queue.put(train, params)
+    results = queue.run()  # blocks until every job was submitted
+"""
+import time
+import random
+import subprocess
+from collections import deque
+from typing import Optional
+
+from .slurm import is_transient_sbatch_error, is_submit_limit_sbatch_error
+
+__all__ = ["SubmissionQueue", "count_array_tasks"]
+
+
+def count_array_tasks(spec: Optional[str]) -> int:
+    """Number of tasks of an `--array` spec, e.g. "0-99:2,200%10" -> 51; 1 for non-array jobs."""
+    if spec is None:
+        return 1
+    count = 0
+    for part in str(spec).split("%", 1)[0].split(","):
+        if "-" in part:
+            bounds, _, step = part.partition(":")
+            start, end = bounds.split("-", 1)
+            count += len(range(int(start), int(end) + 1, int(step or 1)))
+        elif part:
+            count += 1
+    return count
+
+
+class SubmissionQueue:
+    """
+    Queue of pending submissions fed to Slurm under a cap on queued jobs.
+
+    Args:
+        max_in_flight (int, optional): Maximum number of the user's jobs (array tasks counted individually) in the
+            queue at a time. Defaults to 1000.
+        poll_interval (float, optional): Seconds between squeue polls while waiting for capacity. Defaults to 60.
+        max_retries (int, optional): Retries of a submission failing with a transient error, and waits for jobs to finish
+            after the scheduler refused it with a submit limit error. Defaults to 10.
+        backoff (float, optional): Base of the exponential backoff in seconds. Defaults to 2.
+        max_backoff (float, optional): Maximum delay between retries in seconds. Defaults to 600.
+    """
+    def __init__(self, max_in_flight: int = 1000, poll_interval: float = 60, max_retries: int = 10, backoff: float = 2.0, max_backoff: float = 600):
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._pending = deque()
+
+    def put(self, func: callable, kwargs: Optional[dict[str, any]] = None, **submit_kwargs):
+        """Adds a submission of the @slurm_job `func`; `submit_kwargs` are passed to `submit_slurm_job`."""
+        if not hasattr(func, "_slurm_job_meta"):
+            raise ValueError(f"Function {func.__name__} must be decorated with @slurm_job")
+        self._pending.append((func, dict(kwargs or {}), submit_kwargs))
+
+    def __len__(self):
+        return len(self._pending)
+
+    def count_in_flight(self) -> int:
+        """Number of queued jobs of the current user, with array tasks counted individually."""
+        import getpass
+        user = getpass.getuser()
+        try:
+            output = subprocess.check_output(["squeue", "-h", "-r", "-u", user, "-o", "%i"], stderr=subprocess.DEVNULL, encoding="utf-8")
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Could not query squeue ({e}); assuming the queue is full")
+            return self.max_in_flight
+        return sum(1 for line in output.splitlines() if line.strip())
+
+    def _delay(self, attempt: int) -> float:
+        return min(self.max_backoff, self.backoff ** attempt) * random.uniform(0.5, 1.5)
+
+    def run(self) -> list[dict]:
+        """
+        Submits all queued submissions, waiting for capacity and retrying failures as needed.
+
+        Returns:
+            list[dict]: Submission details (see `submit_slurm_job`) in the order the submissions were added.
+        """
+        from .slurmexec_client import submit_slurm_job
+
+        pending = deque(enumerate(self._pending))
+        self._pending.clear()
+        results = [None] * len(pending)
+        attempts = [0] * len(pending)
+        in_flight = self.count_in_flight()
+        last_poll = time.monotonic()
+        ceiling = None  # number of queued jobs at which the scheduler last refused a submission
+
+        while pending:
+            if time.monotonic() - last_poll >= self.poll_interval:
+                in_flight = self.count_in_flight()
+                last_poll = time.monotonic()
+
+            index, (func, kwargs, submit_kwargs) = pending[0]
+            slurm_args = func._slurm_job_meta.slurm_args | submit_kwargs.get("extra_slurm_args", {})
+            n_tasks = count_array_tasks(slurm_args.get("--array", slurm_args.get("-a")))
+            limit = self.max_in_flight if ceiling is None else min(self.max_in_flight, ceiling)
+            if in_flight > 0 and in_flight + n_tasks > limit:
+                print(f"{in_flight} jobs queued (limit {limit}); {len(pending)} submissions waiting")
+                time.sleep(self.poll_interval)
+                in_flight = self.count_in_flight()
+                last_poll = time.monotonic()
+                if ceiling is not None and in_flight < ceiling:
+                    ceiling = None  # jobs finished since the refusal; probe the scheduler's limit again
+                continue
+
+            # The queue owns the retry policy, so sbatch is not retried within submit_slurm_job as well
+            out_data = submit_slurm_job(func, kwargs, **(submit_kwargs | {"sbatch_retries": 0}))
+            if out_data["success"]:
+                pending.popleft()
+                results[index] = out_data
+                in_flight += 0 if out_data.get("cached") else n_tasks
+                continue
+
+            message = out_data["message"]
+            is_submit_limit = is_submit_limit_sbatch_error(message)
+            if is_submit_limit:
+                in_flight = self.count_in_flight()
+                last_poll = time.monotonic()
+            if is_submit_limit and in_flight > 0 and attempts[index] < self.max_retries:
+                # The scheduler's limit is lower than ours; wait for queued jobs to finish
+                attempts[index] += 1
+                print(f"Submit limit reached at {in_flight} queued jobs; waiting for jobs to finish")
+                ceiling = in_flight
+                time.sleep(self.poll_interval)
+                in_flight = self.count_in_flight()
+                last_poll = time.monotonic()
+            elif is_transient_sbatch_error(message) and attempts[index] < self.max_retries:
+                attempts[index] += 1
+                delay = self._delay(attempts[index])
+                print(f"Retrying submission {index} in {delay:.1f}s (attempt {attempts[index]} of {self.max_retries})")
+                time.sleep(delay)
+            else:
+                pending.popleft()
+                results[index] = out_data
+                if is_submit_limit and in_flight == 0:
+                    # Refused with nothing queued, so waiting cannot help: the job itself violates a policy (e.g. MaxWall)
+                    print(f"Giving up on submission {index}, refused with no jobs queued: {message}")
+                else:
+                    print(f"Giving up on submission {index}: {message}")
+
+        return results
@@ -0,0 +1,240 @@
+"""
+Resource telemetry of running jobs (`@slurm_job(telemetry=<interval in seconds>)`).
+
+`sacct` only reports end-of-job peaks. With telemetry, the job runner starts a background thread around the
+function call that samples CPU utilization, RSS, I/O bytes and thread count of the job process from /proc
+at a fixed interval. Each sample is a fixed-size binary record appended to `{job}[.rank{r}].telemetry`
+next to the `%j.out` log, so a sample costs two small /proc reads and one 38-byte write.
+
+`slurmexec-telemetry <job id> [--remote host]` loads the series of a job (every task of an array) and
+prints a summary per task.
+"""
+import os
+import re
+import sys
+import time
+import array
+import struct
+import threading
+from pathlib import Path
+from functools import wraps
+from typing import Optional
+
+__all__ = ["TelemetrySampler", "telemetry_call", "load_telemetry", "summarize_telemetry", "load_job_telemetry", "print_telemetry_summary"]
+
+_MAGIC = b"SLURMEXEC-TELEMETRY-1\n"
+# time (unix seconds), CPU utilization (% of one core), RSS, read bytes, written bytes, threads
+_RECORD = struct.Struct("<dfQQQH")
+_COLUMNS = (("time", "d"), ("cpu", "f"), ("rss", "Q"), ("read_bytes", "Q"), ("write_bytes", "Q"), ("threads", "H"))
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read_proc(pid: int) -> tuple[float, int, int, int, int]:
+    """(CPU seconds, RSS bytes, read bytes, written bytes, threads) of a process."""
+    with open(f"/proc/{pid}/stat", "rb") as f:
+        # The command name may contain spaces; fields after it are split normally
+        fields = f.read().rsplit(b")", 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS  # utime, stime
+    threads = int(fields[17])
+    rss = int(fields[21]) * _PAGE_SIZE
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"/proc/{pid}/io", "rb") as f:
+            for line in f:
+                if line.startswith(b"read_bytes:"):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith(b"write_bytes:"):
+                    write_bytes = int(line.split()[1])
+    except OSError:
+        pass  # /proc/<pid>/io may not be readable
+    return cpu_seconds, rss, read_bytes, write_bytes, threads
+
+
+class TelemetrySampler:
+    """
+    Background thread appending resource samples of a process to a telemetry file.
+
+    Args:
+        path (str): Telemetry file; samples are appended.
+        interval (float, optional): Seconds between samples. Defaults to 5.
+        pid (int, optional): Sampled process. Defaults to the current process.
+    """
+    def __init__(self, path: str, interval: float = 5.0, pid: Optional[int] = None):
+        self.path = Path(path)
+        self.interval = interval
+        self.pid = os.getpid() if pid is None else pid
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+        self._last = None
+
+    def start(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(_MAGIC)
+        self._last = (time.monotonic(), _read_proc(self.pid)[0])
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling after writing a final sample."""
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        self._file.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        try:
+            cpu_seconds, rss, read_bytes, write_bytes, threads = _read_proc(self.pid)
+        except OSError:
+            return
+        now = time.monotonic()
+        last_time, last_cpu = self._last
+        cpu = 100 * (cpu_seconds - last_cpu) / max(now - last_time, 1e-6)
+        self._last = (now, cpu_seconds)
+        self._file.write(_RECORD.pack(time.time(), cpu, rss, read_bytes, write_bytes, min(threads, 0xFFFF)))
+        self._file.flush()
+
+
+def telemetry_call(func: callable, path: Path, interval: float = 5.0) -> callable:
+    """Wraps `func` so each call is sampled by a `TelemetrySampler` writing to `path`."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        sampler = TelemetrySampler(path, interval)
+        sampler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sampler.stop()
+    return wrapper
+
+
+def load_telemetry(path: str) -> dict[str, array.array]:
+    """
+    Loads a telemetry file.
+
+    Returns:
+        dict[str, array.array]: Columns "time", "cpu", "rss", "read_bytes", "write_bytes" and "threads".
+    """
+    data = Path(path).read_bytes()
+    if not data.startswith(_MAGIC):
+        raise ValueError(f"{path} is not a telemetry file")
+    data = data[len(_MAGIC):]
+    data = data[:len(data) - len(data) % _RECORD.size]  # ignore a partially written last record
+    series = {name: array.array(typecode) for name, typecode in _COLUMNS}
+    columns = [series[name] for name, _ in _COLUMNS]
+    for record in _RECORD.iter_unpack(data):
+        for column, value in zip(columns, record):
+            column.append(value)
+    return series
+
+
+def summarize_telemetry(series: dict[str, array.array], idle_threshold: float = 10.0) -> dict[str, float]:
+    """
+    Summarizes a telemetry series.
+
+    Args:
+        series (dict): Series returned by `load_telemetry`.
+        idle_threshold (float, optional): CPU utilization (%) below which a sample counts as idle. Defaults to 10.
+
+    Returns:
+        dict[str, float]: "samples", "duration" (s), "cpu_mean"/"cpu_max" (%), "idle_fraction", "rss_max" (bytes),
+            "rss_max_at" (s after start), "read_bytes"/"write_bytes" (during the run) and "threads_max".
+    """
+    n = len(series["time"])
+    if n == 0:
+        return {"samples": 0}
+    times, cpu, rss = series["time"], series["cpu"], series["rss"]
+    peak = max(range(n), key=rss.__getitem__)
+    return {
+        "samples": n,
+        "duration": times[-1] - times[0],
+        "cpu_mean": sum(cpu) / n,
+        "cpu_max": max(cpu),
+        "idle_fraction": sum(1 for value in cpu if value < idle_threshold) / n,
+        "rss_max": rss[peak],
+        "rss_max_at": times[peak] - times[0],
+        "read_bytes": series["read_bytes"][-1] - series["read_bytes"][0],
+        "write_bytes": series["write_bytes"][-1] - series["write_bytes"][0],
+        "threads_max": max(series["threads"]),
+    }
+
+
+def _job_telemetry_patterns(job_id: str) -> tuple[str, ...]:
+    # The job itself, its ranks and the tasks (and their ranks) of an array job
+    return f"{job_id}.telemetry", f"{job_id}.rank*.telemetry", f"{job_id}_*.telemetry"
+
+
+def load_job_telemetry(job_id: str, remote: Optional[str] = None, telemetry_dir: str = "~/slurm_logs", local_dir: str = "~/slurm_logs") -> dict[str, dict[str, array.array]]:
+    """
+    Loads the telemetry of every task (and rank) of `job_id`, first copying the files from `remote` if given.
+
+    Returns:
+        dict[str, dict]: Series by task, e.g. "1234_7" or "1234.rank1".
+    """
+    local_dir = Path(local_dir).expanduser()
+    if remote is not None:
+        from .base import rsync
+        local_dir.mkdir(parents=True, exist_ok=True)
+        filters = [f"--include={pattern}" for pattern in _job_telemetry_patterns(job_id)] + ["--exclude=*"]
+        rsync(f"{remote}:{telemetry_dir.rstrip('/')}/", f"{local_dir}/", args=filters, title=f"Fetching telemetry of job {job_id} from {remote}")
+
+    files = [path for pattern in _job_telemetry_patterns(job_id) for path in local_dir.glob(pattern)]
+    tasks = {path.name[:-len(".telemetry")]: path for path in files}
+    # Natural order: 1234.rank2 before 1234.rank10, 1234_2 before 1234_10
+    order = sorted(tasks, key=lambda task: [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", task)])
+    return {task: load_telemetry(tasks[task]) for task in order}
+
+
+def _format_bytes(n: float) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if abs(n) < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}T"
+
+
+def print_telemetry_summary(telemetry: dict[str, dict[str, array.array]]):
+    """Prints one line per task and, for more than one task, the totals over all tasks."""
+    print(f"{'task':<24} {'samples':>7} {'duration':>9} {'cpu mean':>8} {'cpu max':>8} {'idle':>5} {'rss max':>8} {'at':>7} {'read':>8} {'written':>8} {'threads':>7}")
+    summaries = {task: summarize_telemetry(series) for task, series in telemetry.items()}
+    for task, s in summaries.items():
+        if s["samples"] == 0:
+            print(f"{task:<24} {0:>7}")
+            continue
+        print(
+            f"{task:<24} {s['samples']:>7} {s['duration']:>8.0f}s {s['cpu_mean']:>7.0f}% {s['cpu_max']:>7.0f}% {100 * s['idle_fraction']:>4.0f}% "
+            f"{_format_bytes(s['rss_max']):>8} {s['rss_max_at']:>6.0f}s {_format_bytes(s['read_bytes']):>8} {_format_bytes(s['write_bytes']):>8} {s['threads_max']:>7}"
+        )
+    summaries = [s for s in summaries.values() if s["samples"]]
+    if len(summaries) > 1:
+        print(
+            f"{len(summaries)} tasks: mean CPU {sum(s['cpu_mean'] for s in summaries) / len(summaries):.0f}%, "
+            f"max RSS {_format_bytes(max(s['rss_max'] for s in summaries))}, "
+            f"read {_format_bytes(sum(s['read_bytes'] for s in summaries))}, written {_format_bytes(sum(s['write_bytes'] for s in summaries))}"
+        )
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(prog="slurmexec-telemetry", description="Summarize the resource telemetry of a slurmexec job.")
+    parser.add_argument("job_id", type=str, help="Job id (array parent job id for array jobs)")
+    parser.add_argument("--remote", type=str, default=None, help="Host to fetch the telemetry from. Defaults to local files.")
+    args = parser.parse_args()
+
+    telemetry = load_job_telemetry(args.job_id, remote=args.remote)
+    if not telemetry:
+        print(f"No telemetry found for job {args.job_id}")
+        sys.exit(1)
+    print_telemetry_summary(telemetry)
+
+
+if __name__ == "__main__":
+    main()
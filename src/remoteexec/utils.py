@@ -1,11 +1,10 @@
 import os
-import inspect
-import argparse
 import typing
 from types import SimpleNamespace
 
 def compile_current_function_args(as_namespace: bool = False, **kwargs):
     """Compiles the arguments of the current function into a dict or namespace."""
+    import inspect
     frame = inspect.currentframe().f_back
     if frame is None:
         raise ValueError("No frame found")
@@ -53,6 +52,8 @@ def load_func_argparser(func, ignore=None):
     Returns:
         argparse.ArgumentParser: Arg parser
     """
+    import inspect
+    import argparse
     parser = argparse.ArgumentParser()
     signature = inspect.signature(func)
     _get_or_none = lambda x: None if x is inspect._empty else x
@@ -97,4 +98,39 @@ def load_func_argparser(func, ignore=None):
 
         parser.add_argument(f"--{name}", **kwargs)
     
-    return parser
\ No newline at end of file
+    return parser
+
+def convert_func_kwargs(func, kwargs):
+    """
+    Converts string values in kwargs to the types of the parameters of func, as `load_func_argparser` would
+    on the command line. Values that already have another type are kept as they are.
+
+    Args:
+        func (callable): Function whose signature defines the types.
+        kwargs (dict): Keyword arguments, e.g. loaded from an args file.
+
+    Raises:
+        ValueError: If a value is not among the choices of a Literal parameter
+
+    Returns:
+        dict: Converted keyword arguments
+    """
+    import inspect
+    parameters = inspect.signature(func).parameters
+    if not any(
+        isinstance(value, str) and name in parameters and parameters[name].annotation not in (str, inspect._empty)
+        for name, value in kwargs.items()
+    ):
+        return kwargs  # nothing to convert; skip building the parser
+
+    converted = dict(kwargs)
+    for action in load_func_argparser(func)._actions:
+        if action.dest not in converted:
+            continue
+        value = converted[action.dest]
+        if isinstance(value, str) and callable(action.type):
+            value = action.type(value)
+        if action.choices is not None and value not in action.choices:
+            raise ValueError(f"Invalid value {value!r} for argument {action.dest}; choices are {action.choices}")
+        converted[action.dest] = value
+    return converted
@@ -0,0 +1,25 @@
+import os
+import stat
+
+import pytest
+
+
+@pytest.fixture
+def fake_bin(tmp_path, monkeypatch):
+    """
+    Returns `fake_bin(name, script)`, which writes an executable `script` named `name` to a directory on PATH,
+    e.g. a fake sbatch; returns its path. HOME is tmp_path / "home" and the working directory tmp_path.
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+
+    def write(name: str, script: str):
+        path = bin_dir / name
+        path.write_text(script)
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        return path
+
+    return write
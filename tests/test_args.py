@@ -0,0 +1,79 @@
+import os
+import sys
+import shlex
+import subprocess
+from typing import Literal
+
+import pytest
+
+from remoteexec.utils import convert_func_kwargs
+from remoteexec.slurmexec_runner import write_args_file, load_args_file
+
+JOB_FILE = """
+import sys
+from typing import Literal
+from pathlib import Path
+from remoteexec.slurm import slurm_job, slurm_exec
+
+@slurm_job
+def train(out: str, n: int = 1, lr: float = 0.1, mode: Literal["a", "b"] = "a", verbose: bool = False):
+    Path(out).write_text(repr((n, lr, mode, verbose)))
+
+if __name__ == "__main__":
+    slurm_exec(train, script_dir=sys.argv.pop(1), args_by_reference=True)
+"""
+
+
+def train(out: str, n: int = 1, lr: float = 0.1, mode: Literal["a", "b"] = "a", verbose: bool = False, tags=None):
+    pass
+
+
+def test_convert_func_kwargs():
+    converted = convert_func_kwargs(train, {"out": "x", "n": "3", "lr": "1e-3", "mode": "b", "verbose": "true", "tags": "t"})
+    assert converted == {"out": "x", "n": 3, "lr": 1e-3, "mode": "b", "verbose": True, "tags": "t"}
+    # Values of other types and unknown names are kept
+    assert convert_func_kwargs(train, {"n": 4, "lr": "2", "other": "5"}) == {"n": 4, "lr": 2.0, "other": "5"}
+
+    kwargs = {"out": "x", "n": 2}
+    assert convert_func_kwargs(train, kwargs) is kwargs  # nothing to convert
+
+    with pytest.raises(ValueError, match="Invalid value 'c' for argument mode"):
+        convert_func_kwargs(train, {"mode": "c"})
+    with pytest.raises(ValueError):
+        convert_func_kwargs(train, {"n": "three"})
+
+
+def test_args_file_roundtrip(tmp_path):
+    args_file = write_args_file(tmp_path, {"out": "x", "n": "3", "verbose": "no"})
+    assert args_file == write_args_file(tmp_path, {"out": "x", "n": "3", "verbose": "no"})  # content-addressed
+    assert load_args_file(args_file) == {"out": "x", "n": "3", "verbose": "no"}
+    assert load_args_file(args_file, train) == {"out": "x", "n": 3, "verbose": False}
+
+
+def test_slurm_exec_passes_args_by_reference(tmp_path, fake_bin):
+    fake_bin("sbatch", f"#!/bin/sh\ncp \"$1\" {tmp_path / 'submitted.slurm'}\necho \"Submitted batch job 7\"\n")
+    env = dict(os.environ)
+    env.pop("SLURM_JOB_ID", None)
+    job_file = tmp_path / "train_job.py"
+    job_file.write_text(JOB_FILE)
+    out = tmp_path / "out.txt"
+
+    subprocess.run(
+        [sys.executable, str(job_file), str(tmp_path / "scripts"), "--out", str(out), "--n", "3", "--mode", "b", "--verbose", "--mem", "1G"],
+        env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+    script = (tmp_path / "submitted.slurm").read_text()
+    assert "#SBATCH --mem=1G" in script
+    (command,) = [line for line in script.splitlines() if line.startswith("python ")]
+    _, python_file, flag, args_file = shlex.split(command)
+    assert python_file == str(job_file) and flag == "--slurmexec_args"
+    assert load_args_file(args_file) == {"out": str(out), "n": 3, "lr": 0.1, "mode": "b", "verbose": True}
+
+    # The job reloads the typed arguments instead of parsing its command line
+    subprocess.run([sys.executable, python_file, str(tmp_path / "scripts"), flag, args_file], env=env | {"SLURM_JOB_ID": "7"}, check=True)
+    assert out.read_text() == repr((3, 0.1, "b", True))
+
+    # String values in an args file are converted to the parameter types
+    args_file = write_args_file(tmp_path, {"out": str(out), "n": "5", "lr": "0.5", "mode": "a"})
+    subprocess.run([sys.executable, python_file, str(tmp_path / "scripts"), flag, str(args_file)], env=env | {"SLURM_JOB_ID": "7"}, check=True)
+    assert out.read_text() == repr((5, 0.5, "a", False))
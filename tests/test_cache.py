@@ -0,0 +1,79 @@
+import os
+import time
+
+from remoteexec.cache import JobCache, compute_job_cache_key
+from remoteexec.slurmexec_client import submit_slurm_job
+from remoteexec.slurmexec_runner import load_module_from_file
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job
+
+@slurm_job(job_name="cached", cache=True, inputs=["{data}"])
+def cached(data: str = "data.txt", n: int = 1):
+    return n * 2
+"""
+
+
+def _load(tmp_path, source=JOB_FILE, name="cached_job"):
+    job_file = tmp_path / f"{name}.py"
+    job_file.write_text(source)
+    return load_module_from_file(job_file).cached
+
+
+def test_cache_key_depends_on_source_args_and_inputs(tmp_path):
+    data = tmp_path / "data.txt"
+    data.write_text("abc")
+    func = _load(tmp_path)
+    key = compute_job_cache_key(func, {"data": str(data), "n": 1}, func._slurm_job_meta.inputs)
+    assert key == compute_job_cache_key(_load(tmp_path), {"n": 1, "data": str(data)}, ["{data}"])
+    assert key != compute_job_cache_key(func, {"data": str(data), "n": 2}, ["{data}"])
+
+    data.write_text("abcd")
+    assert key != compute_job_cache_key(func, {"data": str(data), "n": 1}, ["{data}"])
+    data.write_text("abc")
+    os.utime(data, ns=(0, 0))
+    key = compute_job_cache_key(func, {"data": str(data), "n": 1}, ["{data}"])
+
+    changed = _load(tmp_path, JOB_FILE.replace("n * 2", "n * 3"), name="changed_job")
+    assert key != compute_job_cache_key(changed, {"data": str(data), "n": 1}, ["{data}"])
+
+
+def test_hit_miss_and_eviction(tmp_path):
+    cache = JobCache(tmp_path / "cache", max_bytes=10_000, max_age=3600)
+    assert cache.get("ab" * 32) == (False, None)
+    cache.put("ab" * 32, {"value": 1})
+    assert cache.get("ab" * 32) == (True, {"value": 1})
+    cache.put("cd" * 32, None)
+    assert cache.get("cd" * 32) == (True, None)  # a cached None is a hit
+
+    # Entries unused for longer than max_age are evicted
+    old = time.time() - 7200
+    os.utime(cache._entry("ab" * 32), (old, old))
+    cache.evict()
+    assert cache.get("ab" * 32) == (False, None)
+
+    # Over max_bytes, the least recently used entries go first
+    cache.max_bytes = 1 << 20
+    for i, key in enumerate(["01" * 32, "02" * 32, "03" * 32]):
+        cache.put(key, bytes(4000))
+        os.utime(cache._entry(key), (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get("01" * 32)  # marks 01 as recently used
+    cache.max_bytes = 10_000
+    cache.evict()
+    assert [cache.get(key)[0] for key in ["01" * 32, "02" * 32, "03" * 32]] == [True, False, True]
+
+
+def test_cached_result_is_returned_without_submitting(tmp_path, fake_bin):
+    fake_bin("sbatch", f"#!/bin/sh\necho called >> {tmp_path / 'sbatch_calls'}\necho \"Submitted batch job 5\"\n")
+    (tmp_path / "data.txt").write_text("abc")
+    func = _load(tmp_path)
+    kwargs = {"data": str(tmp_path / "data.txt"), "n": 4}
+
+    out_data = submit_slurm_job(func, kwargs)
+    assert out_data["success"] and out_data["job_id"] == "5" and "result" not in out_data
+
+    JobCache().put(compute_job_cache_key(func, kwargs, ["{data}"]), 8)  # as the job would on completion
+    out_data = submit_slurm_job(func, kwargs)
+    assert out_data["success"] and out_data["cached"]
+    assert out_data["job_id"] is None and out_data["result"] == 8
+    assert (tmp_path / "sbatch_calls").read_text().splitlines() == ["called"]
@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import pickle
+import time
+import signal
+import subprocess
+
+from remoteexec.joblog import read_log
+from remoteexec.slurm import SLURM_LOG_EOF_MESSAGE, SLURM_REQUEUE_EXIT_CODE
+from remoteexec.slurmexec_client import create_slurm_args, create_slurm_script, write_invocation_record
+from remoteexec.slurmexec_runner import load_module_from_file
+
+JOB_FILE = """
+import time
+import threading
+from pathlib import Path
+from remoteexec.slurm import slurm_job, on_slurm_checkpoint, save_slurm_checkpoint
+
+@slurm_job(job_name="long", checkpoint_signal=120)
+def long_running(ready: str = "ready"):
+    state = {"step": 0, "params": [0] * 1000}
+
+    @on_slurm_checkpoint
+    def checkpoint():
+        print(f"checkpointing at step {state['step']}")
+        save_slurm_checkpoint(state | {"thread": threading.current_thread().name})
+
+    for step in range(1000):
+        state = {"step": step, "params": [step] * 1000}
+        print(f"step {step}")
+        if step == 3:
+            Path(ready).touch()
+        time.sleep(0.05)
+"""
+
+
+def _job(tmp_path):
+    job_file = tmp_path / "long_job.py"
+    job_file.write_text(JOB_FILE)
+    return job_file, load_module_from_file(job_file).long_running
+
+
+def test_script_forwards_the_checkpoint_signal(tmp_path):
+    _, func = _job(tmp_path)
+    meta = func._slurm_job_meta
+    slurm_args = create_slurm_args(meta)
+    script = create_slurm_script(meta, slurm_args, tmp_path / "%j.out", invocation_file=tmp_path / "record.pkl")
+    assert "#SBATCH --signal=B:USR1@120" in script
+    assert "#SBATCH --requeue" in script and "#SBATCH --open-mode=append" in script
+    assert f"slurmexec-run {tmp_path / 'record.pkl'} &\nSLURMEXEC_PID=$!\ntrap 'kill -USR1 $SLURMEXEC_PID' USR1\n" in script
+    assert f"if [ $EXIT_CODE -eq {SLURM_REQUEUE_EXIT_CODE} ]; then" in script
+
+
+def test_checkpoint_signal_requeues_through_the_normal_exit_path(tmp_path, fake_bin):
+    # Run the generated batch script with bash, a fake scontrol and slurmexec-run from this checkout
+    fake_bin("scontrol", f"#!/bin/sh\necho \"$*\" >> {tmp_path / 'scontrol_calls'}\n")
+    fake_bin("slurmexec-run", f"#!/bin/sh\nexec {sys.executable} -m remoteexec.slurmexec_runner \"$@\"\n")
+    log_dir = tmp_path / "logs"
+    job_file, func = _job(tmp_path)
+    meta = func._slurm_job_meta
+    record = write_invocation_record(
+        tmp_path, job_file, "long_running", {"ready": str(tmp_path / "ready")},
+        checkpoint={"checkpoint_dir": str(log_dir / "checkpoints"), "requeue": True},
+        log={"log_dir": str(log_dir), "flush_interval": 60},
+        status={"status_dir": str(log_dir / "status"), "heartbeat": 30},
+    )
+    script = create_slurm_script(meta, create_slurm_args(meta), log_dir / "%j.out", invocation_file=record)
+    (tmp_path / "job.slurm").write_text(script)
+
+    env = os.environ | {"SLURM_JOB_ID": "4242"}
+    env.pop("SLURMEXEC_LOCAL_JOB_ID", None)
+    process = subprocess.Popen(["bash", str(tmp_path / "job.slurm")], env=env, stdout=subprocess.PIPE, encoding="utf-8")
+    deadline = time.monotonic() + 30
+    while not (tmp_path / "ready").exists():
+        assert process.poll() is None and time.monotonic() < deadline, "job did not start"
+        time.sleep(0.05)
+    process.send_signal(signal.SIGUSR1)  # as Slurm does with --signal=B:USR1@N
+    output, _ = process.communicate(timeout=30)
+
+    assert process.returncode == 0
+    assert "# Job checkpointed and requeued" in output and SLURM_LOG_EOF_MESSAGE not in output
+    assert (tmp_path / "scontrol_calls").read_text().splitlines() == ["requeue 4242"]
+    # The callback ran on the main thread, between two statements of the job function
+    with open(log_dir / "checkpoints" / "4242.ckpt", "rb") as f:
+        checkpoint = pickle.load(f)
+    assert checkpoint["thread"] == "MainThread" and checkpoint["step"] >= 3
+    assert checkpoint["params"] == [checkpoint["step"]] * 1000
+
+    # The buffered log was flushed on exit (flush_interval was never reached) and has no EOF message
+    lines = read_log(log_dir / "4242.log.gz")
+    checkpointed = [line for line in lines if line.startswith("checkpointing at step")]
+    assert len(checkpointed) == 1 and "# Requeueing job 4242" in lines
+    assert "step 3" in lines and SLURM_LOG_EOF_MESSAGE not in lines
+    # The status record shows that the task resumes
+    assert json.loads((log_dir / "status" / "4242.status").read_text())["state"] == "requeued"
@@ -0,0 +1,51 @@
+import pickle
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from remoteexec.slurmexec_client import submit_slurm_job
+from remoteexec.slurmexec_runner import load_module_from_file, load_args_file
+
+N_JOBS = 2000
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job
+
+@slurm_job(job_name="stress")
+def stress(i: int = 0, name: str = "x"):
+    return i
+"""
+
+
+def test_concurrent_submissions_keep_their_arguments(tmp_path, fake_bin):
+    # Fake sbatch snapshots the script it was given at submission time and returns a unique job id
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    fake_bin("sbatch", f"#!/bin/sh\nid=\"$$$(date +%N)\"\ncp \"$1\" {spool}/$id\necho \"Submitted batch job $id\"\n")
+
+    job_file = tmp_path / "stress_job.py"
+    job_file.write_text(JOB_FILE)
+    func = load_module_from_file(job_file).stress
+
+    def submit(i):
+        # Half of the jobs share arguments, so identical scripts are written concurrently as well
+        return i, submit_slurm_job(func, {"i": i % (N_JOBS // 2), "name": f"job {i % (N_JOBS // 2)}"})
+
+    with ThreadPoolExecutor(max_workers=64) as executor:
+        results = list(executor.map(submit, range(N_JOBS)))
+
+    job_ids = set()
+    for i, out_data in results:
+        assert out_data["success"], out_data
+        job_ids.add(out_data["job_id"])
+        # The script sbatch saw runs the invocation record of exactly this submission
+        script = (spool / out_data["job_id"]).read_text()
+        (command,) = [line for line in script.splitlines() if line.startswith("slurmexec-run ")]
+        record_file = Path(command.split(" ", 1)[1])
+        with open(record_file, "rb") as f:
+            record = pickle.load(f)
+        assert load_args_file(record["args_file"], func) == {"i": i % (N_JOBS // 2), "name": f"job {i % (N_JOBS // 2)}"}
+    assert len(job_ids) == N_JOBS
+
+    # No temporary files are left behind
+    assert not list((tmp_path / ".slurmexec").glob(".*.tmp"))
+    assert len(list((tmp_path / ".slurmexec").glob("*.slurm"))) == N_JOBS // 2
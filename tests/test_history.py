@@ -0,0 +1,81 @@
+from pathlib import Path
+
+from remoteexec.history import ResourceHistory, autosize_slurm_args, parse_slurm_duration, parse_slurm_memory
+
+SACCT_OUTPUT = """\
+101|COMPLETED|4000M||00:10:00|01:00:00|00:09:30|1
+101.batch|COMPLETED||1000M|00:10:00||00:09:30|1
+102|COMPLETED|4000M||00:20:00|01:00:00|00:19:00|1
+102.batch|COMPLETED||1500M|00:20:00||00:19:00|1
+103|COMPLETED|4000M||00:15:00|01:00:00|00:14:00|1
+103.batch|COMPLETED||1200M|00:15:00||00:14:00|1
+103.0|COMPLETED||2000M|00:14:00||00:13:00|1
+104|RUNNING|4000M||00:01:00|01:00:00|00:00:00|1
+"""
+
+
+def fake_sacct(tmp_path: Path, fake_bin):
+    (tmp_path / "sacct_output.txt").write_text(SACCT_OUTPUT)
+    fake_bin("sacct", f"#!/bin/sh\nprintf '%s\\n' \"$*\" >> {tmp_path / 'sacct_calls.txt'}\ncat {tmp_path / 'sacct_output.txt'}\n")
+
+
+def test_parse_units():
+    assert parse_slurm_duration("1-02:03:04") == 93784
+    assert parse_slurm_duration("03:04.500") == 184.5
+    assert parse_slurm_duration("30") == 1800
+    assert parse_slurm_duration("UNLIMITED") is None
+    assert parse_slurm_memory("4G") == 4096
+    assert parse_slurm_memory("4000Mn") == 4000
+    assert parse_slurm_memory("") is None
+
+
+def test_update_suggest_and_report(tmp_path, fake_bin):
+    fake_sacct(tmp_path, fake_bin)
+    history = ResourceHistory(tmp_path / "history.jsonl")
+    for job_id in ("101", "102", "103", "104"):
+        history.record_submission(job_id, "train:job:train", {"--mem": "4000M", "--time": "01:00:00"})
+
+    history.update()
+    history.update()  # running job 104 is queried again, finished ones are not
+    calls = (tmp_path / "sacct_calls.txt").read_text().splitlines()
+    assert len(calls) == 2
+    assert calls[0].endswith("-j 101,102,103,104")
+    assert calls[1].endswith("-j 104")
+
+    usage = history.usage_by_key()["train:job:train"]
+    assert sorted(r["task_id"] for r in usage) == ["101", "102", "103"]
+    assert max(r["max_rss_mb"] for r in usage) == 2000  # max over steps
+
+    suggestion = history.suggest("train:job:train", percentile=100, headroom=1.5)
+    assert suggestion == {"--mem": "3000M", "--time": "0-00:30:00"}
+    assert history.suggest("other:job:other") == {}
+
+    (row,) = history.report()
+    assert row["runs"] == 3
+    assert row["mem_requested_mb"] == 12000
+    assert row["mem_used_mb"] == 4500
+    assert row["time_requested_s"] == 3 * 3600
+
+
+def test_autosize_slurm_args(tmp_path, fake_bin):
+    fake_sacct(tmp_path, fake_bin)
+    history = ResourceHistory(tmp_path / "history.jsonl")
+    for job_id in ("101", "102", "103"):
+        history.record_submission(job_id, "train:job:train", {})
+
+    slurm_args = autosize_slurm_args({"--mem": "auto", "--time": "2:00:00"}, "train:job:train", history)
+    assert slurm_args["--time"] == "2:00:00"
+    assert slurm_args["--mem"].endswith("M")
+
+    slurm_args = autosize_slurm_args({"--mem": "auto", "--time": "auto"}, "unknown:job:x", history)
+    assert "--mem" not in slurm_args and "--time" not in slurm_args
+
+
+def test_suggest_without_elapsed_times(tmp_path, monkeypatch):
+    history = ResourceHistory(tmp_path / "history.jsonl")
+    usage = {"key": "k", "state": "COMPLETED", "max_rss_mb": 1000, "elapsed_s": None}
+    monkeypatch.setattr(history, "usage_by_key", lambda: {"k": [dict(usage, task_id=str(i)) for i in range(3)]})
+    assert history.suggest("k", percentile=100, headroom=1.5) == {"--mem": "1500M"}
+
+    slurm_args = autosize_slurm_args({"--mem": "auto", "--time": "auto"}, "k", history)
+    assert slurm_args == {"--mem": "1200M"}  # default headroom
@@ -0,0 +1,88 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from remoteexec.slurmexec_client import submit_slurm_job
+from remoteexec.slurmexec_runner import load_module_from_file
+
+# Cumulative import time budgets (microseconds, best of a few runs) of modules imported by every job.
+# Generous for slow machines and bytecode compilation, but well below the cost of eagerly importing
+# subprocess, argparse and inspect.
+IMPORT_BUDGETS_US = {
+    "remoteexec": 10_000,
+    "remoteexec.slurm": 50_000,
+    "remoteexec.slurmexec_runner": 60_000,
+}
+# Modules the in-job hot path must not import
+HEAVY_MODULES = {"subprocess", "argparse", "inspect", "remoteexec.base", "remoteexec.progress", "remoteexec.utils"}
+
+
+def _import_times(module: str) -> dict[str, int]:
+    """Cumulative import time by module of `import module` in a fresh interpreter, from -X importtime."""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], stderr=subprocess.PIPE, encoding="utf-8", check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS_US))
+def test_import_time_budget(module):
+    runs = [_import_times(module) for _ in range(5)]
+    imported = set(runs[0])
+    assert imported.isdisjoint(HEAVY_MODULES), f"import {module} pulls in {sorted(imported & HEAVY_MODULES)}"
+    best = min(run[module] for run in runs)
+    assert best <= IMPORT_BUDGETS_US[module], f"import {module} took {best}us (budget {IMPORT_BUDGETS_US[module]}us)"
+
+
+def test_lazy_public_names():
+    code = (
+        "import sys, remoteexec\n"
+        "assert 'remoteexec.base' not in sys.modules\n"
+        "from remoteexec import *\n"
+        "assert rsync is sys.modules['remoteexec.base'].rsync\n"
+        "from remoteexec.slurm import report_progress\n"
+        "assert report_progress is sys.modules['remoteexec.progress'].report_progress\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+JOB_FILE = """
+import sys
+from pathlib import Path
+from remoteexec.slurm import slurm_job
+
+@slurm_job(job_name="light"{options})
+def light(out: str = "modules.txt"):
+    Path(out).write_text("\\n".join(sorted(sys.modules)))
+"""
+# Modules of optional features, which only jobs using them may import
+OPTIONAL_MODULES = {"remoteexec.progress", "remoteexec.telemetry", "remoteexec.profiling"}
+
+
+@pytest.mark.parametrize("options,expected", [
+    ("", set()),
+    (", progress=30, telemetry=5", {"remoteexec.progress", "remoteexec.telemetry"}),
+])
+def test_runner_imports_optional_features_only_when_used(options, expected, tmp_path, fake_bin):
+    fake_bin("sbatch", f"#!/bin/sh\ncp \"$1\" {tmp_path / 'submitted.slurm'}\necho \"Submitted batch job 7\"\n")
+    job_file = tmp_path / "light_job.py"
+    job_file.write_text(JOB_FILE.format(options=options))
+    out = tmp_path / "modules.txt"
+    assert submit_slurm_job(load_module_from_file(job_file).light, {"out": str(out)})["success"]
+
+    # Run the job's command as the batch script would
+    (command,) = [line for line in (tmp_path / "submitted.slurm").read_text().splitlines() if line.startswith("slurmexec-run ")]
+    env = os.environ | {"SLURM_JOB_ID": "7"}
+    env.pop("SLURMEXEC_LOCAL_JOB_ID", None)
+    subprocess.run([sys.executable, "-m", "remoteexec.slurmexec_runner", command.split(" ", 1)[1]], env=env, check=True)
+    modules = set(out.read_text().splitlines())
+    assert modules & OPTIONAL_MODULES == expected
+    heavy = HEAVY_MODULES - expected
+    assert modules.isdisjoint(heavy), f"the job imported {sorted(modules & heavy)}"  # e.g. argparse via kwargs conversion
@@ -0,0 +1,46 @@
+from remoteexec.slurmexec_client import create_slurm_args, create_slurm_script, write_invocation_record
+from remoteexec.slurmexec_runner import load_module_from_file, load_invocation_record, run_invocation
+
+JOB_FILE = """
+from typing import Literal
+from remoteexec.slurm import slurm_job
+
+@slurm_job(job_name="fast")
+def fast(n: int = 1, scale: float = 1.0, mode: Literal["a", "b"] = "a", name: str = "x"):
+    return n * scale, mode, name
+"""
+
+
+def test_script_runs_the_invocation_record_without_reparsing(tmp_path, monkeypatch):
+    monkeypatch.setattr("sys.argv", ["slurmexec", "job.py", "--n", "3", "--mem=1G"])
+    job_file = tmp_path / "fast_job.py"
+    job_file.write_text(JOB_FILE)
+    meta = load_module_from_file(job_file).fast._slurm_job_meta
+    record_file = tmp_path / "record.pkl"
+
+    script = create_slurm_script(meta, create_slurm_args(meta), tmp_path / "%j.out", ["--mem=1G"], invocation_file=record_file)
+    commands = [line for line in script.splitlines() if line and not line.startswith(("#", "echo"))]
+    assert commands == [f"slurmexec-run {record_file}"]
+    assert "--n" not in script and "job.py" not in script  # the arguments were resolved at submission time
+
+    # Without a record, the job parses its command line again
+    script = create_slurm_script(meta, create_slurm_args(meta), tmp_path / "%j.out", ["--mem=1G"])
+    assert "slurmexec job.py --n 3" in script
+
+
+def test_invocation_record_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLURM_JOB_ID", "4242")
+    monkeypatch.delenv("SLURMEXEC_LOCAL_JOB_ID", raising=False)
+    job_file = tmp_path / "fast_job.py"
+    job_file.write_text(JOB_FILE)
+
+    kwargs = {"n": 3, "scale": 0.5, "mode": "b", "name": "y"}
+    record_file = write_invocation_record(tmp_path, job_file, "fast", kwargs)
+    assert record_file == write_invocation_record(tmp_path, job_file, "fast", dict(kwargs))  # content-addressed
+
+    record = load_invocation_record(record_file)
+    assert record["path"] == str(job_file) and record["func_name"] == "fast"
+    assert run_invocation(record) == (1.5, "b", "y")
+
+    # Without kwargs the record stores them inline and the defaults apply
+    assert run_invocation(load_invocation_record(write_invocation_record(tmp_path, job_file, "fast", {}))) == (1.0, "a", "x")
@@ -0,0 +1,109 @@
+import gzip
+import time
+import threading
+
+from remoteexec.joblog import BufferedLogWriter, follow_log, read_log
+from remoteexec.slurm import SLURM_LOG_EOF_MESSAGE
+from remoteexec.slurmexec_client import run_local_tasks, submit_slurm_job
+from remoteexec.slurmexec_runner import get_buffered_log_file, load_module_from_file
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job, get_slurm_rank
+
+@slurm_job(job_name="logged", ntasks=2, log_options={"block_size": 64})
+def logged(lines: int = 50):
+    for i in range(lines):
+        print(f"rank {get_slurm_rank()} line {i}")
+"""
+
+
+def test_blocks_are_gzip_members_with_an_index(tmp_path):
+    path = tmp_path / "job.log.gz"
+    writer = BufferedLogWriter(path, block_size=100, flush_interval=60)
+    lines = [f"line {i}" for i in range(100)]
+    for line in lines:
+        writer.write(line + "\n")
+    writer.close(eof_message=SLURM_LOG_EOF_MESSAGE)
+
+    assert gzip.decompress(path.read_bytes()).decode().splitlines() == lines + [SLURM_LOG_EOF_MESSAGE]
+    index = [tuple(map(int, line.split())) for line in (tmp_path / "job.log.gz.idx").read_text().splitlines()]
+    assert len(index) > 5 and index[0] == (0, 0)
+    assert all(a < b for (a, _), (b, _) in zip(index, index[1:]))  # uncompressed offsets
+    assert all(a < b for (_, a), (_, b) in zip(index, index[1:]))  # offsets in the file
+
+    # The index allows reading only the last blocks
+    tail = read_log(path, last_blocks=1)
+    assert tail[-1] == SLURM_LOG_EOF_MESSAGE and len(tail) < len(lines)
+    assert read_log(path) == lines + [SLURM_LOG_EOF_MESSAGE]
+
+
+def test_flush_and_periodic_flush(tmp_path):
+    path = tmp_path / "job.log"
+    writer = BufferedLogWriter(path, compress=False, flush_interval=0.2)
+    writer.write("buffered\n")
+    assert path.read_bytes() == b""
+    writer.flush()
+    assert path.read_text() == "buffered\n"
+
+    writer.write("flushed by the background thread\n")
+    deadline = time.monotonic() + 10
+    while "background" not in path.read_text():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    writer.close()
+    assert read_log(path) == ["buffered", "flushed by the background thread"]
+
+
+def test_rotation_keeps_max_files(tmp_path):
+    path = tmp_path / "job.log"
+    writer = BufferedLogWriter(path, block_size=10, compress=False, max_bytes=50, max_files=2)
+    lines = [f"line {i:03d}" for i in range(60)]
+    for line in lines:
+        writer.write(line + "\n")
+    writer.close()
+
+    assert sorted(p.name for p in tmp_path.glob("job.log*") if not p.name.endswith(".idx") and ".idx." not in p.name) == ["job.log", "job.log.1", "job.log.2"]
+    kept = read_log(tmp_path / "job.log.2") + read_log(tmp_path / "job.log.1") + read_log(path)
+    assert kept == lines[-len(kept):]  # the newest lines, in order
+    assert all(p.stat().st_size <= 50 for p in tmp_path.glob("job.log*") if "idx" not in p.name)
+
+
+def test_follow_log_across_rotations(tmp_path):
+    path = tmp_path / "job.log.gz"
+    lines = [f"line {i}" for i in range(200)]
+
+    def write():
+        writer = BufferedLogWriter(path, block_size=200, max_bytes=400, max_files=100)
+        for line in lines:
+            writer.write(line + "\n")
+            time.sleep(0.001)
+        writer.close(eof_message=SLURM_LOG_EOF_MESSAGE)
+
+    thread = threading.Thread(target=write)
+    thread.start()  # follow_log waits for the file to be created
+    followed = list(follow_log(path, end_message=SLURM_LOG_EOF_MESSAGE, poll_interval=0.01))
+    thread.join()
+    assert followed == lines + [SLURM_LOG_EOF_MESSAGE]
+    assert (tmp_path / "job.log.gz.1").exists()
+
+
+def test_ranks_write_the_log_the_client_follows(tmp_path, fake_bin):
+    job_file = tmp_path / "logged_job.py"
+    job_file.write_text(JOB_FILE)
+    log_options = load_module_from_file(job_file).logged._slurm_job_meta.log_options
+
+    assert run_local_tasks(job_file, "logged", {"lines": 50}, ntasks=2, log_options=log_options) == [0, 0]
+    log_dir = tmp_path / "home" / "slurm_logs"
+    (job_id,) = {path.name.split(".", 1)[0] for path in log_dir.glob("local*.rank0.log.gz")}
+    for rank in range(2):
+        log_file = get_buffered_log_file(log_dir, job_id, rank=rank)
+        assert read_log(log_file) == [f"rank {rank} line {i}" for i in range(50)] + [SLURM_LOG_EOF_MESSAGE]
+    assert not get_buffered_log_file(log_dir, job_id).exists()
+
+    # The client follows rank 0's log of a multi-task job, and the first task of an array job
+    fake_bin("sbatch", "#!/bin/sh\necho \"Submitted batch job 4242\"\n")
+    func = load_module_from_file(job_file).logged
+    out_data = submit_slurm_job(func, {})
+    assert out_data["log_file"] == str(log_dir / "4242.rank0.log.gz") and out_data["log_format"] == "buffered"
+    out_data = submit_slurm_job(func, {}, ["--ntasks=1", "--array=3-9%2"])
+    assert out_data["log_file"] == str(log_dir / "4242_3.log.gz")
@@ -0,0 +1,104 @@
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+
+from remoteexec import slurm
+from remoteexec.mapping import slurm_map, MapHandle, MapItemError, _choose_chunk_size
+
+
+def square(i):
+    return i * i
+
+
+def flaky(item):
+    i, broken = item
+    if i % 4 == 1 and Path(broken).exists():
+        raise ValueError(f"item {i} is broken")
+    return -i
+
+
+@pytest.fixture(autouse=True)
+def no_slurm(tmp_path, fake_bin, monkeypatch):
+    # slurmd fails, so maps run their tasks on this host
+    fake_bin("slurmd", "#!/bin/sh\nexit 1\n")
+    monkeypatch.setattr(slurm, "_IS_SLURM_DEBUG", False)
+    return tmp_path / "maps"
+
+
+def _shards(handle):
+    """Item indices of each task's results, by submission and task: "todo_{hash}_{submission}_{task}.pkl"."""
+    shards = {}
+    for file in (handle.map_dir / "results").glob("todo_*.pkl"):
+        _, _, submission, task = file.stem.split("_")
+        with open(file, "rb") as f:
+            shards[int(submission), int(task)] = sorted(pickle.load(f))
+    return [shards[key] for key in sorted(shards)]
+
+
+def test_chunk_size():
+    assert _choose_chunk_size(100, 10, target_seconds=1800, max_tasks=1000) == 180
+    assert _choose_chunk_size(5, 3600, target_seconds=1800, max_tasks=1000) == 1  # at least one item per task
+    assert _choose_chunk_size(10_000, 0.001, target_seconds=1, max_tasks=10) == 1000  # chunks grow to stay under max_tasks
+
+
+def test_ragged_last_chunk_and_ordered_gather(no_slurm):
+    handle = slurm_map(square, range(10), seconds_per_item=1, target_seconds=3, map_dir=str(no_slurm))
+    assert handle._meta["chunk_size"] == 3
+    assert _shards(handle) == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    assert handle.job_ids == [None] and handle.is_finished()
+
+    # Shards written out of order are still gathered in item order
+    for i, file in enumerate(sorted((handle.map_dir / "results").glob("*.pkl"), reverse=True)):
+        os.utime(file, (1000 + i, 1000 + i))
+    assert MapHandle(handle.map_dir).gather() == [i * i for i in range(10)]
+    assert handle.status() == {"done": 10, "failed": 0, "missing": 0}
+
+    # Mapping again reopens the map and only runs the items whose results are missing
+    assert slurm_map(square, range(10), map_dir=str(no_slurm)).job_ids == [None]
+    assert len(_shards(handle)) == 4
+    (shard,) = (handle.map_dir / "results").glob("todo_*_0_1.pkl")  # items 3-5 of the first submission
+    shard.unlink()
+    reopened = slurm_map(square, range(10), map_dir=str(no_slurm))
+    assert reopened.job_ids == [None, None] and _shards(reopened)[-1] == [3, 4, 5]
+    assert reopened.gather() == [i * i for i in range(10)]
+
+
+def test_failed_items_are_reported_and_retried(tmp_path, no_slurm):
+    broken = tmp_path / "broken"
+    broken.touch()
+    items = [(i, str(broken)) for i in range(10)]
+    handle = slurm_map(flaky, items, seconds_per_item=1, target_seconds=4, map_dir=str(no_slurm))
+
+    assert handle.failed() == [1, 5, 9]
+    assert handle.status() == {"done": 7, "failed": 3, "missing": 0}
+    with pytest.raises(RuntimeError, match=r"3 of 10 items have no result \(indices 1, 5, 9\)"):
+        handle.gather()
+    gathered = handle.gather(strict=False)
+    assert [type(value) for value in gathered].count(MapItemError) == 3
+    assert gathered[5].index == 5 and "item 5 is broken" in str(gathered[5]) and "ValueError" in gathered[5].traceback
+    assert gathered[4] == -4
+
+    broken.unlink()
+    assert handle.retry() is None and handle.job_ids == [None, None]
+    assert _shards(handle)[-1] == [1, 5, 9]  # only the failed items ran again
+    assert handle.gather() == [-i for i in range(10)]
+    assert handle.retry() is None and len(handle.job_ids) == 2  # nothing left to retry
+
+
+def test_pilot_run_and_measured_timings(no_slurm, monkeypatch, capsys):
+    monkeypatch.setenv("SLURM_JOB_ID", "42")  # mapping from inside a job must not leave debug mode on
+    handle = slurm_map(square, range(8), pilot=3, target_seconds=1e-9, map_dir=str(no_slurm))
+    assert slurm._IS_SLURM_DEBUG is False
+    assert "Pilot run of 3 items" in capsys.readouterr().out
+    with open(handle.map_dir / "results" / "pilot.pkl", "rb") as f:
+        assert sorted(pickle.load(f)) == [0, 1, 2]
+    assert sorted(index for shard in _shards(handle) for index in shard) == [3, 4, 5, 6, 7]  # pilot results are kept
+    assert handle.gather() == [i * i for i in range(8)]
+
+    # gather() recorded the time per item, so the next map of the function skips the pilot
+    slurm_map(square, range(20), map_dir=str(no_slurm))
+    out = capsys.readouterr().out
+    assert "Using the measured time" in out and "Pilot run" not in out
+    assert slurm._IS_SLURM_DEBUG is False
@@ -0,0 +1,72 @@
+import sys
+import math
+import zlib
+
+import pytest
+
+from remoteexec.payload import dumps_call, loads_call, run_payload, remote_call
+
+SCALE = 3
+
+
+def _helper(x):
+    return x * SCALE
+
+
+def uses_globals(x):
+    return _helper(x) + math.floor(2.5)
+
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+
+def make_adder(n):
+    def add(x):
+        return x + n
+    return add
+
+
+def make_factorial():
+    def factorial(n):
+        return 1 if n <= 1 else n * factorial(n - 1)  # recursion through a closure cell
+    return factorial
+
+
+CALLS = [
+    pytest.param(lambda x, y=1: x * 10 + y, (4,), {"y": 2}, 42, id="lambda"),
+    pytest.param(make_adder(5), (37,), {}, 42, id="closure"),
+    pytest.param(fib, (10,), {}, 55, id="recursive"),
+    pytest.param(make_factorial(), (5,), {}, 120, id="recursive closure"),
+    pytest.param(uses_globals, (4,), {}, 14, id="module globals"),
+]
+
+
+@pytest.fixture
+def fake_ssh(tmp_path, fake_bin):
+    # `ssh host cmd` runs cmd in a directory where this test module cannot be imported
+    fake_bin("ssh", f"#!/bin/sh\nshift\ncd {tmp_path}\nexec sh -c \"$*\"\n")
+
+
+@pytest.mark.parametrize("func,args,kwargs,expected", CALLS)
+def test_roundtrip(func, args, kwargs, expected):
+    assert run_payload(dumps_call(func, *args, **kwargs)) == expected
+
+
+@pytest.mark.parametrize("func,args,kwargs,expected", CALLS)
+def test_shipped_by_value(func, args, kwargs, expected, fake_ssh):
+    assert remote_call("host", func, *args, python=sys.executable, **kwargs) == expected
+
+
+def test_remote_exceptions_are_reraised(fake_ssh):
+    with pytest.raises(ZeroDivisionError):
+        remote_call("host", lambda: 1 / 0, python=sys.executable)
+
+
+def test_mismatched_python_version():
+    payload = zlib.decompress(dumps_call(fib, 3))
+    _, _, data = payload.partition(b"\n")
+    foreign = zlib.compress(b"2.7\n" + data)
+    with pytest.raises(RuntimeError, match=rf"created with Python 2\.7, cannot run it with Python {sys.version_info.major}\.{sys.version_info.minor}"):
+        loads_call(foreign)
+    assert loads_call(zlib.compress(payload))[1] == (3,)
@@ -0,0 +1,99 @@
+import pytest
+
+from remoteexec import slurm
+from remoteexec.pipeline import SlurmPipeline, PipelineHandle
+from remoteexec.slurmexec_runner import load_module_from_file
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job
+
+calls = []
+
+@slurm_job
+def preprocess(dataset: str = "a"):
+    calls.append(("preprocess", dataset))
+    return dataset
+
+@slurm_job
+def train(epochs: int = 1):
+    calls.append(("train", epochs))
+    if epochs < 0:
+        raise ValueError("negative epochs")
+    return epochs
+
+@slurm_job
+def report():
+    calls.append(("report",))
+"""
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(slurm, "_IS_SLURM_DEBUG", False)
+    monkeypatch.delenv("SLURM_JOB_ID", raising=False)
+    job_file = tmp_path / "pipeline_job.py"
+    job_file.write_text(JOB_FILE)
+    return load_module_from_file(job_file)
+
+
+def test_submit_wires_dependencies(jobs, tmp_path, fake_bin):
+    # Fake sbatch keeps each script and returns increasing job ids starting at 100
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    fake_bin("sbatch", (
+        f"#!/bin/sh\nid=$((100 + $(ls {spool} | wc -l)))\n"
+        f"cp \"$1\" {spool}/$id\necho \"Submitted batch job $id\"\n"
+    ))
+
+    pipeline = SlurmPipeline()
+    a = pipeline.add(jobs.preprocess, {"dataset": "a"})
+    b = pipeline.add(jobs.preprocess, {"dataset": "b"})
+    fit = pipeline.add(jobs.train, {"epochs": 3}, after=[a, b])
+    pipeline.add(jobs.report, after=[fit], dependency="afterany")
+    handle = pipeline.submit()
+    assert handle.job_ids == {"preprocess": "100", "preprocess_2": "101", "train": "102", "report": "103"}
+
+    def dependency(job_id):
+        return [line for line in (spool / job_id).read_text().splitlines() if line.startswith("#SBATCH --dependency")]
+
+    assert dependency("100") == dependency("101") == []
+    assert dependency("102") == ["#SBATCH --dependency=afterok:100:101"]
+    assert dependency("103") == ["#SBATCH --dependency=afterany:102"]
+
+    with pytest.raises(ValueError):
+        pipeline.add(jobs.report, after=[SlurmPipeline().add(jobs.report)])
+
+
+def test_status_aggregates_array_tasks(fake_bin):
+    fake_bin("sacct", (
+        "#!/bin/sh\ncat <<'EOF'\n"
+        "10_0|COMPLETED\n10_1|FAILED\n10_2|COMPLETED\n"
+        "11_0|COMPLETED\n11_[1-3]|PENDING\n"
+        "12|RUNNING\n"
+        "13_0|COMPLETED\n13_1|COMPLETED\n"
+        "14_0|COMPLETED\n14_1|CANCELLED by 1000\n"
+        "EOF\n"
+    ))
+
+    handle = PipelineHandle(SlurmPipeline(), {"a": "10", "b": "11", "c": "12", "d": "13", "e": "14", "cached": None})
+    assert handle.status() == {"a": "FAILED", "b": "RUNNING", "c": "RUNNING", "d": "COMPLETED", "e": "CANCELLED", "cached": "COMPLETED"}
+
+
+def test_run_local_honors_dependency_types(jobs):
+    pipeline = SlurmPipeline()
+    pre = pipeline.add(jobs.preprocess, {"dataset": "x"})
+    ok = pipeline.add(jobs.train, {"epochs": 2}, after=[pre], name="ok")
+    bad = pipeline.add(jobs.train, {"epochs": -1}, after=[pre], name="bad")
+    pipeline.add(jobs.report, after=[bad], name="after_bad")  # afterok on a failed stage: cancelled
+    pipeline.add(jobs.report, after=[ok, bad], dependency="afterany", name="always")
+    pipeline.add(jobs.report, after=[bad], dependency="afternotok", name="on_failure")
+
+    handle = pipeline.run_local(max_workers=2)
+    assert handle.status() == {
+        "preprocess": "COMPLETED", "ok": "COMPLETED", "bad": "FAILED",
+        "after_bad": "CANCELLED", "always": "COMPLETED", "on_failure": "COMPLETED",
+    }
+    assert handle.results["ok"] == 2 and handle.results["preprocess"] == "x"
+    assert isinstance(handle.errors["bad"], ValueError)
+    assert jobs.calls[0] == ("preprocess", "x") and jobs.calls.count(("report",)) == 2
+    assert not slurm.is_this_a_slurm_job()  # the previous debug mode was restored
@@ -0,0 +1,61 @@
+import json
+
+from remoteexec.placement import select_target, estimate_start_time, Target
+
+# Queue states per host: "gpu" is busy locally, "cpu" frees up in 10 minutes, clusterb's "gpu" is idle
+SINFO = {
+    "local": "gpu*|up|64/0/0/64\ncpu|up|30/2/0/32\ndebug|down|0/8/0/8\n",
+    "clusterb": "gpu*|up|8/24/0/32\n",
+}
+SQUEUE = {
+    "local": "gpu|RUNNING|64|2:00:00\ngpu|PENDING|16|1:00:00\ncpu|RUNNING|14|10:00\ncpu|RUNNING|16|1-00:00:00\n",
+    "clusterb": "gpu|RUNNING|8|30:00\ngpu|PENDING|4|1:00:00\n",
+}
+
+
+def _fake_scheduler(tmp_path, fake_bin):
+    data = tmp_path / "data"
+    data.mkdir()
+    for host in SINFO:
+        (data / f"{host}.sinfo").write_text(SINFO[host])
+        (data / f"{host}.squeue").write_text(SQUEUE[host])
+    calls = tmp_path / "calls"
+    # Every invocation is logged with the host it ran on; ssh runs the command "on" the given host
+    fake_bin("sinfo", f'#!/bin/sh\necho "sinfo ${{FAKE_HOST:-local}} $*" >> {calls}\ncat {data}/${{FAKE_HOST:-local}}.sinfo\n')
+    fake_bin("squeue", f'#!/bin/sh\necho "squeue ${{FAKE_HOST:-local}} $*" >> {calls}\ncat {data}/${{FAKE_HOST:-local}}.squeue\n')
+    fake_bin("ssh", f'#!/bin/sh\nhost="$1"\nshift\necho "ssh $host" >> {calls}\nFAKE_HOST="$host" exec sh -c "$*"\n')
+    return calls
+
+
+def test_select_target_picks_earliest_start_with_one_query_per_host(tmp_path, fake_bin):
+    calls = _fake_scheduler(tmp_path, fake_bin)
+
+    target = select_target(["gpu", "cpu", "debug", "clusterb:gpu"], cpus=8)
+    assert target == Target("clusterb", "gpu")
+    lines = calls.read_text().splitlines()
+    assert lines.count("ssh clusterb") == 1
+    assert sum(line.startswith("sinfo local") for line in lines) == 1
+    assert sum(line.startswith("squeue local") for line in lines) == 1
+
+    (decision,) = [json.loads(line) for line in (tmp_path / "home" / ".slurmexec" / "placement.jsonl").read_text().splitlines()]
+    assert decision["chosen"] == "clusterb:gpu"
+    assert decision["estimates"] == {"gpu": 7200, "cpu": 600, "debug": None, "clusterb:gpu": 0}
+
+    # Within the cache lifetime, no scheduler command runs again
+    calls.write_text("")
+    assert select_target(["gpu", "cpu", "debug", "clusterb:gpu"], cpus=8) == Target("clusterb", "gpu")
+    assert calls.read_text() == ""
+
+    # Without the idle cluster, the partition freeing up first wins; a job larger than clusterb's idle CPUs
+    # waits for its running job there, which still beats the busy local partition
+    assert select_target(["gpu", "cpu"], cpus=8, ttl=0) == Target(None, "cpu")
+    assert select_target(["gpu", "clusterb:"], cpus=24, ttl=0) == Target("clusterb", None)
+
+
+def test_estimate_start_time():
+    partition = {"default": False, "up": True, "idle_cpus": 4, "total_cpus": 16, "pending_cpus": 2, "running": [(300.0, 4), (None, 8)]}
+    assert estimate_start_time(partition, cpus=2) == 0
+    assert estimate_start_time(partition, cpus=6) == 300
+    assert estimate_start_time(partition, cpus=10) == float("inf")  # needs the job without time limit to end
+    assert estimate_start_time(partition, cpus=32) == float("inf")
+    assert estimate_start_time(None) == float("inf")
@@ -0,0 +1,57 @@
+import pytest
+
+from remoteexec.slurmexec_client import run_local_tasks
+from remoteexec.profiling import fetch_profiles, aggregate_profiles, print_profile_summary
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job, get_slurm_rank
+
+_retained = []
+
+def busy_helper(n):
+    return sum(i * i for i in range(n))
+
+@slurm_job(job_name="profiled")
+def work(n: int = 20000):
+    blocks = [bytearray(1 << 20) for _ in range(4)]
+    _retained.append(blocks)  # still allocated when the function returns
+    total = 0
+    for _ in range(20):
+        total += busy_helper(n)
+    return get_slurm_rank(), total, len(blocks)
+"""
+
+
+@pytest.mark.parametrize("mode", ["cprofile", "sampling", "tracemalloc"])
+def test_local_tasks_are_profiled_and_aggregated(mode, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    job_file = tmp_path / "profiled_job.py"
+    job_file.write_text(JOB_FILE)
+
+    # The debug path: two local processes standing in for srun, run by slurmexec-run
+    assert run_local_tasks(job_file, "work", {"n": 20000}, ntasks=2, profile=mode) == [0, 0]
+
+    log_dir = tmp_path / "home" / "slurm_logs"
+    (job_id,) = {path.name.split(".", 1)[0] for path in log_dir.glob("local*.rank0.out")}
+    files = fetch_profiles(job_id, local_dir=log_dir)
+    assert [path.name.split(".")[1] for path in files] == ["rank0", "rank1"]
+
+    _, aggregate = aggregate_profiles(files)
+    if mode == "cprofile":
+        (key,) = [key for key in aggregate.stats if key[2] == "busy_helper"]
+        assert aggregate.stats[key][1] == 40  # 20 calls in each of the two ranks
+    elif mode == "sampling":
+        assert sum(count for stack, count in aggregate.items() if "busy_helper" in stack) > 0
+    else:
+        location, size, _ = aggregate[0]
+        assert location.startswith(str(job_file)) and size >= 2 * 4 * (1 << 20)
+
+    print_profile_summary(files, top=5, output=str(tmp_path / "merged"))
+    assert f"{mode} profile aggregated over 2 files" in capsys.readouterr().out
+
+
+def test_profiles_of_a_job_in_task_order(tmp_path):
+    for name in ["12.rank10.prof", "12.rank2.prof", "12_3.folded", "12.prof", "123.prof", "12.out"]:
+        (tmp_path / name).touch()
+    assert [path.name for path in fetch_profiles("12", local_dir=tmp_path)] == ["12.prof", "12.rank2.prof", "12.rank10.prof", "12_3.folded"]
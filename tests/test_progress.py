@@ -0,0 +1,146 @@
+import json
+import time
+
+import pytest
+
+from remoteexec import progress
+from remoteexec.progress import report_progress, progress_call, read_job_status, print_job_progress
+from remoteexec.slurm import CheckpointRequeue, SLURM_REQUEUE_EXIT_CODE
+from remoteexec.slurmexec_client import run_local_tasks
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job, report_progress
+
+@slurm_job(job_name="tracked", ntasks=2{options})
+def tracked(steps: int = 3):
+    for step in range(1, steps + 1):
+        report_progress(step, steps, loss=1 / step)
+"""
+
+
+@pytest.fixture(autouse=True)
+def job(tmp_path, monkeypatch):
+    monkeypatch.setattr(progress, "_status", None)
+    monkeypatch.setattr(progress, "_status_file", None)
+    monkeypatch.setattr(progress, "_last_write", 0.0)
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    for name in ["SLURM_JOB_ID", "SLURM_ARRAY_JOB_ID", "SLURM_ARRAY_TASK_ID", "SLURM_ARRAY_TASK_COUNT", "SLURM_NTASKS", "SLURM_PROCID", "SLURMEXEC_LOCAL_JOB_ID"]:
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path / "home" / "slurm_logs" / "status"
+
+
+def _status(path):
+    return json.loads(path.read_text())
+
+
+def test_report_progress_is_throttled(job, monkeypatch):
+    report_progress(1, 10)
+    assert not job.exists()  # not in a Slurm job
+
+    monkeypatch.setenv("SLURM_ARRAY_JOB_ID", "12")
+    monkeypatch.setenv("SLURM_ARRAY_TASK_ID", "3")
+    monkeypatch.setenv("SLURM_ARRAY_TASK_COUNT", "5")
+    monkeypatch.setenv("SLURM_JOB_ID", "15")
+    report_progress(1, 10, loss=0.5)
+    status = _status(job / "12_3.status")
+    assert (status["task"], status["tasks"], status["state"], status["step"], status["total"]) == ("12_3", 5, "running", 1, 10)
+    assert status["metrics"] == {"loss": 0.5}
+
+    report_progress(2, 10, loss=0.25, acc=0.9)
+    assert _status(job / "12_3.status")["step"] == 1  # at most one write per MIN_WRITE_INTERVAL
+    report_progress(10, 10)
+    status = _status(job / "12_3.status")
+    assert status["step"] == 10 and status["metrics"] == {"loss": 0.25, "acc": 0.9}  # the last step is always written
+
+
+def test_progress_call_heartbeat_and_final_state(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLURM_JOB_ID", "7")
+    status_file = tmp_path / "status" / "7.status"
+
+    def work():
+        first = _status(status_file)
+        assert first["state"] == "running" and first["step"] is None
+        time.sleep(0.3)
+        assert _status(status_file)["heartbeat"] > first["heartbeat"]  # written by the heartbeat thread
+        report_progress(5, 5)
+        return "result"
+
+    assert progress_call(work, status_file, "7", heartbeat=0.05)() == "result"
+    status = _status(status_file)
+    assert status["state"] == "done" and status["step"] == 5
+
+    def fail():
+        raise KeyError("boom")
+
+    with pytest.raises(KeyError):
+        progress_call(fail, status_file, "7", heartbeat=30)()
+    assert _status(status_file)["state"] == "failed"
+
+    def checkpointed():
+        raise CheckpointRequeue(SLURM_REQUEUE_EXIT_CODE)
+
+    with pytest.raises(CheckpointRequeue):
+        progress_call(checkpointed, status_file, "7", heartbeat=30)()
+    assert _status(status_file)["state"] == "requeued"
+
+
+def _record(task, state="running", tasks=4, step=None, total=None, heartbeat=1000.0):
+    return {"task": task, "tasks": tasks, "state": state, "step": step, "total": total, "metrics": {}, "updated": heartbeat, "heartbeat": heartbeat}
+
+
+def test_batched_polling(tmp_path, fake_bin):
+    status_dir = tmp_path / "status"
+    status_dir.mkdir()
+    for record in [_record("12_10.rank1"), _record("12_2"), _record("12"), _record("12.rank0"), _record("123")]:
+        (status_dir / f"{record['task']}.status").write_text(json.dumps(record))
+    (status_dir / "12_4.status").write_text('{"task": "12_4", "sta')  # torn write of an older writer
+    (status_dir / "12.out").write_text("not a status")
+
+    now, statuses = read_job_status("12", status_dir=str(status_dir))
+    assert list(statuses) == ["12", "12.rank0", "12_2", "12_10.rank1"]
+    assert abs(now - time.time()) < 60
+
+    # Remote jobs are read with a single ssh call, which also returns the remote clock
+    fake_bin("ssh", f"#!/bin/sh\necho \"$1\" >> {tmp_path / 'ssh_calls'}\nshift\nexec sh -c \"$*\"\n")
+    remote_now, remote_statuses = read_job_status("12", remote="cluster", status_dir=str(status_dir))
+    assert remote_statuses == statuses and abs(remote_now - now) < 60
+    assert (tmp_path / "ssh_calls").read_text().splitlines() == ["cluster"]
+
+
+def test_finished_only_when_every_expected_task_finished(capsys):
+    statuses = {
+        "12_0": _record("12_0", "done"),
+        "12_1": _record("12_1", "failed", step=3, total=10),
+    }
+    assert not print_job_progress(2000.0, statuses)  # 2 of 4 tasks have not started
+    assert "4 tasks: 1 done, 1 failed, 0 running (0 stale), 0 requeued, 2 pending" in capsys.readouterr().out
+    assert print_job_progress(2000.0, statuses, expected_tasks=2)
+
+    statuses |= {"12_2": _record("12_2", "done"), "12_3": _record("12_3", step=5, total=10)}
+    assert not print_job_progress(2000.0, statuses, stale_after=120)
+    out = capsys.readouterr().out
+    assert "0 pending" in out and "STALE (no heartbeat for 1000s)" in out
+    statuses["12_3"]["state"] = "requeued"  # checkpointed; resumes after the requeue
+    assert not print_job_progress(2000.0, statuses)
+    assert "1 requeued" in capsys.readouterr().out
+    statuses["12_3"]["state"] = "done"
+    assert print_job_progress(2000.0, statuses)
+
+
+@pytest.mark.parametrize("options", ["", ", progress=0.1"])
+def test_status_records_are_opt_in(options, tmp_path, job):
+    job_file = tmp_path / "tracked_job.py"
+    job_file.write_text(JOB_FILE.format(options=options))
+    progress_option = 0.1 if options else None
+
+    assert run_local_tasks(job_file, "tracked", {"steps": 3}, ntasks=2, progress=progress_option) == [0, 0]
+    (job_id,) = {path.name.split(".", 1)[0] for path in (tmp_path / "home" / "slurm_logs").glob("local*.rank0.out")}
+    if not options:
+        # report_progress still writes a record, but nothing marks the task as done
+        assert [_status(job / f"{job_id}.rank{rank}.status")["state"] for rank in range(2)] == ["running", "running"]
+        return
+    now, statuses = read_job_status(job_id, status_dir=str(job))
+    assert list(statuses) == [f"{job_id}.rank0", f"{job_id}.rank1"]
+    assert all(status["state"] == "done" and status["step"] == 3 and status["tasks"] == 2 for status in statuses.values())
+    assert print_job_progress(now, statuses)
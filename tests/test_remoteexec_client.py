@@ -0,0 +1,44 @@
+from argparse import Namespace
+
+from remoteexec.remoteexec_client import handle_slurmexec_logs, _requested_cpus
+from remoteexec.slurm import SLURM_LOG_EOF_MESSAGE
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job
+
+@slurm_job(ntasks=4, cpus_per_task=2)
+def wide():
+    pass
+
+@slurm_job(slurm_args={"--cpus-per-task": 8, "--time": "1:00:00"})
+def threaded():
+    pass
+"""
+
+
+def test_buffered_logs_are_followed_in_a_login_shell(tmp_path, fake_bin, capsys):
+    fake_bin("ssh", '#!/bin/sh\nshift\nexec sh -c "$*"\n')
+    # slurmexec-log is only on the PATH set up by the login profile, e.g. of a conda environment
+    home = tmp_path / "home"
+    (home / "env" / "bin").mkdir(parents=True)
+    fake_bin("slurmexec-log", f'#!/bin/sh\necho "following $1"\necho "{SLURM_LOG_EOF_MESSAGE}"\n').rename(home / "env" / "bin" / "slurmexec-log")
+    (home / ".bash_profile").write_text(f'export PATH="{home / "env" / "bin"}:$PATH"\n')
+
+    log_file = str(tmp_path / "slurm logs" / "7.log.gz")
+    job_details = {"success": True, "job_id": "7", "is_array_task": False, "log_file": log_file, "log_format": "buffered"}
+    handle_slurmexec_logs(Namespace(remote="cluster"), [repr(job_details)])
+    assert f"following {log_file}\n" in capsys.readouterr().out
+
+
+def test_requested_cpus_of_the_decorator_and_the_command_line(tmp_path):
+    (tmp_path / "jobs.py").write_text(JOB_FILE)
+    (tmp_path / "single.py").write_text(JOB_FILE.split("@slurm_job(slurm_args")[0])
+    assert _requested_cpus(["slurmexec", "jobs.py:wide"], tmp_path) == 8
+    assert _requested_cpus(["slurmexec", "jobs.py:threaded"], tmp_path) == 8
+    assert _requested_cpus(["slurmexec", "single.py", "--epochs", "3"], tmp_path) == 8  # the only job of the file
+    # Command line arguments override the decorator's
+    assert _requested_cpus(["slurmexec", "jobs.py:wide", "--ntasks", "1"], tmp_path) == 2
+    assert _requested_cpus(["slurmexec", "jobs.py:threaded", "-n", "2", "--cpus-per-task=3"], tmp_path) == 6
+    # Without a readable decorator, only the command line counts
+    assert _requested_cpus(["slurmexec", "jobs.py", "-n", "3"], tmp_path) == 3  # ambiguous function
+    assert _requested_cpus(["slurmexec", "missing.py"], tmp_path) == 1
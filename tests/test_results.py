@@ -0,0 +1,80 @@
+import threading
+
+from remoteexec.slurm import (
+    get_slurm_rank, get_slurm_local_rank, get_slurm_world_size, get_slurm_rendezvous, gather_slurm_results, _first_slurm_host
+)
+from remoteexec.slurmexec_client import run_local_tasks, submit_slurm_job
+from remoteexec.slurmexec_runner import load_module_from_file, load_invocation_record, save_result
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job, get_slurm_rank, get_slurm_world_size
+
+@slurm_job(job_name="ranks")
+def ranks(scale: int = 1):
+    return get_slurm_rank() * scale, get_slurm_world_size()
+
+@slurm_job(job_name="ranks", ntasks=2)
+def multi():
+    return get_slurm_rank()
+
+@slurm_job(job_name="ranks", save_result=True)
+def saved():
+    return 1
+"""
+
+
+def test_rank_environment(monkeypatch):
+    for name in ("SLURM_PROCID", "SLURM_LOCALID", "SLURM_NTASKS", "MASTER_ADDR", "MASTER_PORT", "SLURM_STEP_NODELIST"):
+        monkeypatch.delenv(name, raising=False)
+    assert (get_slurm_rank(), get_slurm_local_rank(), get_slurm_world_size()) == (0, 0, 1)
+
+    monkeypatch.setenv("SLURM_PROCID", "5")
+    monkeypatch.setenv("SLURM_LOCALID", "1")
+    monkeypatch.setenv("SLURM_NTASKS", "8")
+    assert (get_slurm_rank(), get_slurm_local_rank(), get_slurm_world_size()) == (5, 1, 8)
+
+    assert _first_slurm_host("node[03-05,8],gpu1") == "node03"
+    assert _first_slurm_host("gpu1,node[1-2]") == "gpu1"
+    monkeypatch.setenv("SLURM_JOB_NODELIST", "node[03-05]")
+    monkeypatch.setenv("SLURM_JOB_ID", "20123")
+    assert get_slurm_rendezvous() == ("node03", 10123)
+    monkeypatch.setenv("MASTER_ADDR", "10.0.0.1")
+    monkeypatch.setenv("MASTER_PORT", "29500")
+    assert get_slurm_rendezvous() == ("10.0.0.1", 29500)
+
+
+def test_gather_results_of_local_ranks(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    job_file = tmp_path / "ranks_job.py"
+    job_file.write_text(JOB_FILE)
+
+    assert run_local_tasks(job_file, "ranks", {"scale": 10}, ntasks=3) == [0, 0, 0]
+    log_dir = tmp_path / "home" / "slurm_logs"
+    (job_id,) = {path.name.split(".", 1)[0] for path in log_dir.glob("local*.rank0.out")}
+    assert gather_slurm_results(job_id, log_dir) == [(0, 3), (10, 3), (20, 3)]
+    assert gather_slurm_results("unknown", log_dir) == []
+
+
+def test_unpicklable_result_is_not_saved(tmp_path, capsys):
+    assert save_result(tmp_path, "7", 0, threading.Lock()) is None
+    assert "cannot be pickled" in capsys.readouterr().out
+    assert list(tmp_path.iterdir()) == []
+    assert save_result(tmp_path, "7", 1, {"a": 1}) == tmp_path / "7.rank1.result.pkl"
+    assert gather_slurm_results("7", tmp_path) == [{"a": 1}]
+
+
+def test_results_are_only_saved_when_needed(tmp_path, fake_bin):
+    fake_bin("sbatch", "#!/bin/sh\necho \"Submitted batch job 1\"\n")
+    job_file = tmp_path / "ranks_job.py"
+    job_file.write_text(JOB_FILE)
+    module = load_module_from_file(job_file)
+
+    def record_of(func):
+        script = open(submit_slurm_job(func, {})["script_file"]).read()
+        (command,) = [line for line in script.splitlines() if line.startswith(("slurmexec-run ", "srun slurmexec-run "))]
+        return load_invocation_record(command.rsplit(" ", 1)[1])
+
+    assert record_of(module.ranks).get("result_dir") is None
+    assert record_of(module.multi)["result_dir"] == str(tmp_path / "home" / "slurm_logs")
+    assert record_of(module.saved)["result_dir"] == str(tmp_path / "home" / "slurm_logs")
@@ -0,0 +1,82 @@
+import pytest
+
+from remoteexec.history import ResourceHistory
+from remoteexec.retry import compact_array_spec, get_array_throttle, get_slurm_task_states, retry_slurm_job
+
+SACCT_OUTPUT = {
+    "500": """\
+500_0|COMPLETED
+500_1|FAILED
+500_2|TIMEOUT
+500_3|OUT_OF_MEMORY
+500_4|CANCELLED by 1000
+500_5|COMPLETED
+500_7|NODE_FAIL
+500_[8-9%4]|PENDING
+""",
+    "501": "501|TIMEOUT\n",
+    "502": "502|COMPLETED\n",
+}
+
+
+@pytest.fixture
+def scheduler(tmp_path, fake_bin):
+    """Fake sacct printing `sacct_{job id}.txt` and fake sbatch logging its arguments; returns the history."""
+    for job_id, output in SACCT_OUTPUT.items():
+        (tmp_path / f"sacct_{job_id}.txt").write_text(output)
+    fake_bin("sacct", f"#!/bin/sh\nfor arg; do job_id=$arg; done\ncat {tmp_path}/sacct_$job_id.txt\n")
+    fake_bin("sbatch", f"#!/bin/sh\necho \"$*\" >> {tmp_path / 'sbatch_calls'}\necho \"Submitted batch job 600\"\n")
+
+    history = ResourceHistory(tmp_path / "history.jsonl")
+    script = str(tmp_path / "job.slurm")
+    history.record_submission("500", "job.py:work", {"--array": "0-9%4", "--mem": "4G", "--time": "1:00:00"}, script)
+    history.record_submission("501", "job.py:work", {"--mem": "4G", "--time": "30:00"}, script)
+    history.record_submission("502", "job.py:work", {}, script)
+    return history
+
+
+def _sbatch_calls(history):
+    calls = history.path.parent / "sbatch_calls"
+    return calls.read_text().splitlines() if calls.exists() else []
+
+
+def test_compact_array_spec():
+    assert compact_array_spec([1, 2, 3, 5, 7, 8]) == "1-3,5,7-8"
+    assert compact_array_spec([8, 7, 1, 3, 2, 5, 5]) == "1-3,5,7-8"
+    assert compact_array_spec([4]) == "4"
+    assert compact_array_spec([0, 1, 2, 10], max_concurrent=5) == "0-2,10%5"
+    assert get_array_throttle("0-99%10") == 10
+    assert get_array_throttle("1-3,7") is None and get_array_throttle(None) is None
+
+
+def test_task_states_from_sacct(scheduler):
+    assert get_slurm_task_states("500") == {
+        0: "COMPLETED", 1: "FAILED", 2: "TIMEOUT", 3: "OUT_OF_MEMORY", 4: "CANCELLED", 5: "COMPLETED", 7: "NODE_FAIL",
+    }  # pending tasks that Slurm has not expanded yet are omitted
+    assert get_slurm_task_states("501") == {None: "TIMEOUT"}
+
+
+def test_retry_overrides_the_array_and_keeps_the_throttle(scheduler, tmp_path):
+    out_data = retry_slurm_job("500", mem_factor=2, time_factor=2, history=scheduler)
+    assert out_data["success"] and out_data["job_id"] == "600" and out_data["retried"] == [1, 2, 3, 7]
+    assert _sbatch_calls(scheduler) == [f"--array=1-3,7%4 --mem=8192M --time=0-02:00:00 {tmp_path / 'job.slurm'}"]
+    submissions, _ = scheduler.load()
+    assert submissions["600"]["array"] == "1-3,7%4" and submissions["600"]["key"] == "job.py:work"
+    assert submissions["600"]["mem"] == "8192M"
+
+    out_data = retry_slurm_job("500", mem="16G", include_cancelled=True, history=scheduler)
+    assert out_data["retried"] == [1, 2, 3, 4, 7]
+    assert _sbatch_calls(scheduler)[-1] == f"--array=1-4,7%4 --mem=16G {tmp_path / 'job.slurm'}"
+
+
+def test_retry_single_jobs(scheduler, tmp_path):
+    out_data = retry_slurm_job("501", time_factor=1.5, history=scheduler)
+    assert out_data["success"] and out_data["retried"] is None
+    assert _sbatch_calls(scheduler) == [f"--time=0-00:45:00 {tmp_path / 'job.slurm'}"]
+
+    out_data = retry_slurm_job("502", history=scheduler)
+    assert out_data == {"success": True, "message": "No failed tasks of job 502 to retry", "retried": []}
+    assert len(_sbatch_calls(scheduler)) == 1
+
+    with pytest.raises(ValueError, match="Job 999 was not submitted by slurmexec"):
+        retry_slurm_job("999", history=scheduler)
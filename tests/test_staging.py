@@ -0,0 +1,111 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from remoteexec import staging
+from remoteexec.staging import stage_inputs, prepare_outputs, commit_outputs, get_staged_path, _stage_file
+from remoteexec.slurmexec_client import write_invocation_record
+from remoteexec.slurmexec_runner import run_invocation, load_invocation_record
+
+JOB_FILE = """
+from pathlib import Path
+from remoteexec.slurm import slurm_job, get_slurm_rank
+
+@slurm_job(job_name="staged")
+def staged(data: str = "", out: str = ""):
+    Path(out).write_text(Path(data).read_text().upper() + str(get_slurm_rank()))
+    return out
+"""
+
+
+@pytest.fixture(autouse=True)
+def scratch(tmp_path, monkeypatch):
+    monkeypatch.setattr(staging, "_STAGED_PATHS", {})
+    monkeypatch.setenv("SLURMEXEC_SCRATCH", str(tmp_path / "local_disk"))
+    return tmp_path / "local_disk"
+
+
+def _shared_inputs(tmp_path):
+    shared = tmp_path / "shared"
+    (shared / "dataset" / "sub").mkdir(parents=True)
+    (shared / "dataset" / "a.txt").write_text("a")
+    (shared / "dataset" / "sub" / "b.txt").write_text("b")
+    (shared / "config.json").write_text("{}")
+    return [str(shared / "dataset"), str(shared / "config.json")]
+
+
+def test_inputs_are_copied_once_per_node(tmp_path, scratch, capsys):
+    inputs = _shared_inputs(tmp_path)
+    staged = stage_inputs(inputs)
+    assert "3 of 3 files copied" in capsys.readouterr().out
+    dataset = Path(staged[inputs[0]])
+    assert dataset.is_relative_to(scratch) and (dataset / "sub" / "b.txt").read_text() == "b"
+    assert Path(get_staged_path(inputs[1])).read_text() == "{}"
+    assert get_staged_path(str(tmp_path / "other")) == str(tmp_path / "other")
+
+    assert stage_inputs(inputs) == staged
+    assert "0 of 3 files copied" in capsys.readouterr().out
+
+    # A changed input is copied again
+    Path(inputs[1]).write_text('{"changed": true}')
+    stage_inputs(inputs)
+    assert "1 of 3 files copied" in capsys.readouterr().out
+    assert Path(staged[inputs[1]]).read_text() == '{"changed": true}'
+
+
+def test_concurrent_tasks_copy_a_file_once(tmp_path, scratch):
+    src = tmp_path / "big.bin"
+    src.write_bytes(bytes(1 << 20))
+    dst = scratch / "inputs" / "big.bin"
+    lock_dir = scratch / "locks"
+    lock_dir.mkdir(parents=True)
+    # Each call opens its own lock file description, so flock serializes threads like separate processes
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        copied = list(executor.map(lambda _: _stage_file(src, dst, lock_dir), range(16)))
+    assert sum(copied) == 1
+    assert dst.read_bytes() == src.read_bytes()
+    assert not list(dst.parent.glob(".*.tmp"))
+
+
+def test_outputs_are_committed_atomically(tmp_path, capsys):
+    out_dir = tmp_path / "shared" / "results"
+    out_file = tmp_path / "shared" / "metrics.json"
+    missing = tmp_path / "shared" / "missing.txt"
+    out_dir.mkdir(parents=True)
+    (out_dir / "old.txt").write_text("old")  # replaced as a whole
+
+    staged = prepare_outputs([str(out_dir), str(out_file), str(missing)], "7.rank0")
+    Path(staged[str(out_dir)]).mkdir()
+    (Path(staged[str(out_dir)]) / "new.txt").write_text("new")
+    Path(staged[str(out_file)]).write_text("{}")
+    commit_outputs(staged)
+
+    assert sorted(path.name for path in out_dir.iterdir()) == ["new.txt"]
+    assert out_file.read_text() == "{}"
+    assert not Path(staged[str(out_file)]).exists() and not Path(staged[str(out_dir)]).exists()
+    assert f"Declared output {missing} was not written" in capsys.readouterr().out
+    assert sorted(path.name for path in out_file.parent.iterdir()) == ["metrics.json", "results"]
+
+
+@pytest.mark.parametrize("rank", [0, 1])
+def test_every_rank_keeps_its_outputs(rank, tmp_path, scratch, monkeypatch):
+    monkeypatch.setenv("SLURM_JOB_ID", "4242")
+    monkeypatch.setenv("SLURM_PROCID", str(rank))
+    monkeypatch.setenv("SLURM_NTASKS", "2")
+    monkeypatch.delenv("SLURMEXEC_LOCAL_JOB_ID", raising=False)
+    job_file = tmp_path / "staged_job.py"
+    job_file.write_text(JOB_FILE)
+    data = tmp_path / "shared" / "data.txt"
+    data.parent.mkdir()
+    data.write_text("abc")
+    out = tmp_path / "shared" / f"out{rank}.txt"
+
+    record = write_invocation_record(
+        tmp_path, job_file, "staged", {"data": str(data), "out": str(out)},
+        staging={"inputs": [str(data)], "outputs": [str(out)]},
+    )
+    written_to = run_invocation(load_invocation_record(record))
+    assert out.read_text() == f"ABC{rank}"
+    # Rank 0 wrote to node-local scratch and committed; other ranks write to the declared path
+    assert Path(written_to).is_relative_to(scratch) == (rank == 0)
@@ -0,0 +1,101 @@
+import pytest
+
+from remoteexec.submission import SubmissionQueue, count_array_tasks
+from remoteexec.slurmexec_runner import load_module_from_file
+
+JOB_FILE = """
+from remoteexec.slurm import slurm_job
+
+@slurm_job(job_name="sweep")
+def sweep(i: int = 0):
+    return i
+"""
+
+
+@pytest.fixture
+def scheduler(tmp_path, fake_bin):
+    """
+    Fake scheduler: `queue` holds one line per queued job. squeue lists it and then lets the oldest job finish;
+    sbatch logs the queue length it saw to `sbatch_calls`, then runs `sbatch_behavior` (which may fail).
+    """
+    queue = tmp_path / "queue"
+    queue.write_text("")
+    calls = tmp_path / "sbatch_calls"
+    behavior = tmp_path / "sbatch_behavior"
+    behavior.write_text("")
+    fake_bin("squeue", f"#!/bin/sh\ncat {queue}\nsed -i 1d {queue}\n")
+    fake_bin("sbatch", (
+        f"#!/bin/sh\nqueued=$(wc -l < {queue})\necho $queued >> {calls}\n. {behavior}\n"
+        f"echo job >> {queue}\necho \"Submitted batch job $(wc -l < {calls})\"\n"
+    ))
+    job_file = tmp_path / "sweep_job.py"
+    job_file.write_text(JOB_FILE)
+    return load_module_from_file(job_file).sweep, calls, behavior
+
+
+def _queued_at_submission(calls):
+    return [int(line) for line in calls.read_text().split()]
+
+
+def test_count_array_tasks():
+    assert count_array_tasks(None) == 1
+    assert count_array_tasks("0-99:2,200%10") == 51
+    assert count_array_tasks("1,3,5-7") == 5
+
+
+def test_queue_stays_under_the_cap(scheduler):
+    sweep, calls, _ = scheduler
+    queue = SubmissionQueue(max_in_flight=3, poll_interval=0.01)
+    for i in range(8):
+        queue.put(sweep, {"i": i})
+    results = queue.run()
+    assert [out_data["success"] for out_data in results] == [True] * 8
+    assert [out_data["job_id"] for out_data in results] == [str(i) for i in range(1, 9)]
+    assert max(_queued_at_submission(calls)) <= 2  # at most 3 queued after each submission
+
+
+def test_submit_limit_waits_for_jobs_to_finish(scheduler):
+    sweep, calls, behavior = scheduler
+    # The scheduler refuses a third queued job, below our own cap
+    behavior.write_text('if [ "$queued" -ge 2 ]; then echo "sbatch: error: QOSMaxSubmitJobPerUserLimit"; exit 1; fi\n')
+    queue = SubmissionQueue(max_in_flight=100, poll_interval=0.01)
+    for i in range(6):
+        queue.put(sweep, {"i": i})
+    results = queue.run()
+    assert all(out_data["success"] for out_data in results)
+    queued = _queued_at_submission(calls)
+    assert len([n for n in queued if n >= 2]) >= 1  # refused at least once
+    assert len(queued) < 6 + 6  # submissions wait for capacity instead of hammering sbatch
+
+
+def test_transient_errors_are_retried_by_the_queue_only(scheduler):
+    sweep, calls, behavior = scheduler
+    behavior.write_text('echo "sbatch: error: Socket timed out on send/recv operation"; exit 1\n')
+    queue = SubmissionQueue(poll_interval=0.01, max_retries=2, backoff=0)
+    queue.put(sweep, {"i": 1})
+    (out_data,) = queue.run()
+    assert not out_data["success"] and "Socket timed out" in out_data["message"]
+    assert len(_queued_at_submission(calls)) == 3  # one attempt and two retries, not multiplied by run_sbatch retries
+
+    # Once the controller recovers, the retried submission succeeds
+    behavior.write_text(f'if [ $(wc -l < {calls}) -le 4 ]; then echo "Socket timed out"; exit 1; fi\n')
+    queue.put(sweep, {"i": 2})
+    (out_data,) = queue.run()
+    assert out_data["success"] and len(_queued_at_submission(calls)) == 5
+
+
+def test_permanent_policy_refusals_are_not_retried_forever(scheduler, tmp_path):
+    sweep, calls, behavior = scheduler
+    behavior.write_text('echo "sbatch: error: Batch job submission failed: Job violates accounting/QOS policy"; exit 1\n')
+    queue = SubmissionQueue(poll_interval=0.01, max_retries=3)
+    queue.put(sweep, {"i": 1})
+    (out_data,) = queue.run()
+    assert not out_data["success"] and "QOS policy" in out_data["message"]
+    assert len(_queued_at_submission(calls)) == 1  # refused with nothing queued: permanent
+
+    # With other jobs queued that never leave, refusals count against max_retries
+    (tmp_path / "queue").write_text("other\n" * 1000)
+    queue.put(sweep, {"i": 2})
+    (out_data,) = queue.run()
+    assert not out_data["success"]
+    assert len(_queued_at_submission(calls)) == 1 + 4
@@ -0,0 +1,57 @@
+import time
+
+from remoteexec.telemetry import TelemetrySampler, load_telemetry, summarize_telemetry, load_job_telemetry, _MAGIC, _RECORD
+
+
+def test_sampler_records_the_current_process(tmp_path):
+    path = tmp_path / "1.telemetry"
+    sampler = TelemetrySampler(path, interval=0.05)
+    sampler.start()
+    deadline = time.monotonic() + 0.5
+    while time.monotonic() < deadline:  # keep a core busy
+        sum(range(1000))
+    sampler.stop()
+
+    series = load_telemetry(path)
+    assert len(series["time"]) >= 3
+    assert all(a <= b for a, b in zip(series["time"], series["time"][1:]))
+    assert max(series["cpu"]) > 10 and min(series["rss"]) > 0 and max(series["threads"]) >= 2  # with the sampler thread
+    summary = summarize_telemetry(series)
+    assert summary["samples"] == len(series["time"]) and 0.3 < summary["duration"] < 5
+    assert summary["rss_max"] == max(series["rss"])
+
+
+def test_load_and_summarize_ignore_a_truncated_last_record(tmp_path):
+    path = tmp_path / "1.telemetry"
+    records = [
+        (1000.0, 50.0, 100, 0, 0, 2),
+        (1005.0, 5.0, 300, 10, 1, 4),
+        (1010.0, 95.0, 200, 30, 5, 3),
+    ]
+    partial = _RECORD.pack(1015.0, 100.0, 999, 99, 99, 9)[:_RECORD.size // 2]  # the job was killed mid-write
+    path.write_bytes(_MAGIC + b"".join(_RECORD.pack(*record) for record in records) + partial)
+
+    series = load_telemetry(path)
+    assert list(series["rss"]) == [100, 300, 200] and list(series["threads"]) == [2, 4, 3]
+    assert summarize_telemetry(series) == {
+        "samples": 3,
+        "duration": 10.0,
+        "cpu_mean": 50.0,
+        "cpu_max": 95.0,
+        "idle_fraction": 1 / 3,
+        "rss_max": 300,
+        "rss_max_at": 5.0,
+        "read_bytes": 30,
+        "write_bytes": 5,
+        "threads_max": 4,
+    }
+
+    path.write_bytes(_MAGIC + partial)
+    assert summarize_telemetry(load_telemetry(path)) == {"samples": 0}
+
+
+def test_job_telemetry_files(tmp_path):
+    for name in ["12.telemetry", "12.rank0.telemetry", "12.rank1.telemetry", "12_3.telemetry", "12_10.rank1.telemetry", "123.telemetry", "12.out"]:
+        (tmp_path / name).write_bytes(_MAGIC)
+    telemetry = load_job_telemetry("12", local_dir=str(tmp_path))
+    assert list(telemetry) == ["12", "12.rank0", "12.rank1", "12_3", "12_10.rank1"]